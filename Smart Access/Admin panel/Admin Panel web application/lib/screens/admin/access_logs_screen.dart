@@ -114,6 +114,7 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
   bool _isLoading = false;
   List<LogEntry> _logs = [];
   String? _errorMessage;
+  String? _nextCursor; // X-Next-Cursor of the last page fetched; null when every matching log is loaded
 
   // Filter variables
   DateTime? _startDate;
@@ -147,8 +148,9 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
     });
   }
 
-  // Fetch logs from the backend, applying current filters
-  Future<void> _fetchLogs({bool preserveFilters = false}) async {
+  // Fetch logs from the backend, applying current filters. The backend returns one page (newest first);
+  // loadMore appends the next page using the cursor of the previous one.
+  Future<void> _fetchLogs({bool preserveFilters = false, bool loadMore = false}) async {
     if (_isLoading) return;
     setState(() {
       _isLoading = true;
@@ -167,6 +169,7 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
       if (_selectedRoomId != null) queryParams['room_id'] = _selectedRoomId;
       if (_selectedUsername != null) queryParams['username'] = _selectedUsername;
       if (_selectedAccessStatus != null) queryParams['access_status'] = _selectedAccessStatus.toString(); // 'true' or 'false'
+      if (loadMore && _nextCursor != null) queryParams['cursor'] = _nextCursor;
 
       final response = await authService.dioInstance.get('admin/access-logs/', queryParameters: queryParams);
 
@@ -174,7 +177,7 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
         if (mounted) {
           final rawLogs = response.data as List;
           setState(() {
-            _logs = rawLogs.map((logJson) {
+            final page = rawLogs.map((logJson) {
               // Add try-catch around parsing individual entries for robustness
               try {
                 return LogEntry.fromJson(logJson);
@@ -184,6 +187,8 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
                 return null; // Will be filtered out below
               }
             }).whereType<LogEntry>().toList(); // Filter out any nulls from parsing errors
+            _logs = loadMore ? [..._logs, ...page] : page;
+            _nextCursor = response.headers.value('x-next-cursor');
 
             // Update available filter options only when not preserving filters
             // or if they haven't been populated yet.
@@ -406,9 +411,9 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
           // Log Count, Refresh Button, and Export Button Row
           Row(
             children: [
-              // Display log count (consider adding total if pagination is implemented)
+              // Display log count ('+' while more pages can be loaded)
               Text(
-                'Displaying ${_logs.length} log(s)',
+                'Displaying ${_logs.length}${_nextCursor != null ? '+' : ''} log(s)',
                 style: Theme.of(context).textTheme.titleMedium?.copyWith(fontWeight: FontWeight.bold),
               ),
               const Spacer(), // Pushes buttons to the right
@@ -440,10 +445,6 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
                 ? const Center(child: CircularProgressIndicator())
                 : _buildLogsList(), // Build the responsive list of logs
           ),
-
-          // Optional Pagination Controls Placeholder
-          // const SizedBox(height: 16),
-          // _buildPagination(), // Add pagination controls widget if implemented
         ],
       ),
     );
@@ -664,8 +665,20 @@ class _AccessLogsScreenState extends State<AccessLogsScreen> {
       color: BioAccessTheme.primaryBlue, // Theme color for indicator
       child: ListView.builder(
         padding: const EdgeInsets.only(bottom: 16), // Padding at the bottom of the list
-        itemCount: _logs.length,
+        itemCount: _logs.length + (_nextCursor != null ? 1 : 0), // Extra row for the "Load more" button
         itemBuilder: (context, index) {
+          if (index == _logs.length) {
+            return Padding(
+              padding: const EdgeInsets.symmetric(vertical: 8),
+              child: Center(
+                child: OutlinedButton.icon(
+                  onPressed: _isLoading ? null : () => _fetchLogs(preserveFilters: true, loadMore: true),
+                  icon: _isLoading ? const SizedBox(width: 16, height: 16, child: CircularProgressIndicator(strokeWidth: 2,)) : const Icon(Icons.expand_more, size: 18),
+                  label: const Text('Load more'),
+                ),
+              ),
+            );
+          }
           final log = _logs[index];
           return _buildLogCard(log); // Use helper to build each card
         }
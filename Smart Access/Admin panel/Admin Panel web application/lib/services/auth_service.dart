@@ -300,7 +300,12 @@ class AuthService extends ChangeNotifier {
          options: Options(contentType: Headers.multipartFormDataContentType)
        );
        
-       if (response.statusCode == 201) {
+       if (response.statusCode == 202) {
+         // Biometric samples are processed in the background; wait for the result
+         await _waitForRegistration(response.data['job_id']);
+         print(">>> Registration successful. User should log in.");
+         return;
+       } else if (response.statusCode == 201) {
          print(">>> Registration successful. User should log in.");
          return;
        } else {
@@ -316,6 +321,23 @@ class AuthService extends ChangeNotifier {
      }
    }
 
+   // Poll a queued registration until it completes or fails, giving up after about five minutes
+   static const int _registrationPollAttempts = 150;
+
+   Future<Map<String, dynamic>> _waitForRegistration(String jobId) async {
+     for (var attempt = 0; attempt < _registrationPollAttempts; attempt++) {
+       await Future.delayed(const Duration(seconds: 2));
+       final response = await _dio.get('auth/register/status/$jobId/');
+       final data = Map<String, dynamic>.from(response.data);
+       print(">>> Registration $jobId: ${data['status']} ${data['stage']} ${data['progress']}%");
+       if (data['status'] == 'completed') return data;
+       if (data['status'] == 'failed') {
+         throw DioException(requestOptions: response.requestOptions, response: response, error: data['error'] ?? 'Registration failed');
+       }
+     }
+     throw Exception('Registration is taking longer than expected. Try logging in later.');
+   }
+
    // Verifying invite token
    Future<Map<String, dynamic>> verifyInviteToken(String token) async {
      await initializationComplete;
@@ -48,6 +48,8 @@ CORS_EXPOSE_HEADERS = [
     'Set-Cookie',
     'Cookie',
     'X-CSRFToken',
+    'X-Next-Cursor',
+    'Link',
 ]
 
 # Additional headers configuration
@@ -102,8 +104,11 @@ CSRF_COOKIE_DOMAIN = None
 # Set session serializer
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
 
-# Use database session backend (more reliable for cross-domain)
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Cached database sessions with write coalescing (core/session_backend.py): reads come from the cache and the
+# session row is only written when its data changes, or every SESSION_WRITE_INTERVAL seconds to extend its expiry.
+# Expired rows are removed in chunks by `python manage.py sweep_sessions`
+SESSION_ENGINE = 'core.session_backend'
+SESSION_WRITE_INTERVAL = 300  # seconds
 
 # If SameSite is 'None', you must set Secure=True in production
 # but for local development, we can use Secure=False
@@ -111,6 +116,53 @@ if not DEBUG:
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
 
+# Cache shared by all worker processes (sessions, counters). Use Redis when REDIS_URL is set; otherwise a
+# file-based cache, which is shared between processes on one host. Per-process LocMemCache would hand different
+# workers different copies of the same session. The file cache cannot increment counters atomically, so the
+# failed-attempt lockout needs Redis in production (`manage.py check --deploy` warns).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+# Read-mostly admin responses (user, room and room group lists, frozen accounts, permissions, company details) are
+# cached per company in the cache above (core/response_cache.py). Model signals bump a per-company version on every
+# change, so edits show up on the next fetch; the timeout only bounds how long unreachable entries linger. 0 disables.
+RESPONSE_CACHE_TIMEOUT = 600  # seconds
+
+# Response compression (core/compression.py): JSON and text bodies above the threshold are sent brotli-compressed
+# (if the brotli package is installed) or gzipped, as the client's Accept-Encoding allows.
+RESPONSE_COMPRESSION_MIN_SIZE = 1024  # bytes
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 4  # 0-11; higher levels cost far more CPU for a few percent
+
+# Failed-attempt lockout (core/lockout.py). Failures are counted per user and per client IP in a sliding window;
+# a user reaching LOCKOUT_MAX_FAILURES is frozen and unfrozen automatically after LOCKOUT_COOLDOWN seconds
+# (None keeps accounts frozen until an admin unfreezes them)
+LOCKOUT_MAX_FAILURES = 3
+LOCKOUT_IP_MAX_FAILURES = 20
+LOCKOUT_WINDOW = 15 * 60  # seconds
+LOCKOUT_COOLDOWN = None
+LOCKOUT_IP_HEADER = 'REMOTE_ADDR'  # e.g. 'HTTP_X_REAL_IP' behind a reverse proxy that sets it
+
+# Token-bucket throttling in front of the password check in login_step1 (core/throttling.py): each bucket allows
+# a burst and then refills at per_minute attempts a minute. Over-limit callers get a 429 before any hashing.
+LOGIN_THROTTLE_RATES = {
+    'ip': {'burst': 20, 'per_minute': 10},
+    'username': {'burst': 5, 'per_minute': 2},
+    'company': {'burst': 200, 'per_minute': 120},
+}
+
 # Set session expiration (24 hours)
 SESSION_COOKIE_AGE = 86400  # 24 hours in seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Keep session across browser restarts
@@ -139,10 +191,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS must be first
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',  # Above everything that reads or changes the response body
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_router.PrimaryPinningMiddleware',  # After sessions, so the per-request session save is not a write
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -152,7 +206,7 @@ ROOT_URLCONF = 'bioaccess_project.urls'  # Assuming your project root urls.py is
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -175,13 +229,63 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections between requests so the per-connection tuning below is paid once
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts. A deferred transaction that reads and then writes
+            # cannot wait for the lock and fails with "database is locked" straight away instead of using busy_timeout
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# SQLite tuning applied to every new connection (core/sqlite.py). WAL lets readers run while a write is in
+# progress; synchronous=NORMAL is durable in WAL mode except for the last commits on power loss.
+SQLITE_TUNING = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # milliseconds to wait for a lock before failing
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negative values are KiB, so about 64 MB of page cache per connection
+    'temp_store': 'MEMORY',
+}
+
+# Optional read replica. Point DJANGO_REPLICA_DB at a second SQLite file (kept current by `manage.py sync_replica`)
+# and views decorated with core.db_router.use_replica read from it. Tests mirror it onto the default database.
+REPLICA_DB_PATH = os.environ.get('DJANGO_REPLICA_DB')
+if REPLICA_DB_PATH:
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': REPLICA_DB_PATH, 'TEST': {'MIRROR': 'default'}}
+REPLICA_DATABASE = 'replica' if REPLICA_DB_PATH else None
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# After a client writes, its reads stay on the primary for this long (read-your-writes); keep it above the sync interval
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# Password hashers with host-calibrated cost parameters (core/hashers.py). Run `python manage.py calibrate_hashers`
+# and copy its recommendations below; None keeps Django's defaults. The first hasher is used for new hashes, and
+# hashes made with another hasher or other parameters are upgraded on the user's next login.
+PASSWORD_HASHERS = [
+    'core.hashers.CalibratedPBKDF2PasswordHasher',
+    'core.hashers.CalibratedScryptPasswordHasher',
+    'core.hashers.CalibratedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = None
+PASSWORD_SCRYPT_WORK_FACTOR = None
+PASSWORD_ARGON2_TIME_COST = None
+PASSWORD_ARGON2_MEMORY_COST = None  # KiB
+# At most PASSWORD_HASH_WORKERS login password checks hash at once (0 for no limit); more wait for a free slot.
+# When PASSWORD_HASH_MAX_PENDING checks are already running or waiting, logins are answered with 503 instead of
+# piling up.
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_MAX_PENDING = 32
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -213,6 +317,71 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 BIOMETRIC_ROOT = os.path.join(MEDIA_ROOT, 'biometric_data')
 
+# Registrations return 202 with a job id and their biometric samples are checked in the background (core/enrollment.py)
+# by the task worker. Uploads wait in ENROLLMENT_STAGING_DIR until a worker picks them up, and are kept for the retry
+# when the database or storage fails until the job has been tried ENROLLMENT_MAX_ATTEMPTS times.
+ENROLLMENT_STAGING_DIR = os.path.join(BASE_DIR, 'spool', 'enrollment')
+ENROLLMENT_MAX_ATTEMPTS = 3
+ENROLLMENT_MIN_VOICE_SECONDS = 2
+ENROLLMENT_MIN_VOICE_DBFS = -50  # quieter recordings are treated as silence
+
+# Bulk enrollment (core/bulk_enroll.py, `manage.py bulk_enroll` and /api/admin/bulk-enroll/). Samples are checked and
+# encrypted in BULK_ENROLL_WORKERS processes (0 runs them in the calling process). Accounts without a password in the
+# manifest get an activation token valid for BULK_ENROLL_ACTIVATION_DAYS days. Uploads are staged encrypted and
+# deleted when the run completes, fails for good or has been tried BULK_ENROLL_MAX_ATTEMPTS times.
+BULK_ENROLL_STAGING_DIR = os.path.join(BASE_DIR, 'spool', 'bulk_enroll')
+BULK_ENROLL_WORKERS = 4
+BULK_ENROLL_MAX_ATTEMPTS = 3
+BULK_ENROLL_MAX_SAMPLE_SIZE = 10 * 1024 * 1024  # bytes per face image or voice recording
+BULK_ENROLL_ACTIVATION_DAYS = 14
+
+# Largest number of user x group pairs, or of rooms and groups, one bulk provisioning request may change
+PROVISIONING_MAX_ITEMS = 50000
+
+# Background task queue stored in the database (core/task_queue.py), processed by `python manage.py run_worker`.
+# Failed tasks are retried TASK_MAX_ATTEMPTS times in total, waiting TASK_RETRY_BASE_DELAY * 2^n seconds (capped at
+# TASK_RETRY_MAX_DELAY) between attempts. A task still running after TASK_TIMEOUT seconds is assumed lost and requeued.
+TASK_MODULES = ['core.tasks']
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_BASE_DELAY = 10
+TASK_RETRY_MAX_DELAY = 3600
+TASK_TIMEOUT = 600
+TASK_RETENTION_DAYS = 7  # finished tasks are deleted after this many days
+# Periodic tasks: name -> {'task', 'interval' (seconds), optional 'args', 'kwargs', 'enabled'}
+TASK_SCHEDULES = {
+    'lock-expired-rooms': {'task': 'core.lock_expired_rooms', 'interval': 10},
+    'sweep-sessions': {'task': 'core.sweep_sessions', 'interval': 60 * 60},
+    'purge-tasks': {'task': 'core.purge_tasks', 'interval': 24 * 60 * 60},
+    'send-queued-email': {'task': 'core.send_queued_email', 'interval': 60},  # picks up retries
+    'sweep-invite-tokens': {'task': 'core.sweep_invite_tokens', 'interval': 60 * 60},
+    'purge-tombstones': {'task': 'core.purge_tombstones', 'interval': 24 * 60 * 60},
+}
+
+# Delta sync (/api/sync/) keeps the tombstones of deleted rows this long; clients that last synced before the
+# oldest remaining tombstone are told to reload everything
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Invite tokens are deleted this many days after they expire (`manage.py sweep_invite_tokens`, also run hourly)
+INVITE_TOKEN_RETENTION_DAYS = 30
+
+# Outgoing mail. Emails are queued in the database (core/mailer.py) and sent by the task worker, MAIL_BATCH_SIZE
+# messages per SMTP connection; a failed message is retried with the task backoff up to MAIL_MAX_ATTEMPTS times.
+# Without EMAIL_HOST messages are printed to the console. To test against a local SMTP stand-in, run
+# `python -m aiosmtpd -n -l localhost:1025` and start the worker with EMAIL_HOST=localhost EMAIL_PORT=1025.
+EMAIL_HOST = os.environ.get('EMAIL_HOST', '')
+EMAIL_BACKEND = ('django.core.mail.backends.smtp.EmailBackend' if EMAIL_HOST
+                 else 'django.core.mail.backends.console.EmailBackend')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS') == '1'
+EMAIL_TIMEOUT = 30
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'BioAccess <noreply@localhost>')
+INVITE_URL = os.environ.get('INVITE_URL', 'http://localhost:5000/register?token={token}')
+MAIL_BATCH_SIZE = 100
+MAIL_MAX_ATTEMPTS = 5
+BULK_INVITE_MAX_EMAILS = 1000  # addresses per bulk invite request
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
@@ -236,9 +405,9 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
     ),
-    # Keep default renderers and parsers
+    # Same output as JSONRenderer, encoded with orjson when it is installed (core/renderers.py)
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
@@ -252,6 +421,23 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Access log pagination (keyset/cursor based, see core/pagination.py)
+ACCESS_LOG_PAGE_SIZE = 100
+ACCESS_LOG_MAX_PAGE_SIZE = 1000
+
+# Access log retention: logs older than Company.access_log_retention_days are moved into gzip NDJSON
+# segments under this directory by `manage.py archive_access_logs`
+ACCESS_LOG_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive', 'access_logs')
+ACCESS_LOG_ARCHIVE_SEGMENT_ROWS = 50000
+
+# Buffered access log writer (core/log_writer.py): denied attempts are queued and inserted in batches,
+# with a spill file per process so queued entries survive a crash
+ACCESS_LOG_BUFFERED = True
+ACCESS_LOG_BATCH_SIZE = 50
+ACCESS_LOG_FLUSH_INTERVAL = 2.0  # seconds
+ACCESS_LOG_SPILL_DIR = os.path.join(BASE_DIR, 'spool', 'access_logs')
+ACCESS_LOG_SPILL_FSYNC = True
+
 # ---- Enhanced Debug Logging ----
 LOGGING = {
     'version': 1,
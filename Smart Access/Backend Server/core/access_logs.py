@@ -0,0 +1,99 @@
+# core/access_logs.py
+import csv
+import json
+from .models import AccessLog
+from .pagination import after_cursor, encode_cursor
+
+def apply_access_log_filters(logs, params, allow_username=True):
+    """
+    Narrow an access log queryset with the list_access_logs query parameters:
+    start_date, end_date, room_id, access_status and (for admins) username.
+    """
+    # Get query parameters for filtering
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    room_id = params.get('room_id')
+    access_status = params.get('access_status')
+    username = params.get('username')
+
+    # Apply filters
+    if start_date:
+        logs = logs.filter(timestamp__gte=start_date)
+    if end_date:
+        logs = logs.filter(timestamp__lte=end_date)
+    if room_id:
+        logs = logs.filter(room__room_id=room_id)
+    if access_status:
+        logs = logs.filter(access_granted=(access_status.lower() == 'true'))
+    if username and allow_username:
+        logs = logs.filter(user__username=username)
+
+    return logs
+
+
+def filter_access_logs(user, params):
+    """
+    Build the access log queryset visible to a user from the list_access_logs query parameters.
+    Admins see their whole company, regular users only their own entries.
+    """
+    # Base queryset - filter by company for admins, by user for regular users
+    if user.is_admin:
+        logs = AccessLog.objects.filter(company=user.company)
+    else:
+        logs = AccessLog.objects.filter(user=user, company=user.company)
+
+    return apply_access_log_filters(logs, params, allow_username=user.is_admin)
+
+
+# Export columns and the database fields they are read from. Exports are written oldest first and every
+# row carries the cursor of its own position, so an interrupted export resumes with ?cursor=<last cursor>.
+# Exports read the hot AccessLog table only: logs already moved into archive segments by the retention policy
+# are not included and stay searchable through the access log list with ?archived=true.
+EXPORT_COLUMNS = (
+    'id', 'timestamp', 'username', 'room_id', 'room_name', 'access_granted', 'face_spoofing_result',
+    'speaker_similarity_score', 'audio_deepfake_result', 'transcription_score', 'failure_reason', 'cursor',
+)
+EXPORT_FIELDS = (
+    'id', 'timestamp', 'user__username', 'room__room_id', 'room__name', 'access_granted',
+    'face_spoofing_result', 'speaker_similarity_score', 'audio_deepfake_result', 'transcription_score',
+    'failure_reason',
+)
+EXPORT_CHUNK_SIZE = 2000
+
+
+def iter_export_rows(logs, cursor=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield access log rows as dicts in (timestamp, id) order, starting after the cursor.
+    Rows are fetched with QuerySet.iterator() so only one chunk is held in memory.
+    """
+    logs = after_cursor(logs, cursor, descending=False).order_by('timestamp', 'id')
+    for values in logs.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        row = dict(zip(EXPORT_COLUMNS, values))
+        row['cursor'] = encode_cursor(row['timestamp'], row['id'])
+        row['timestamp'] = row['timestamp'].isoformat()
+        yield row
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in EXPORT_COLUMNS])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+# Supported export formats: line generator and content type
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
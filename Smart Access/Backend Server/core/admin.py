@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import User, Room, RoomGroup, UserRoomGroup, AccessLog, Company, InviteToken
+from .models import User, Room, RoomGroup, UserRoomGroup, AccessLog, Company, InviteToken, DoorEvent, EnrollmentJob, BulkEnrollment, Task, PeriodicTask, OutboundEmail
 from django.utils import timezone
 
 # The CompanyAdmin class customizes how Company objects are displayed in the Django admin interface.
@@ -21,13 +21,32 @@ class CompanyAdmin(admin.ModelAdmin):
         return obj.rooms.count()
     get_rooms_count.short_description = 'Number of Rooms'
 
+# The InviteTokenStatusFilter lets the token list be narrowed to valid, used or expired tokens in SQL. Expired
+# means no longer valid (used or past expires_at), like InviteToken.is_expired and ?status=expired on the API.
+class InviteTokenStatusFilter(admin.SimpleListFilter):
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return (('valid', 'Valid'), ('used', 'Used'), ('expired', 'Expired'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'valid':
+            return queryset.valid()
+        if self.value() == 'used':
+            return queryset.filter(is_used=True)
+        if self.value() == 'expired':
+            return queryset.expired()
+        return queryset
+
 # The InviteTokenAdmin class manages invitation tokens in the admin interface.
 # It displays token info including email, role, company, expiration, and status,
 # with color-coded status indicators.
 @admin.register(InviteToken)
 class InviteTokenAdmin(admin.ModelAdmin):
     list_display = ('email', 'role', 'company', 'created_by', 'created_at', 'expires_at', 'is_used', 'status')
-    list_filter = ('company', 'role', 'is_used', 'created_at')
+    list_filter = ('company', InviteTokenStatusFilter, 'role', 'created_at')
+    list_select_related = ('company', 'created_by')
     search_fields = ('email', 'token', 'company__name', 'created_by__username')
     readonly_fields = ('token', 'created_at', 'is_expired')
     ordering = ('-created_at',)
@@ -92,5 +111,78 @@ class RoomAdmin(admin.ModelAdmin):
     search_fields = ('room_id', 'name', 'company__name')
     ordering = ('room_id',)
 
+# The DoorEventAdmin class lists door activity reported by room controllers.
+# Events are read-only here since they are an audit trail written by the devices.
+@admin.register(DoorEvent)
+class DoorEventAdmin(admin.ModelAdmin):
+    list_display = ('device_id', 'sequence', 'event_type', 'room', 'occurred_at', 'access_log')
+    list_filter = ('event_type', 'company')
+    search_fields = ('device_id', 'room__room_id', 'room__name')
+    ordering = ('-occurred_at',)
+    list_select_related = ('room', 'access_log')
+    readonly_fields = ('device_id', 'sequence', 'event_type', 'occurred_at', 'received_at', 'room', 'company', 'access_log')
+
+# The EnrollmentJobAdmin class lists registrations queued for background processing, so failed or stalled
+# enrollments can be inspected. Jobs are read-only since the workers own their state.
+@admin.register(EnrollmentJob)
+class EnrollmentJobAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'status', 'stage', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('username', 'email', 'company_name')
+    ordering = ('-created_at',)
+    exclude = ('password',)
+    readonly_fields = ('status', 'stage', 'progress', 'username', 'email', 'phone_number', 'full_name', 'invite_token',
+                       'company_name', 'face_upload', 'voice_upload', 'user', 'error', 'errors', 'started_at', 'finished_at')
+
+# The BulkEnrollmentAdmin class lists bulk provisioning runs with their row counts; the per-row report is
+# available from the admin API.
+@admin.register(BulkEnrollment)
+class BulkEnrollmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'created_by', 'status', 'total_rows', 'created_count', 'skipped_count', 'failed_count', 'created_at')
+    list_filter = ('status', 'company')
+    ordering = ('-created_at',)
+    exclude = ('report', 'activation_tokens')
+    readonly_fields = ('company', 'created_by', 'status', 'manifest_path', 'archive_path', 'total_rows', 'created_count',
+                       'skipped_count', 'failed_count', 'attempts', 'error', 'finished_at')
+
+# The TaskAdmin class shows the background task queue, with failed tasks' errors for troubleshooting.
+# The retry action queues selected failed tasks again with a fresh set of attempts.
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    ordering = ('-created_at',)
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error')
+    actions = ['retry_tasks']
+
+    def retry_tasks(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='queued', attempts=0, run_at=timezone.now(), finished_at=None)
+        self.message_user(request, f'{updated} tasks queued again')
+    retry_tasks.short_description = 'Retry selected failed tasks'
+
+# The PeriodicTaskAdmin class lists the schedules from TASK_SCHEDULES; schedules can be paused by unticking enabled.
+@admin.register(PeriodicTask)
+class PeriodicTaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'task', 'interval_seconds', 'enabled', 'last_run_at', 'next_run_at')
+    list_editable = ('enabled',)
+    ordering = ('name',)
+
+# The OutboundEmailAdmin class shows the outbound mail queue with delivery errors.
+# The retry action queues selected failed messages again with a fresh set of attempts.
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'template')
+    search_fields = ('to_email', 'subject')
+    ordering = ('-created_at',)
+    readonly_fields = ('invite_token', 'locked_by', 'locked_at', 'created_at', 'sent_at', 'last_error')
+    actions = ['retry_emails']
+
+    def retry_emails(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='queued', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} emails queued again')
+    retry_emails.short_description = 'Retry selected failed emails'
+
 # The RoomGroupAdmin class manages room groups in the admin interface.
 # It displays group details and counts of associated rooms and users.
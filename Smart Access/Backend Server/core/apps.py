@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Register model signal handlers
+        from . import signals  # noqa: F401
+        # Register the deployment checks
+        from . import checks  # noqa: F401
+        from .sqlite import apply_sqlite_tuning
+        connection_created.connect(apply_sqlite_tuning, dispatch_uid='core.apply_sqlite_tuning')
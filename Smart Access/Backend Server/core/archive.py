@@ -0,0 +1,184 @@
+# core/archive.py
+import gzip
+import json
+import os
+from collections import deque
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import AccessLog, AccessLogArchiveSegment
+from .pagination import decode_cursor, encode_cursor
+
+# Fields stored for every archived log. user_id is kept so regular users can still be limited to their own entries.
+ARCHIVE_FIELDS = (
+    'id', 'timestamp', 'user_id', 'user__username', 'room__room_id', 'room__name', 'access_granted',
+    'face_spoofing_result', 'speaker_similarity_score', 'audio_deepfake_result', 'transcription_score',
+    'failure_reason',
+)
+ARCHIVE_COLUMNS = (
+    'id', 'timestamp', 'user_id', 'username', 'room_id', 'room_name', 'access_granted',
+    'face_spoofing_result', 'speaker_similarity_score', 'audio_deepfake_result', 'transcription_score',
+    'failure_reason',
+)
+DELETE_CHUNK_SIZE = 500
+
+
+def _month_start(timestamp):
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month_start):
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def archive_company_logs(company, now=None, segment_rows=None):
+    """
+    Move a company's access logs older than its retention period into archive segments.
+    Rows are written one segment at a time (never more than segment_rows in memory), the file is
+    synced to disk, and only then are the rows indexed and deleted from the hot table.
+    Returns the number of logs archived.
+    """
+    if not company.access_log_retention_days:
+        return 0
+
+    now = now or timezone.now()
+    segment_rows = segment_rows or settings.ACCESS_LOG_ARCHIVE_SEGMENT_ROWS
+    cutoff = now - timedelta(days=company.access_log_retention_days)
+    aged = AccessLog.objects.filter(company=company, timestamp__lt=cutoff).order_by('timestamp', 'id')
+
+    archived = 0
+    while True:
+        oldest = aged.values_list('timestamp', flat=True).first()
+        if oldest is None:
+            break
+        month = _month_start(oldest)
+        # Segments never span a month boundary, so a month's logs can be located by its index rows
+        rows = list(aged.filter(timestamp__lt=_next_month(month)).values_list(*ARCHIVE_FIELDS)[:segment_rows])
+        archived += _write_segment(company, month, [dict(zip(ARCHIVE_COLUMNS, row)) for row in rows])
+    return archived
+
+
+def _write_segment(company, month, rows):
+    first_id, last_id = rows[0]['id'], rows[-1]['id']
+    relative_path = os.path.join(str(company.id), f'{month:%Y-%m}', f'{first_id}-{last_id}.ndjson.gz')
+    full_path = os.path.join(settings.ACCESS_LOG_ARCHIVE_ROOT, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    # Write to a temporary name and rename, so a crash never leaves a truncated segment behind
+    temp_path = f'{full_path}.tmp'
+    with open(temp_path, 'wb') as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode='wb') as gz_file:
+            for row in rows:
+                line = dict(row, timestamp=row['timestamp'].isoformat())
+                gz_file.write((json.dumps(line) + '\n').encode())
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+    os.replace(temp_path, full_path)
+
+    with transaction.atomic():
+        AccessLogArchiveSegment.objects.update_or_create(
+            path=relative_path,
+            defaults={
+                'company': company,
+                'month': month.date(),
+                'start_timestamp': rows[0]['timestamp'],
+                'end_timestamp': rows[-1]['timestamp'],
+                'first_log_id': first_id,
+                'last_log_id': last_id,
+                'row_count': len(rows),
+                'size_bytes': os.path.getsize(full_path),
+            }
+        )
+        ids = [row['id'] for row in rows]
+        for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+            AccessLog.objects.filter(id__in=ids[start:start + DELETE_CHUNK_SIZE]).delete()
+    return len(rows)
+
+
+def iter_segment(segment):
+    """Stream the rows of one archive segment, oldest first, with timestamps parsed back to datetimes"""
+    full_path = os.path.join(settings.ACCESS_LOG_ARCHIVE_ROOT, segment.path)
+    with gzip.open(full_path, 'rt') as gz_file:
+        for line in gz_file:
+            row = json.loads(line)
+            row['timestamp'] = parse_datetime(row['timestamp'])
+            yield row
+
+
+def _parse_bound(value, end=False):
+    """Parse a start_date/end_date query value the way the database filter would interpret it"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        moment = timezone.datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def archived_page(user, params, cursor=None, page_size=100):
+    """
+    Fetch one page of archived access logs visible to a user, newest first, honouring the
+    list_access_logs filters. Only segments overlapping the requested range are opened.
+    Returns (rows, next_cursor) with rows shaped like AccessLogSerializer output.
+    """
+    start = _parse_bound(params.get('start_date'))
+    end = _parse_bound(params.get('end_date'))
+    room_id = params.get('room_id')
+    access_status = params.get('access_status')
+    username = params.get('username') if user.is_admin else None
+
+    segments = AccessLogArchiveSegment.objects.filter(company=user.company)
+    if start:
+        segments = segments.filter(end_timestamp__gte=start)
+    if end:
+        segments = segments.filter(start_timestamp__lte=end)
+    position = None
+    if cursor:
+        position = decode_cursor(cursor)
+        segments = segments.filter(start_timestamp__lte=position[0])
+
+    # Segments are written oldest first, so the newest rows of a page are the last matches before the cursor. Each
+    # segment is streamed into a queue that only keeps as many matches as the page still needs, and reading stops
+    # at the cursor or the end of the range; once the page is full no older segment is opened.
+    page = []
+    for segment in segments.order_by('-end_timestamp', '-last_log_id').iterator():
+        matches = deque(maxlen=page_size + 1 - len(page))
+        for row in iter_segment(segment):
+            if position and (row['timestamp'], row['id']) >= position:
+                break
+            if end and row['timestamp'] > end:
+                break
+            if start and row['timestamp'] < start:
+                continue
+            if not user.is_admin and row['user_id'] != user.id:
+                continue
+            if room_id and row['room_id'] != room_id:
+                continue
+            if access_status and row['access_granted'] != (access_status.lower() == 'true'):
+                continue
+            if username and row['username'] != username:
+                continue
+            matches.append(row)
+        page.extend(reversed(matches))
+        if len(page) > page_size:
+            break
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1]['timestamp'], page[-1]['id'])
+
+    company_name = user.company.name if user.company else None
+    results = []
+    for row in page:
+        row = dict(row, company_name=company_name)
+        row.pop('user_id')
+        results.append(row)
+    return results, next_cursor
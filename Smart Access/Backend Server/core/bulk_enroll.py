@@ -0,0 +1,359 @@
+# core/bulk_enroll.py
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from . import effective_access, response_cache, revisions
+from .enrollment import EnrollmentError, check_face, check_voice
+from .models import BulkEnrollment, InviteToken, RoomGroup, User, UserRoomGroup
+from .utils import CIPHER_SUITE
+
+logger = logging.getLogger(__name__)
+
+# Manifest columns. face and voice are paths inside the sample archive, groups is a ';'-separated list of room
+# group names, and role is 'user' (default) or 'admin'. Rows without a password get an activation token instead.
+REQUIRED_FIELDS = ('username', 'email', 'full_name', 'face', 'voice')
+OPTIONAL_FIELDS = ('phone_number', 'role', 'password', 'groups')
+BATCH_SIZE = 200
+STAGE_CHUNK_SIZE = 1024 * 1024
+
+
+class ManifestError(Exception):
+    """The manifest as a whole could not be read"""
+
+
+def stage_encrypted(upload, path):
+    """
+    Write an upload to path encrypted, as a sequence of Fernet tokens (one per STAGE_CHUNK_SIZE bytes, each preceded
+    by its length), so a large sample archive is never held in memory or stored in plain text
+    """
+    with open(path, 'wb') as staged:
+        for chunk in upload.chunks(STAGE_CHUNK_SIZE):
+            token = CIPHER_SUITE.encrypt(chunk)
+            staged.write(len(token).to_bytes(4, 'big') + token)
+
+
+def read_staged(path, destination):
+    """Decrypt a file written by stage_encrypted into the open binary file destination"""
+    with open(path, 'rb') as staged:
+        while header := staged.read(4):
+            destination.write(CIPHER_SUITE.decrypt(staged.read(int.from_bytes(header, 'big'))))
+
+
+def read_manifest(data, filename):
+    """Parse a CSV or JSON (a list of objects) manifest into a list of row dicts"""
+    try:
+        text = data.decode('utf-8-sig')
+        if filename.lower().endswith('.json'):
+            rows = json.loads(text)
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ManifestError('A JSON manifest must be a list of objects')
+        else:
+            rows = list(csv.DictReader(io.StringIO(text)))
+    except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+        raise ManifestError(f'Could not read the manifest: {e}')
+    if not rows:
+        raise ManifestError('The manifest has no rows')
+    return [
+        {field: str(row.get(field) or '').strip() for field in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+        for row in rows
+    ]
+
+
+def _entry(index, row, status, **fields):
+    return {'row': index + 1, 'username': row['username'], 'status': status, **fields}
+
+
+def validate(rows, company, archive):
+    """
+    Check every row without touching the samples' contents. Returns (valid, report): the (index, row) pairs to
+    enroll and report entries for rows that failed validation or whose user already exists from an earlier run.
+    Existing usernames and emails are looked up with one IN query each.
+    """
+    usernames = [row['username'] for row in rows]
+    emails = [row['email'] for row in rows]
+    existing = {
+        username: (email, company_id)
+        for username, email, company_id in User.objects.filter(username__in=usernames)
+        .values_list('username', 'email', 'company_id')
+    }
+    taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    group_names = {name.strip() for row in rows for name in row['groups'].split(';') if name.strip()}
+    groups = dict(RoomGroup.objects.filter(company=company, name__in=group_names).values_list('name', 'id'))
+    archive_names = set(archive.namelist())
+    max_size = settings.BULK_ENROLL_MAX_SAMPLE_SIZE
+
+    valid, report, seen_usernames, seen_emails = [], [], set(), set()
+    for index, row in enumerate(rows):
+        errors = {}
+        for field in REQUIRED_FIELDS:
+            if not row[field]:
+                errors.setdefault(field, []).append('This field is required.')
+        if len(row['phone_number']) > User._meta.get_field('phone_number').max_length:
+            errors.setdefault('phone_number', []).append('Phone number is too long.')
+        if row['role'] not in ('', 'user', 'admin'):
+            errors.setdefault('role', []).append("Role must be 'user' or 'admin'.")
+        for field in ('face', 'voice'):
+            if row[field] and row[field] not in archive_names:
+                errors.setdefault(field, []).append('File not found in the archive.')
+            elif row[field] and archive.getinfo(row[field]).file_size > max_size:
+                errors.setdefault(field, []).append('File is too large.')
+        unknown = [name for name in row['groups'].split(';') if name.strip() and name.strip() not in groups]
+        if unknown:
+            errors.setdefault('groups', []).append(f'Unknown room groups: {", ".join(unknown)}')
+        if row['username'] in seen_usernames:
+            errors.setdefault('username', []).append('Duplicate username in the manifest.')
+        if row['email'] in seen_emails:
+            errors.setdefault('email', []).append('Duplicate email in the manifest.')
+        seen_usernames.add(row['username'])
+        seen_emails.add(row['email'])
+
+        if row['username'] in existing:
+            if existing[row['username']] == (row['email'], company.id):
+                # Enrolled by an earlier run of this manifest
+                report.append(_entry(index, row, 'skipped', message='Already enrolled.'))
+                continue
+            errors.setdefault('username', []).append('Username already exists.')
+        elif row['email'] in taken_emails:
+            errors.setdefault('email', []).append('Email already exists.')
+
+        if errors:
+            report.append(_entry(index, row, 'failed', errors=errors))
+        else:
+            row['group_ids'] = [groups[name.strip()] for name in row['groups'].split(';') if name.strip()]
+            valid.append((index, row))
+    return valid, report
+
+
+def prepare_samples(index, archive_path, face_name, voice_name, password):
+    """
+    Decode, quality-check, embed and encrypt one user's samples and hash their password. Runs in a worker process,
+    which reads the samples from the archive itself, so only names and paths cross the process boundary. Returns
+    (index, result) where result has either 'errors' or the paths of the encrypted samples (temporary files the
+    caller deletes) and the password hash.
+    """
+    paths, encrypted = [], []
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for name, suffix in ((face_name, '.jpg'), (voice_name, '.wav')):
+                with archive.open(name) as member, tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+                    paths.append(temp_file.name)
+                    shutil.copyfileobj(member, temp_file)
+        check_face(paths[0])
+        check_voice(paths[1])
+        for path in paths:
+            with open(path, 'rb') as sample, tempfile.NamedTemporaryFile(suffix='.enc', delete=False) as temp_file:
+                encrypted.append(temp_file.name)
+                temp_file.write(CIPHER_SUITE.encrypt(sample.read()))
+    except EnrollmentError as e:
+        field = {'face_image': 'face', 'voice_recording': 'voice'}.get(e.field, e.field)
+        return index, {'errors': {field: [str(e)]}}
+    except Exception as e:
+        for path in encrypted:
+            os.unlink(path)
+        return index, {'errors': {'non_field_errors': [f'Processing failed: {e}']}}
+    finally:
+        for path in paths:
+            os.unlink(path)
+
+    return index, {
+        'face': encrypted[0],
+        'voice': encrypted[1],
+        # An unusable password until the user activates the account with their token
+        'password': make_password(password or None),
+    }
+
+
+def _create_batch(batch, company, created_by):
+    """
+    Create the users of one processed batch with bulk_create: the users, their activation tokens and their group
+    memberships, and the effective room access the UserRoomGroup signal would otherwise have written.
+    Returns the report entries.
+    """
+    report, stored = [], []
+    users, tokens, memberships = [], [], []
+    face_field = User._meta.get_field('face_reference_image')
+    voice_field = User._meta.get_field('voice_reference')
+    try:
+        with transaction.atomic():
+            revision = revisions.next_revision(company.id)
+            for index, row, result in batch:
+                user = User(
+                    username=row['username'], email=row['email'], full_name=row['full_name'],
+                    phone_number=row['phone_number'], company=company, is_admin=row['role'] == 'admin',
+                    password=result['password'], revision=revision,
+                )
+                with open(result['face'], 'rb') as face_file, open(result['voice'], 'rb') as voice_file:
+                    user.face_reference_image.name = default_storage.save(
+                        face_field.generate_filename(user, f'{user.username}_face.jpg'), File(face_file)
+                    )
+                    user.voice_reference.name = default_storage.save(
+                        voice_field.generate_filename(user, f'{user.username}_voice.wav'), File(voice_file)
+                    )
+                stored += [user.face_reference_image.name, user.voice_reference.name]
+                users.append(user)
+
+            User.objects.bulk_create(users)
+            # bulk_create does not return primary keys on every backend, so read them back
+            ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+
+            expires_at = timezone.now() + timedelta(days=settings.BULK_ENROLL_ACTIVATION_DAYS)
+            for (index, row, result), user in zip(batch, users):
+                user.id = ids[user.username]
+                entry = _entry(index, row, 'created', user_id=user.id)
+                if not row['password']:
+                    token = InviteToken(
+                        company=company, email=user.email, role=row['role'] or 'user', token=secrets.token_urlsafe(32),
+                        expires_at=expires_at, used_by=user, created_by=created_by,
+                    )
+                    tokens.append(token)
+                    entry['activation_token'] = token.token
+                memberships += [
+                    UserRoomGroup(user_id=user.id, room_group_id=group_id, revision=revision)
+                    for group_id in row['group_ids']
+                ]
+                report.append(entry)
+
+            InviteToken.objects.bulk_create(tokens)
+            UserRoomGroup.objects.bulk_create(memberships, ignore_conflicts=True)
+            effective_access.grant_groups((m.user_id, m.room_group_id) for m in memberships)
+            response_cache.invalidate(company.id, 'users')
+    except Exception as e:
+        logger.exception('Bulk enrollment batch failed')
+        for name in stored:
+            default_storage.delete(name)
+        return [_entry(index, row, 'failed', errors={'non_field_errors': [f'Could not create user: {e}']})
+                for index, row, result in batch]
+    return report
+
+
+def enroll(rows, archive_path, company, created_by=None, workers=None, report=None, on_batch=None):
+    """
+    Enroll the manifest rows with samples from the zip archive at archive_path. Rows that report (from an
+    interrupted run) lists as created or skipped are not processed again; failed rows are retried. Samples are
+    processed in a pool of worker processes and users are created batch by batch; on_batch(report) is called after
+    each batch so callers can save progress. Returns the full report, ordered by row.
+    """
+    report = [entry for entry in report or [] if entry['status'] != 'failed']
+    done = {entry['row'] for entry in report}
+    with zipfile.ZipFile(archive_path) as archive:
+        valid, invalid = validate(rows, company, archive)
+    report += [entry for entry in invalid if entry['row'] not in done]
+    pending = [(index, row) for index, row in valid if index + 1 not in done]
+
+    workers = settings.BULK_ENROLL_WORKERS if workers is None else workers
+    pool = None
+    if workers:
+        # Spawned, not forked: the caller may be one of run_worker's threads, and forking a multithreaded process
+        # can copy a lock some other thread holds. Each worker sets Django up again and opens no database connection
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+        )
+    try:
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = dict(pending[start:start + BATCH_SIZE])
+            jobs = [(index, archive_path, row['face'], row['voice'], row['password']) for index, row in chunk.items()]
+            results = pool.map(prepare_samples, *zip(*jobs)) if pool else (prepare_samples(*job) for job in jobs)
+
+            batch = []
+            try:
+                for index, result in results:
+                    if 'errors' in result:
+                        report.append(_entry(index, chunk[index], 'failed', errors=result['errors']))
+                    else:
+                        batch.append((index, chunk[index], result))
+                if batch:
+                    report += _create_batch(batch, company, created_by)
+            finally:
+                for index, row, result in batch:
+                    os.unlink(result['face'])
+                    os.unlink(result['voice'])
+            report.sort(key=lambda entry: entry['row'])
+            if on_batch:
+                on_batch(report)
+    finally:
+        if pool:
+            pool.shutdown()
+    report.sort(key=lambda entry: entry['row'])
+    return report
+
+
+def summarize(report):
+    counts = {'created': 0, 'skipped': 0, 'failed': 0}
+    for entry in report:
+        counts[entry['status']] += 1
+    return counts
+
+
+def discard_staged(bulk):
+    """Delete a bulk enrollment's staged manifest and archive"""
+    shutil.rmtree(os.path.dirname(bulk.manifest_path), ignore_errors=True)
+
+
+def run_bulk_enrollment(bulk_id):
+    """
+    Process a BulkEnrollment started from the admin API, saving the report after every batch. The staged uploads
+    are decrypted into temporary files for the run and deleted once the enrollment completes or can no longer
+    succeed: a manifest or archive that cannot be read, or the last of BULK_ENROLL_MAX_ATTEMPTS failing.
+    """
+    bulk = BulkEnrollment.objects.select_related('company', 'created_by').get(pk=bulk_id)
+    if bulk.status == 'completed':
+        return
+    attempt = bulk.attempts + 1
+    BulkEnrollment.objects.filter(pk=bulk.pk).update(status='processing', attempts=attempt)
+
+    def save_progress(report, **fields):
+        # Activation tokens are kept out of the stored report; the status endpoint hands each one out once
+        tokens = {}
+        for entry in report:
+            token = entry.pop('activation_token', None)
+            if token:
+                tokens[str(entry['row'])] = token
+                entry['activation_token_issued'] = True
+        with transaction.atomic():
+            pending = BulkEnrollment.objects.select_for_update().values_list('activation_tokens', flat=True).get(pk=bulk.pk)
+            BulkEnrollment.objects.filter(pk=bulk.pk).update(
+                report=report, activation_tokens={**pending, **tokens},
+                **{f'{status}_count': count for status, count in summarize(report).items()}, **fields
+            )
+
+    keep_staged = False
+    try:
+        manifest = io.BytesIO()
+        read_staged(bulk.manifest_path, manifest)
+        rows = read_manifest(manifest.getvalue(), bulk.manifest_path)
+        BulkEnrollment.objects.filter(pk=bulk.pk).update(total_rows=len(rows))
+        with tempfile.NamedTemporaryFile(suffix='.zip') as archive:
+            read_staged(bulk.archive_path, archive)
+            archive.flush()
+            report = enroll(rows, archive.name, bulk.company, bulk.created_by, report=bulk.report, on_batch=save_progress)
+    except (ManifestError, zipfile.BadZipFile) as e:
+        BulkEnrollment.objects.filter(pk=bulk.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        return
+    except Exception as e:
+        final = attempt >= settings.BULK_ENROLL_MAX_ATTEMPTS
+        # Otherwise the task is retried and continues from the saved report, with the staged uploads
+        keep_staged = not final
+        BulkEnrollment.objects.filter(pk=bulk.pk).update(
+            status='failed', error=str(e), **({'finished_at': timezone.now()} if final else {})
+        )
+        raise
+    finally:
+        if not keep_staged:
+            discard_staged(bulk)
+    save_progress(report, status='completed', finished_at=timezone.now())
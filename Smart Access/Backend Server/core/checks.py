@@ -0,0 +1,46 @@
+# core/checks.py
+from django.conf import settings
+from django.core.checks import Warning, register
+from . import compression, renderers
+
+# Cache backends whose incr() is a single atomic operation shared by every process
+ATOMIC_INCR_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+@register(deploy=True)
+def check_lockout_cache(app_configs, **kwargs):
+    # The failed-attempt counters of core/lockout.py are cache increments. The file and database caches implement
+    # incr() as a read and a write, so failures racing in from several processes can be lost
+    if settings.CACHES['default']['BACKEND'] in ATOMIC_INCR_BACKENDS:
+        return []
+    return [Warning(
+        'The default cache cannot increment counters atomically across processes, so concurrent failed logins '
+        'can go uncounted by the lockout.',
+        hint='Set REDIS_URL (or configure another Redis or Memcached cache) in production.',
+        id='core.W001',
+    )]
+
+
+@register(deploy=True)
+def check_optional_speedups(app_configs, **kwargs):
+    # orjson and brotli are optional imports; without them the renderer and the compression middleware fall back
+    # to the stock json encoder and to gzip without saying so
+    warnings = []
+    renderer_classes = settings.REST_FRAMEWORK.get('DEFAULT_RENDERER_CLASSES', ())
+    if renderers.orjson is None and 'core.renderers.FastJSONRenderer' in renderer_classes:
+        warnings.append(Warning(
+            'orjson is not installed, so FastJSONRenderer renders responses with the stock json encoder.',
+            hint='pip install orjson',
+            id='core.W002',
+        ))
+    if compression.brotli is None and 'core.compression.CompressionMiddleware' in settings.MIDDLEWARE:
+        warnings.append(Warning(
+            'brotli is not installed, so responses are only ever gzipped.',
+            hint='pip install brotli',
+            id='core.W003',
+        ))
+    return warnings
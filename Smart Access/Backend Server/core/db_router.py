@@ -0,0 +1,85 @@
+# core/db_router.py
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+# Set while a view decorated with use_replica runs, and when the current request has written to the primary
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+# Sessions are read on every request and written right after login, so they always stay on the primary
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+def replica_enabled():
+    return bool(getattr(settings, 'REPLICA_DATABASE', None))
+
+
+def is_pinned(request):
+    """True when the client wrote recently and must read its own writes from the primary"""
+    return bool(request.COOKIES.get(settings.REPLICA_PIN_COOKIE))
+
+
+# The PrimaryReplicaRouter sends reads made inside use_replica views to the replica alias and every write to the
+# primary. Without a configured replica (REPLICA_DATABASE = None) it routes nothing and Django uses 'default'.
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            _wrote_to_primary.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so objects from either side may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema with the data when it is synced from the primary
+        if replica_enabled() and db == settings.REPLICA_DATABASE:
+            return False
+        return None
+
+
+def use_replica(view):
+    """
+    Serve the reads of a read-only view from the replica, unless the client is pinned to the primary.
+    Apply it below @api_view so authentication and the session are still handled on the primary.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_enabled() or is_pinned(request):
+            return view(request, *args, **kwargs)
+        token = _read_from_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_from_replica.reset(token)
+    return wrapper
+
+
+# The PrimaryPinningMiddleware gives read-your-writes: when a request writes to the primary, the response sets a
+# short-lived cookie and that client's use_replica views read from the primary until the replica has caught up.
+# It sits after SessionMiddleware, so the session save at the end of every request does not count as a write.
+class PrimaryPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            if replica_enabled() and _wrote_to_primary.get():
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    secure=settings.SESSION_COOKIE_SECURE,
+                    httponly=True,
+                    samesite=settings.SESSION_COOKIE_SAMESITE,
+                )
+        finally:
+            _wrote_to_primary.reset(token)
+        return response
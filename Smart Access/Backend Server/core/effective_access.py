@@ -0,0 +1,111 @@
+# core/effective_access.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from .models import EffectiveRoomAccess, Room, UserRoomGroup
+
+INSERT_BATCH_SIZE = 1000
+
+_maintained_by_caller = ContextVar('effective_access_maintained_by_caller', default=False)
+
+
+@contextmanager
+def maintained_by_caller():
+    """
+    Silence the per-row signal handlers while a bulk operation updates EffectiveRoomAccess itself, e.g. a queryset
+    delete of thousands of UserRoomGroup rows followed by one revoke_groups call
+    """
+    token = _maintained_by_caller.set(True)
+    try:
+        yield
+    finally:
+        _maintained_by_caller.reset(token)
+
+
+def is_maintained_by_caller():
+    return _maintained_by_caller.get()
+
+
+def grant_groups(pairs):
+    """Add effective access for (user_id, room_group_id) pairs to every room in those groups"""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    users_by_group = {}
+    for user_id, group_id in pairs:
+        users_by_group.setdefault(group_id, set()).add(user_id)
+
+    rows = [
+        EffectiveRoomAccess(user_id=user_id, room_id=room_id)
+        for room_id, group_id in Room.objects.filter(group_id__in=users_by_group).values_list('id', 'group_id')
+        for user_id in users_by_group[group_id]
+    ]
+    EffectiveRoomAccess.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+
+
+def revoke_groups(pairs):
+    """Remove effective access for (user_id, room_group_id) pairs; a room belongs to exactly one group"""
+    users_by_group = {}
+    for user_id, group_id in set(pairs):
+        users_by_group.setdefault(group_id, set()).add(user_id)
+    # One IN delete per group keeps the statement size bounded however many pairs are revoked
+    for group_id, user_ids in users_by_group.items():
+        EffectiveRoomAccess.objects.filter(room__group_id=group_id, user_id__in=user_ids).delete()
+
+
+def sync_room(room):
+    """Recompute who can open a room, e.g. after it was created or moved to another group"""
+    with transaction.atomic():
+        EffectiveRoomAccess.objects.filter(room=room).delete()
+        user_ids = UserRoomGroup.objects.filter(room_group_id=room.group_id).values_list('user_id', flat=True)
+        EffectiveRoomAccess.objects.bulk_create(
+            [EffectiveRoomAccess(user_id=user_id, room_id=room.id) for user_id in user_ids],
+            batch_size=INSERT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+
+def sync_rooms(room_ids):
+    """sync_room for many rooms at once, e.g. after rooms were created or moved with bulk_create/bulk_update"""
+    room_ids = list(room_ids)
+    if not room_ids:
+        return
+    with transaction.atomic():
+        EffectiveRoomAccess.objects.filter(room_id__in=room_ids).delete()
+        rows = [
+            EffectiveRoomAccess(user_id=user_id, room_id=room_id)
+            for room_id, user_id in Room.objects.filter(id__in=room_ids, group__userroomgroup__isnull=False)
+            .values_list('id', 'group__userroomgroup__user_id')
+        ]
+        EffectiveRoomAccess.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+
+
+def sync_user(user_id):
+    """Recompute every room a user can open from their room groups"""
+    with transaction.atomic():
+        EffectiveRoomAccess.objects.filter(user_id=user_id).delete()
+        group_ids = UserRoomGroup.objects.filter(user_id=user_id).values_list('room_group_id', flat=True)
+        grant_groups((user_id, group_id) for group_id in group_ids)
+
+
+def rebuild_all():
+    """Recompute the whole table from UserRoomGroup. Returns the number of rows written."""
+    written = 0
+    with transaction.atomic():
+        EffectiveRoomAccess.objects.all().delete()
+        pairs = (
+            UserRoomGroup.objects
+            .filter(room_group__rooms__isnull=False)
+            .values_list('user_id', 'room_group__rooms__id')
+            .order_by()
+        )
+        batch = []
+        for user_id, room_id in pairs.iterator(chunk_size=INSERT_BATCH_SIZE):
+            batch.append(EffectiveRoomAccess(user_id=user_id, room_id=room_id))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                EffectiveRoomAccess.objects.bulk_create(batch, ignore_conflicts=True)
+                written += len(batch)
+                batch = []
+        EffectiveRoomAccess.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
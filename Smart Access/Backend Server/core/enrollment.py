@@ -0,0 +1,205 @@
+# core/enrollment.py
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Company, EnrollmentJob, InviteToken, User
+from .task_queue import enqueue
+from .utils import BiometricEncryption, get_biometric_verifier
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'processing')
+
+
+class EnrollmentError(Exception):
+    """A problem with the submitted registration, reported to the client as a field error"""
+    def __init__(self, message, field='non_field_errors'):
+        super().__init__(message)
+        self.field = field
+
+
+def staging_dir(job_id):
+    return os.path.join(settings.ENROLLMENT_STAGING_DIR, str(job_id))
+
+
+def stage_upload(job_id, upload, filename):
+    """
+    Write an uploaded file, encrypted, to the job's staging directory and return its path. Staged samples are
+    kept until a worker runs the job, which may be a while, so they are encrypted like the stored references.
+    """
+    directory = staging_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    BiometricEncryption().encrypt_upload(upload, path)
+    return path
+
+
+def discard_staged(job_id):
+    """Delete a job's staged uploads"""
+    shutil.rmtree(staging_dir(job_id), ignore_errors=True)
+
+
+def _decrypt_staged(path):
+    """Decrypt a staged upload into a temporary file for the checks; the caller deletes it"""
+    plain = BiometricEncryption().decrypt_file(path)
+    if plain is None:
+        raise Exception('Failed to decrypt the staged biometric data.')
+    return plain
+
+
+def _set_stage(job, stage, progress):
+    EnrollmentJob.objects.filter(pk=job.pk).update(stage=stage, progress=progress)
+
+
+def check_face(path):
+    """Decode the face image, make sure it shows exactly one detectable face and compute its face embedding"""
+    from deepface import DeepFace
+    try:
+        # The model room access verifies with; a face it cannot embed is rejected now rather than at the door
+        faces = DeepFace.represent(img_path=path, model_name='VGG-Face', enforce_detection=True)
+    except ValueError:
+        raise EnrollmentError('No face could be detected in the face image.', 'face_image')
+    if len(faces) != 1:
+        raise EnrollmentError('The face image must show exactly one face.', 'face_image')
+
+
+def check_voice(path):
+    """Decode the voice recording, check its length and level, and compute the speaker embedding"""
+    from pydub import AudioSegment
+    try:
+        audio = AudioSegment.from_file(path).set_frame_rate(16000).set_channels(1)
+    except Exception:
+        raise EnrollmentError('The voice recording could not be decoded.', 'voice_recording')
+    if len(audio) < settings.ENROLLMENT_MIN_VOICE_SECONDS * 1000:
+        raise EnrollmentError(
+            f'The voice recording must be at least {settings.ENROLLMENT_MIN_VOICE_SECONDS} seconds long.',
+            'voice_recording'
+        )
+    if audio.dBFS < settings.ENROLLMENT_MIN_VOICE_DBFS:
+        raise EnrollmentError('The voice recording is too quiet.', 'voice_recording')
+
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as wav_file:
+        wav_path = wav_file.name
+    try:
+        audio.export(wav_path, format='wav')
+        # The same embedding room access compares against; a sample the speaker model cannot embed is rejected now
+        get_biometric_verifier()._get_nemo_embedding(wav_path)
+    except Exception:
+        raise EnrollmentError('The voice recording could not be processed.', 'voice_recording')
+    finally:
+        os.unlink(wav_path)
+
+
+def create_account(job):
+    """
+    Create the user (and company, for a new company) from a job whose samples passed the checks. The staged
+    files, already encrypted, are stored as the user's biometric references. Everything happens in one
+    transaction, and stored files are removed again if it fails.
+    """
+    user = User(
+        username=job.username, email=job.email, phone_number=job.phone_number,
+        full_name=job.full_name, password=job.password
+    )
+    try:
+        with transaction.atomic():
+            # Registration only checked these when the job was queued
+            if User.objects.filter(username=job.username).exists():
+                raise EnrollmentError('Username already exists.', 'username')
+            if User.objects.filter(email=job.email).exists():
+                raise EnrollmentError('Email already exists.', 'email')
+
+            if job.invite_token_id:
+                # Claim the token atomically so two registrations cannot both use it
+                claimed = InviteToken.objects.filter(
+                    pk=job.invite_token_id, is_used=False, expires_at__gt=timezone.now()
+                ).update(is_used=True)
+                if not claimed:
+                    raise EnrollmentError('Invite token has expired or already been used.', 'invite_token')
+                token = InviteToken.objects.select_related('company').get(pk=job.invite_token_id)
+                user.company, user.is_admin = token.company, token.role == 'admin'
+            else:
+                if Company.objects.filter(name=job.company_name).exists():
+                    raise EnrollmentError('Company name already exists.', 'company_name')
+                user.company = Company.objects.create(name=job.company_name)
+                user.is_admin = True  # First user of a company is an admin
+
+            with open(job.face_upload, 'rb') as face_file, open(job.voice_upload, 'rb') as voice_file:
+                user.face_reference_image.save(f'{user.username}_face.jpg', File(face_file), save=False)
+                user.voice_reference.save(f'{user.username}_voice.wav', File(voice_file), save=False)
+            user.save()
+
+            if job.invite_token_id:
+                InviteToken.objects.filter(pk=job.invite_token_id).update(used_by=user)
+    except Exception:
+        for field_file in (user.face_reference_image, user.voice_reference):
+            if field_file:
+                field_file.delete(save=False)
+        raise
+    return user
+
+
+def run_job(job_id):
+    """
+    Claim a queued job and process it. A job left in processing for TASK_TIMEOUT seconds (its worker died and the
+    queue ran the task again) can be claimed again. Returns False if the job is not claimable.
+    A database or storage error is re-raised so the queue retries the task: the job goes back to queued with its
+    staged samples, unless this was the last of ENROLLMENT_MAX_ATTEMPTS, in which case it fails for good.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.TASK_TIMEOUT)
+    claimable = Q(status='queued') | Q(status='processing', started_at__lt=stale)
+    claimed = EnrollmentJob.objects.filter(claimable, pk=job_id).update(
+        status='processing', stage='decoding', progress=5, started_at=timezone.now(), attempts=F('attempts') + 1
+    )
+    if not claimed:
+        return False
+
+    job = EnrollmentJob.objects.get(pk=job_id)
+    plain_files = []
+    keep_staged = False
+    try:
+        plain_files.append(_decrypt_staged(job.face_upload))
+        check_face(plain_files[-1])
+        _set_stage(job, 'voice_check', 35)
+        plain_files.append(_decrypt_staged(job.voice_upload))
+        check_voice(plain_files[-1])
+        _set_stage(job, 'encrypting', 75)
+        user = create_account(job)
+    except EnrollmentError as e:
+        _finish(job, 'failed', error=f'Registration failed: {e}', errors={e.field: [str(e)]})
+    except (DatabaseError, OSError) as e:
+        keep_staged = job.attempts < settings.ENROLLMENT_MAX_ATTEMPTS
+        if keep_staged:
+            logger.warning(f'Enrollment job {job.pk} failed (attempt {job.attempts}), retrying: {e}')
+            EnrollmentJob.objects.filter(pk=job.pk).update(status='queued', stage='', progress=0)
+        else:
+            _finish(job, 'failed', error=f'Registration failed: {e}')
+        raise
+    except Exception as e:
+        logger.exception(f'Enrollment job {job.pk} failed')
+        _finish(job, 'failed', error=f'Registration failed: {e}')
+    else:
+        _finish(job, 'completed', user=user)
+    finally:
+        for path in plain_files:
+            os.unlink(path)
+        if not keep_staged:
+            discard_staged(job.pk)
+    return True
+
+
+def _finish(job, status, **fields):
+    EnrollmentJob.objects.filter(pk=job.pk).update(
+        status=status, stage='', progress=100, finished_at=timezone.now(), **fields
+    )
+
+
+def dispatch(job):
+    """Queue the job for `manage.py run_worker`"""
+    enqueue('core.process_enrollment', str(job.pk))
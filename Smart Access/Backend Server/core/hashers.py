@@ -0,0 +1,155 @@
+# core/hashers.py
+import asyncio
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher, make_password, verify_password,
+)
+from .models import User
+
+
+# The Calibrated*PasswordHasher classes take their cost parameters from settings (set them to the values printed
+# by `manage.py calibrate_hashers`; None keeps Django's default). They keep Django's algorithm names, so existing
+# hashes still verify, and a hash made with other parameters is re-encoded on the user's next successful login.
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+def scrypt_maxmem(work_factor, block_size):
+    """Memory limit for one scrypt hash: its 128 * n * r byte table, doubled for headroom"""
+    return 256 * work_factor * block_size
+
+
+class CalibratedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR or ScryptPasswordHasher.work_factor
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        # Same as Django's, except that maxmem follows the hash's own cost: OpenSSL's default limit of 32 MiB is
+        # exceeded from a work factor of 2**15 up, which would fail every login and password change
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=scrypt_maxmem(n, r), dklen=64
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash_)
+
+
+class CalibratedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Requires argon2-cffi (pip install django[argon2])"""
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST or Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST or Argon2PasswordHasher.memory_cost
+
+
+class HashingBusy(Exception):
+    """Raised when PASSWORD_HASH_MAX_PENDING checks are already running or waiting"""
+
+
+_init_lock = threading.Lock()
+_admitted = None  # checks running or waiting for a slot, at most PASSWORD_HASH_MAX_PENDING
+_slots = None  # checks using the CPU, at most PASSWORD_HASH_WORKERS
+_pool = None  # threads for the async path, which must not hash on the event loop
+
+
+def _init():
+    global _admitted, _slots, _pool
+    with _init_lock:
+        if _slots is None:
+            _admitted = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+            _slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS)
+            _pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+
+
+def _verify(password, encoded):
+    """Check a password and, if its hash uses outdated parameters, compute the replacement hash"""
+    is_correct, must_update = verify_password(password, encoded)
+    return is_correct, make_password(password) if is_correct and must_update else None
+
+
+def _hash_for_missing_user(password):
+    # What ModelBackend does for a username that does not exist: one hash with the default hasher
+    make_password(password)
+    return False, None
+
+
+def _store_rehash(user, new_encoded):
+    # Only replace the hash that was verified, never a password changed in the meantime
+    if new_encoded and User.objects.filter(pk=user.pk, password=user.password).update(password=new_encoded):
+        user.password = new_encoded
+
+
+def _admit():
+    _init()
+    if not _admitted.acquire(blocking=False):
+        raise HashingBusy()
+
+
+def _in_slot(func, *args):
+    with _slots:
+        return func(*args)
+
+
+def _call(func, *args):
+    # A sync caller has a thread of its own, so the hash runs on it once a slot is free; handing it to the pool
+    # would only leave this thread blocked on the result
+    if not settings.PASSWORD_HASH_WORKERS:
+        return func(*args)
+    _admit()
+    try:
+        return _in_slot(func, *args)
+    finally:
+        _admitted.release()
+
+
+async def _acall(func, *args):
+    if not settings.PASSWORD_HASH_WORKERS:
+        return func(*args)
+    _admit()
+    future = _pool.submit(_in_slot, func, *args)
+    future.add_done_callback(lambda _: _admitted.release())
+    return await asyncio.wrap_future(future)
+
+
+def check_user_password(user, password):
+    """
+    Verify a user's password like User.check_password, including the rehash on login. With
+    PASSWORD_HASH_WORKERS set, at most that many hashes run at once across the process (hashlib and the
+    scrypt/argon2 bindings release the GIL, so other request threads keep running) and further checks wait for a
+    slot. Raises HashingBusy when PASSWORD_HASH_MAX_PENDING checks are already running or waiting.
+    """
+    is_correct, new_encoded = _call(_verify, password, user.password)
+    _store_rehash(user, new_encoded)
+    return is_correct
+
+
+def check_missing_user_password(password):
+    """
+    Spend as long as a password check on a login for a username that does not exist, as ModelBackend does, so the
+    response time does not tell which usernames exist. Always False; raises HashingBusy like check_user_password.
+    """
+    return _call(_hash_for_missing_user, password)[0]
+
+
+async def acheck_user_password(user, password):
+    """
+    Async variant of check_user_password: the hash runs in a pool thread, sharing the same slots, and the event
+    loop keeps serving other requests meanwhile
+    """
+    is_correct, new_encoded = await _acall(_verify, password, user.password)
+    if new_encoded and await User.objects.filter(pk=user.pk, password=user.password).aupdate(password=new_encoded):
+        user.password = new_encoded
+    return is_correct
@@ -0,0 +1,37 @@
+# core/invite_tokens.py
+import time
+from datetime import timedelta
+from django.utils import timezone
+from .models import InviteToken
+
+SWEEP_CHUNK_SIZE = 1000
+
+
+def dead_tokens(retention_days):
+    """Tokens that expired more than retention_days ago and no registration in progress still needs"""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    # The registration job would otherwise lose its token and create a new company (enrollment.ACTIVE_STATUSES)
+    return InviteToken.objects.filter(expires_at__lt=cutoff).exclude(
+        enrollment_jobs__status__in=('queued', 'processing')
+    )
+
+
+def sweep_dead_tokens(retention_days, chunk_size=SWEEP_CHUNK_SIZE, max_chunks=None, pause=0):
+    """
+    Delete invite tokens that expired more than retention_days ago (used or not), in chunks of chunk_size rows,
+    each in its own short transaction. Tokens of registrations still being processed are kept. Stops after
+    max_chunks chunks if given. Returns the number deleted.
+    """
+    dead = dead_tokens(retention_days)
+    deleted = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        ids = list(dead.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+        # Emails and registration jobs that referenced the tokens keep their rows, with the link cleared
+        deleted += InviteToken.objects.filter(pk__in=ids).delete()[1].get('core.InviteToken', 0)
+        chunks += 1
+        if pause:
+            # Give request threads a chance to take the write lock between chunks
+            time.sleep(pause)
+    return deleted
@@ -0,0 +1,115 @@
+# core/lockout.py
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import User
+from . import response_cache, revisions
+
+
+def client_ip(request):
+    """The client address, read from LOCKOUT_IP_HEADER (REMOTE_ADDR unless a trusted proxy sets another header)"""
+    return request.META.get(settings.LOCKOUT_IP_HEADER) or request.META.get('REMOTE_ADDR', '')
+
+
+# Failures are counted in the cache with a sliding window approximated by two fixed buckets: the count of the
+# current bucket plus the previous bucket weighted by how much of it still overlaps the window, so old failures
+# decay on their own instead of counting forever. Each failure is one cache increment, which is atomic across
+# processes on Redis (or Memcached) only: the file-based fallback cache increments with a read and a write, and
+# failures racing in from several workers can be lost. Production therefore needs REDIS_URL set; the
+# core.W001 deployment check warns otherwise.
+def _window_count(prefix, increment=False):
+    window = settings.LOCKOUT_WINDOW
+    now = time.time()
+    bucket = int(now // window)
+    current_key, previous_key = f'{prefix}:{bucket}', f'{prefix}:{bucket - 1}'
+
+    if increment:
+        cache.add(current_key, 0, timeout=window * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # The bucket expired between add and incr
+            cache.set(current_key, 1, timeout=window * 2)
+            current = 1
+        previous = cache.get(previous_key, 0)
+    else:
+        counts = cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+
+    overlap = 1 - (now % window) / window
+    return current + int(previous * overlap)
+
+
+def _clear_window(prefix):
+    bucket = int(time.time() // settings.LOCKOUT_WINDOW)
+    cache.delete_many([f'{prefix}:{bucket}', f'{prefix}:{bucket - 1}'])
+
+
+def _user_prefix(user):
+    return f'lockout:user:{user.pk}'
+
+
+def _ip_prefix(ip):
+    return f'lockout:ip:{ip}'
+
+
+def record_failure(user, request):
+    """
+    Count a failed authentication step for a user (and the client IP), freezing the account once the user
+    reaches LOCKOUT_MAX_FAILURES failures inside the window. Updates user.is_frozen in place and returns
+    the number of attempts remaining.
+    """
+    record_ip_failure(request)
+    failures = _window_count(_user_prefix(user), increment=True)
+    if failures >= settings.LOCKOUT_MAX_FAILURES and not user.is_frozen:
+        freeze(user, failures)
+    return max(0, settings.LOCKOUT_MAX_FAILURES - failures)
+
+
+def record_ip_failure(request):
+    """Count a failure against the client IP only, e.g. a login for a username that does not exist"""
+    _window_count(_ip_prefix(client_ip(request)), increment=True)
+
+
+def ip_blocked(request):
+    """True when the client IP has too many recent failures across all usernames"""
+    return _window_count(_ip_prefix(client_ip(request))) >= settings.LOCKOUT_IP_MAX_FAILURES
+
+
+def clear_failures(user):
+    """Forget a user's recent failures after a successful login or room access"""
+    _clear_window(_user_prefix(user))
+
+
+def freeze(user, failures):
+    """Persist the frozen state. The conditional update makes exactly one of several racing failures freeze the user"""
+    now = timezone.now()
+    User.objects.filter(pk=user.pk, is_frozen=False).update(is_frozen=True, frozen_at=now, failed_attempts=failures)
+    user.is_frozen, user.frozen_at, user.failed_attempts = True, now, failures
+    # The update sends no signals, so the cached frozen account list is invalidated and the change stamped here
+    response_cache.invalidate(user.company_id, 'users')
+    revisions.stamp(User, user.company_id, [user.pk])
+
+
+def unfreeze(user):
+    """Persist the unfrozen state and start the user with a clean failure window"""
+    User.objects.filter(pk=user.pk).update(is_frozen=False, frozen_at=None, failed_attempts=0)
+    user.is_frozen, user.frozen_at, user.failed_attempts = False, None, 0
+    response_cache.invalidate(user.company_id, 'users')
+    revisions.stamp(User, user.company_id, [user.pk])
+    clear_failures(user)
+
+
+def is_frozen(user):
+    """
+    Whether the account is frozen. With LOCKOUT_COOLDOWN set, accounts frozen for longer than the cool-down
+    are unfrozen automatically on their next attempt.
+    """
+    if not user.is_frozen:
+        return False
+    cooldown = settings.LOCKOUT_COOLDOWN
+    if cooldown and user.frozen_at and timezone.now() - user.frozen_at >= timezone.timedelta(seconds=cooldown):
+        unfreeze(user)
+        return False
+    return True
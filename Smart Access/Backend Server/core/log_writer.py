@@ -0,0 +1,185 @@
+# core/log_writer.py
+import atexit
+import glob
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import AccessLog
+from .rollups import record_access_logs
+
+logger = logging.getLogger(__name__)
+
+
+# The AccessLogWriter class takes access log writes off the request path. Entries are queued in memory and
+# inserted with a single bulk_create once the batch is full or the flush interval passes. Every queued entry
+# is also appended to a per-process spill file first, so entries that were queued but not yet inserted when a
+# worker crashes are replayed by the next writer (or by `manage.py flush_access_logs`). Replay is
+# at-least-once: a crash between the insert and removing the spill file can duplicate that batch. Spill files are
+# named after the process id plus a random suffix, so a restarted worker that gets the same pid (PID 1 in a
+# container) starts a file of its own and replays the old one instead of appending to it.
+class AccessLogWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._spill_file = None
+        self._spill_path = None
+        self._flusher = None
+        self._in_flight = set()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'ACCESS_LOG_BUFFERED', True)
+
+    def write(self, sync=False, **fields):
+        """
+        Record an access log. Takes the same keyword arguments as AccessLog.objects.create.
+        With sync=True (or buffering disabled) the row is inserted immediately and returned.
+        """
+        fields.setdefault('timestamp', timezone.now())
+        if sync or not self.enabled:
+            return AccessLog.objects.create(**fields)
+
+        entry = self._to_entry(AccessLog(**fields))
+        with self._lock:
+            self._ensure_started()
+            self._spill_file.write(json.dumps(entry) + '\n')
+            self._spill_file.flush()
+            if settings.ACCESS_LOG_SPILL_FSYNC:
+                os.fsync(self._spill_file.fileno())
+            self._buffer.append(entry)
+            batch_full = len(self._buffer) >= settings.ACCESS_LOG_BATCH_SIZE
+
+        if batch_full:
+            self.flush()
+        return None
+
+    def flush(self):
+        """Insert every queued entry. Returns the number of rows written."""
+        with self._lock:
+            if not self._buffer:
+                return 0
+            entries, self._buffer = self._buffer, []
+            # Rotate the spill file so entries queued during the insert land in a fresh file
+            flushing_path = self._rotate_spill_file()
+            self._in_flight.add(flushing_path)
+
+        try:
+            written = insert_entries(entries)
+        except Exception as e:
+            # The rotated spill file stays on disk and is retried by the next recovery pass
+            logger.error(f'Failed to write {len(entries)} buffered access logs: {e}')
+            return 0
+        finally:
+            with self._lock:
+                self._in_flight.discard(flushing_path)
+        os.unlink(flushing_path)
+        return written
+
+    def recover(self):
+        """
+        Replay spill files that are not being written: files of writers that are no longer
+        running, and this writer's own rotated files whose insert failed.
+        """
+        replayed = 0
+        pattern = os.path.join(settings.ACCESS_LOG_SPILL_DIR, 'access_logs.*.ndjson*')
+        for path in glob.glob(pattern):
+            pid = int(os.path.basename(path).split('.')[1])
+            with self._lock:
+                busy = path == self._spill_path or path in self._in_flight
+            if busy or (pid != os.getpid() and _process_alive(pid)):
+                continue
+
+            # Claim the file with an atomic rename so two recovering processes never replay it twice
+            claimed_path = os.path.join(
+                settings.ACCESS_LOG_SPILL_DIR, f'access_logs.{os.getpid()}.claimed.ndjson.{time.monotonic_ns()}'
+            )
+            try:
+                os.replace(path, claimed_path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self._in_flight.add(claimed_path)
+            try:
+                with open(claimed_path) as spill_file:
+                    entries = [json.loads(line) for line in spill_file if line.strip()]
+                if entries:
+                    replayed += insert_entries(entries)
+                os.unlink(claimed_path)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(claimed_path)
+        return replayed
+
+    def _ensure_started(self):
+        if self._spill_file is None:
+            os.makedirs(settings.ACCESS_LOG_SPILL_DIR, exist_ok=True)
+            self._spill_path = os.path.join(
+                settings.ACCESS_LOG_SPILL_DIR, f'access_logs.{os.getpid()}.{secrets.token_hex(4)}.ndjson'
+            )
+            self._spill_file = open(self._spill_path, 'a')
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='access-log-writer', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _rotate_spill_file(self):
+        self._spill_file.close()
+        flushing_path = f'{self._spill_path}.{time.monotonic_ns()}'
+        os.replace(self._spill_path, flushing_path)
+        self._spill_file = open(self._spill_path, 'a')
+        return flushing_path
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.ACCESS_LOG_FLUSH_INTERVAL)
+            try:
+                self.flush()
+                self.recover()
+            except Exception as e:
+                logger.error(f'Access log writer error: {e}')
+            finally:
+                # This thread owns its own database connection
+                close_old_connections()
+
+    @staticmethod
+    def _to_entry(log):
+        entry = {
+            field.attname: getattr(log, field.attname)
+            for field in AccessLog._meta.concrete_fields
+            if not field.primary_key
+        }
+        entry['timestamp'] = entry['timestamp'].isoformat()
+        return entry
+
+
+def insert_entries(entries):
+    """Bulk insert spilled/queued entries and add them to the access rollups"""
+    logs = [
+        AccessLog(**dict(entry, timestamp=parse_datetime(entry['timestamp'])))
+        for entry in entries
+    ]
+    with transaction.atomic():
+        AccessLog.objects.bulk_create(logs)
+        # bulk_create skips post_save, so the rollups are updated here instead of by the signal
+        record_access_logs(logs)
+    return len(logs)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+access_log_writer = AccessLogWriter()
@@ -0,0 +1,152 @@
+# core/mailer.py
+import logging
+import smtplib
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.template.loader import get_template
+from django.utils import timezone
+from .models import OutboundEmail, Task
+from .task_queue import enqueue, retry_delay
+
+logger = logging.getLogger(__name__)
+
+INVITATION_TEMPLATE = 'emails/invitation'
+SEND_TASK = 'core.send_queued_email'
+
+
+def invitation_context(token):
+    """Template context for an invitation email; token needs company and created_by loaded"""
+    sender = token.created_by
+    return {
+        'company_name': token.company.name,
+        'role': token.get_role_display(),
+        'invitation_url': settings.INVITE_URL.format(token=token.token),
+        'expiry_date': token.expires_at.strftime('%Y-%m-%d %H:%M'),
+        'sender_name': (sender.full_name or sender.username) if sender else token.company.name,
+    }
+
+
+def queue_invitations(tokens):
+    """
+    Queue an invitation email for each saved token and schedule delivery. The rows are written in the caller's
+    transaction, so the emails of a request that rolls back are never sent.
+    """
+    emails = [
+        OutboundEmail(
+            to_email=token.email,
+            subject=f"Invitation to join {token.company.name} on BioaccessControl",
+            template=INVITATION_TEMPLATE,
+            context=invitation_context(token),
+            invite_token_id=token.pk,
+            max_attempts=settings.MAIL_MAX_ATTEMPTS,
+        )
+        for token in tokens
+    ]
+    OutboundEmail.objects.bulk_create(emails, batch_size=500)
+    schedule_delivery()
+    return len(emails)
+
+
+def schedule_delivery():
+    # One send task drains the whole queue, so only queue another when none is waiting to start
+    if not Task.objects.filter(name=SEND_TASK, status='queued').exists():
+        enqueue(SEND_TASK)
+
+
+def claim(limit):
+    """
+    Claim up to limit due messages, and messages whose sender died mid-batch, for one sending batch.
+    The claim is a single conditional update tagged with a batch id, so concurrent senders never share a message.
+    """
+    now = timezone.now()
+    batch_id = uuid.uuid4().hex
+    due = Q(status='queued', next_attempt_at__lte=now) | Q(
+        status='sending', locked_at__lt=now - timedelta(seconds=settings.TASK_TIMEOUT)
+    )
+    candidates = OutboundEmail.objects.filter(due).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True)[:limit])
+            OutboundEmail.objects.filter(pk__in=ids).update(
+                status='sending', locked_by=batch_id, locked_at=now, attempts=F('attempts') + 1
+            )
+    else:
+        # The status condition is re-checked by the update, so a message another sender claimed in between is skipped
+        OutboundEmail.objects.filter(due, pk__in=list(candidates[:limit])).update(
+            status='sending', locked_by=batch_id, locked_at=now, attempts=F('attempts') + 1
+        )
+    return list(OutboundEmail.objects.filter(locked_by=batch_id).order_by('pk'))
+
+
+def _render(email, templates):
+    # Each template is loaded and compiled once per batch and then rendered for every recipient
+    if email.template not in templates:
+        templates[email.template] = (get_template(f'{email.template}.txt'), get_template(f'{email.template}.html'))
+    text, html = templates[email.template]
+    message = EmailMultiAlternatives(
+        email.subject, text.render(email.context), settings.DEFAULT_FROM_EMAIL, [email.to_email]
+    )
+    message.attach_alternative(html.render(email.context), 'text/html')
+    return message
+
+
+def send_batch(emails):
+    """
+    Render and send claimed messages over one SMTP connection and record the outcome of each: sent, queued again
+    with backoff, or failed after max_attempts. The connection is reopened when the server drops it mid-batch.
+    Returns (sent, failed) counts.
+    """
+    templates, sent, failures = {}, [], []
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        mail_connection.open()
+        for email in emails:
+            try:
+                mail_connection.send_messages([_render(email, templates)])
+                sent.append(email.pk)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                # The server rejected this message; the connection is still usable
+                failures.append((email, e))
+            except Exception as e:
+                failures.append((email, e))
+                mail_connection.close()
+                mail_connection.open()
+    except Exception as e:
+        # The server cannot be reached; every message not yet handled is retried later
+        handled = set(sent) | {email.pk for email, error in failures}
+        failures += [(email, e) for email in emails if email.pk not in handled]
+    finally:
+        mail_connection.close()
+
+    now = timezone.now()
+    OutboundEmail.objects.filter(pk__in=sent).update(status='sent', sent_at=now, locked_by='', locked_at=None, last_error='')
+    failed = 0
+    for email, error in failures:
+        if email.attempts < email.max_attempts:
+            delay = retry_delay(email.attempts)
+            logger.warning(f'Email {email.pk} to {email.to_email} failed (attempt {email.attempts}), retrying in {delay:.0f}s: {error}')
+            fields = {'status': 'queued', 'next_attempt_at': now + timedelta(seconds=delay)}
+        else:
+            logger.error(f'Email {email.pk} to {email.to_email} failed permanently after {email.attempts} attempts: {error}')
+            fields = {'status': 'failed'}
+            failed += 1
+        OutboundEmail.objects.filter(pk=email.pk, locked_by=email.locked_by).update(
+            locked_by='', locked_at=None, last_error=str(error), **fields
+        )
+    return len(sent), failed
+
+
+def send_pending(batch_size=None):
+    """Send every due message, batch_size (default MAIL_BATCH_SIZE) per connection. Returns (sent, failed) counts"""
+    total_sent = total_failed = 0
+    while True:
+        emails = claim(batch_size or settings.MAIL_BATCH_SIZE)
+        if not emails:
+            return total_sent, total_failed
+        sent, failed = send_batch(emails)
+        total_sent += sent
+        total_failed += failed
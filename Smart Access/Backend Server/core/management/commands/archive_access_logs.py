@@ -0,0 +1,26 @@
+# core/management/commands/archive_access_logs.py
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Company
+from core.archive import archive_company_logs
+
+
+class Command(BaseCommand):
+    help = 'Move access logs older than each company\'s retention period into compressed archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=str, help='Only archive this company (by name)')
+        parser.add_argument('--segment-rows', type=int, help='Maximum logs per archive segment')
+
+    def handle(self, *args, **options):
+        companies = Company.objects.filter(access_log_retention_days__isnull=False)
+        if options['company']:
+            companies = companies.filter(name=options['company'])
+            if not companies.exists():
+                raise CommandError(f'Company {options["company"]} not found or has no retention policy')
+
+        for company in companies:
+            archived = archive_company_logs(company, segment_rows=options['segment_rows'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {archived} access logs for {company.name} '
+                f'(retention {company.access_log_retention_days} days)'
+            ))
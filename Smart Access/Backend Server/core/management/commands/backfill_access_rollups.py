@@ -0,0 +1,36 @@
+# core/management/commands/backfill_access_rollups.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from core.models import Company
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily access log rollups from the raw access logs (archived ranges are kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=str, help='Only rebuild this company (by name)')
+        parser.add_argument('--since', type=str, help='Only rebuild buckets from this date/time onwards')
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company']:
+            try:
+                company = Company.objects.get(name=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f'Company {options["company"]} not found')
+
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                day = parse_date(options['since'])
+                if day is None:
+                    raise CommandError(f'Invalid --since value: {options["since"]}')
+                since = timezone.datetime(day.year, day.month, day.day)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        written = rebuild_rollups(company=company, since=since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} access rollup buckets'))
@@ -0,0 +1,84 @@
+# core/management/commands/bench_serialization.py
+import gzip
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from core.compression import brotli
+from core.models import AccessLog, Company, Room, RoomGroup, User
+from core.renderers import FastJSONRenderer, orjson
+from core.serializers import ACCESS_LOG_VALUES, USER_VALUES, AccessLogSerializer, UserSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compare serializer + JSONRenderer against values() + FastJSONRenderer on large access log and user '
+            'lists, and the payload size raw, gzipped and brotli-compressed. Seeds a throwaway company and rolls it back')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Access logs and users in each response')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per variant; the fastest is reported')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer falls back to json'))
+
+        with transaction.atomic():
+            company = self.seed(rows)
+            logs = AccessLog.objects.filter(company=company).order_by('-timestamp', '-id')
+            users = User.objects.filter(company=company)
+            benchmarks = (
+                ('access logs', lambda: AccessLogSerializer(
+                    logs.select_related('user', 'room', 'company'), many=True).data,
+                 lambda: ACCESS_LOG_VALUES.to_representation(ACCESS_LOG_VALUES.values(logs))),
+                ('users', lambda: UserSerializer(users.select_related('company'), many=True).data,
+                 lambda: USER_VALUES.to_representation(USER_VALUES.values(users))),
+            )
+            for label, slow, fast in benchmarks:
+                self.stdout.write(f'{label} ({rows} rows)')
+                baseline = self.run_variant('serializer', slow, JSONRenderer(), options['repeat'])
+                tuned = self.run_variant('values+fast', fast, FastJSONRenderer(), options['repeat'])
+                self.stdout.write(self.style.SUCCESS(f'  x{baseline / tuned:.1f} faster'))
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        company = Company.objects.create(name=f'bench-{uuid.uuid4().hex[:8]}')
+        group = RoomGroup.objects.create(name='Bench', company=company)
+        rooms = Room.objects.bulk_create([
+            Room(room_id=f'{company.name}-{i}', name=f'Room {i}', group=group, company=company) for i in range(50)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'{company.name}-{i}', email=f'user{i}@example.com', password='!', company=company,
+                 full_name=f'Bench User {i}', phone_number=f'+1555{i:07d}')
+            for i in range(rows)
+        ], batch_size=1000)
+        AccessLog.objects.bulk_create([
+            AccessLog(
+                user=users[i % len(users)], room=rooms[i % len(rooms)], company=company, access_granted=i % 5 != 0,
+                face_spoofing_result='genuine', speaker_similarity_score=0.87, audio_deepfake_result=1,
+                transcription_score=0.93, failure_reason=None if i % 5 else 'Voice mismatch'
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        return company
+
+    def run_variant(self, label, build, renderer, repeat):
+        """Report the fastest of repeat runs (query + serialization, then rendering) and return its total"""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = build()
+            built = time.perf_counter()
+            body = renderer.render(data)
+            rendered = time.perf_counter()
+            if best is None or rendered - started < best[0] + best[1]:
+                best = (built - started, rendered - built)
+
+        sizes = f'{len(body) / 1024:8.0f} KiB raw  {len(gzip.compress(body, 6)) / 1024:6.0f} KiB gzip'
+        if brotli is not None:
+            sizes += f'  {len(brotli.compress(body, quality=4)) / 1024:6.0f} KiB br'
+        self.stdout.write(
+            f'  {label:>12}: {best[0] * 1000:7.1f} ms serialize  {best[1] * 1000:7.1f} ms render  {sizes}'
+        )
+        return best[0] + best[1]
@@ -0,0 +1,111 @@
+# core/management/commands/bench_sqlite_concurrency.py
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.sqlite import tuning_statements
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent read/write throughput of the default SQLite journal against SQLITE_TUNING'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (e.g. status polls)')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (e.g. session saves, access logs)')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--rows', type=int, default=10000, help='Rows seeded into the benchmark table')
+
+    def handle(self, *args, **options):
+        # The default Django configuration: rollback journal, deferred transactions, 5 second lock timeout
+        baseline = self.run_benchmark([], 'DEFERRED', options)
+        tuned = self.run_benchmark(tuning_statements(settings.SQLITE_TUNING), 'IMMEDIATE', options)
+
+        for label, result in (('default', baseline), ('tuned', tuned)):
+            self.stdout.write(
+                f'{label:>8}: {result["reads"] / options["seconds"]:10.0f} reads/s  '
+                f'{result["writes"] / options["seconds"]:8.0f} writes/s  '
+                f'{result["locked"]:6d} "database is locked" errors'
+            )
+        if baseline['reads'] and baseline['writes']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Reads x{tuned["reads"] / baseline["reads"]:.1f}, writes x{tuned["writes"] / baseline["writes"]:.1f}'
+            ))
+
+    def run_benchmark(self, pragmas, begin, options):
+        directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+        path = os.path.join(directory, 'bench.sqlite3')
+        setup = self.connect(path, pragmas)
+        setup.execute('CREATE TABLE log (id INTEGER PRIMARY KEY, room TEXT, granted INTEGER, ts REAL)')
+        setup.execute('CREATE INDEX log_room_ts ON log (room, ts)')
+        setup.executemany(
+            'INSERT INTO log (room, granted, ts) VALUES (?, ?, ?)',
+            ((f'R{i % 50}', i % 2, time.time()) for i in range(options['rows']))
+        )
+        setup.commit()
+        setup.close()
+
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        counts_lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def reader(number):
+            conn = self.connect(path, pragmas)
+            reads = locked = 0
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(
+                        'SELECT COUNT(*) FROM log WHERE room = ? AND ts > ?', (f'R{number % 50}', time.time() - 60)
+                    ).fetchone()
+                    reads += 1
+                except sqlite3.OperationalError:
+                    locked += 1
+            conn.close()
+            with counts_lock:
+                counts['reads'] += reads
+                counts['locked'] += locked
+
+        def writer(number):
+            conn = self.connect(path, pragmas)
+            writes = locked = 0
+            while time.monotonic() < deadline:
+                try:
+                    # Read-then-write transaction, the shape of a session save or a lock toggle
+                    conn.execute(f'BEGIN {begin}')
+                    conn.execute('SELECT MAX(id) FROM log').fetchone()
+                    conn.execute(
+                        'INSERT INTO log (room, granted, ts) VALUES (?, ?, ?)', (f'R{number % 50}', 1, time.time())
+                    )
+                    conn.execute('COMMIT')
+                    writes += 1
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    locked += 1
+            conn.close()
+            with counts_lock:
+                counts['writes'] += writes
+                counts['locked'] += locked
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(directory)
+        return counts
+
+    @staticmethod
+    def connect(path, pragmas):
+        # isolation_level=None leaves transaction control to the explicit BEGIN statements
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        for statement in pragmas:
+            conn.execute(statement)
+        return conn
@@ -0,0 +1,72 @@
+# core/management/commands/bulk_enroll.py
+import json
+import os
+import zipfile
+from django.core.management.base import BaseCommand, CommandError
+from core.bulk_enroll import ManifestError, enroll, read_manifest, summarize
+from core.models import Company, User
+
+
+class Command(BaseCommand):
+    help = ('Enroll users in bulk from a CSV/JSON manifest and a zip of their face images and voice recordings. '
+            'Columns: username, email, full_name, phone_number, role, password, face, voice, groups')
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', type=str, help='CSV or JSON manifest file')
+        parser.add_argument('archive', type=str, help='Zip file with the samples named in the manifest')
+        parser.add_argument('--company', type=str, required=True, help='Company name')
+        parser.add_argument('--created-by', type=str, help='Username recorded as the creator of activation tokens')
+        parser.add_argument('--workers', type=int, help='Processes checking samples (default BULK_ENROLL_WORKERS)')
+        parser.add_argument('--report', type=str, help='Per-row report file (default: <manifest>.report.json)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue from the report file, skipping rows it lists as created or skipped')
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(name=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f'Company {options["company"]} not found')
+        created_by = None
+        if options['created_by']:
+            created_by = User.objects.filter(username=options['created_by'], company=company).first()
+            if not created_by:
+                raise CommandError(f'User {options["created_by"]} not found in {company.name}')
+
+        report_path = options['report'] or f'{options["manifest"]}.report.json'
+        report = []
+        if options['resume'] and os.path.exists(report_path):
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+
+        try:
+            with open(options['manifest'], 'rb') as manifest_file:
+                rows = read_manifest(manifest_file.read(), options['manifest'])
+        except ManifestError as e:
+            raise CommandError(str(e))
+
+        def write_report(report):
+            # Write the checkpoint atomically so an interrupted run never leaves a truncated report
+            with open(f'{report_path}.tmp', 'w') as report_file:
+                json.dump(report, report_file, indent=1)
+            os.replace(f'{report_path}.tmp', report_path)
+
+        def save_report(report):
+            write_report(report)
+            counts = summarize(report)
+            self.stdout.write(f'{len(report)}/{len(rows)} rows: {counts["created"]} created, '
+                              f'{counts["skipped"]} skipped, {counts["failed"]} failed')
+
+        try:
+            report = enroll(rows, options['archive'], company, created_by, options['workers'], report, on_batch=save_report)
+        except zipfile.BadZipFile:
+            raise CommandError(f'{options["archive"]} is not a zip file')
+        write_report(report)
+
+        for entry in report:
+            if entry['status'] == 'failed':
+                self.stdout.write(self.style.ERROR(f'Row {entry["row"]} ({entry["username"]}): {entry["errors"]}'))
+        counts = summarize(report)
+        self.stdout.write(self.style.SUCCESS(
+            f'Enrolled {counts["created"]} users ({counts["skipped"]} already enrolled, {counts["failed"]} failed); '
+            f'report written to {report_path}'
+        ))
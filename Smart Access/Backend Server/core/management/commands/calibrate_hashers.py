@@ -0,0 +1,98 @@
+# core/management/commands/calibrate_hashers.py
+import time
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher, Argon2PasswordHasher
+from django.core.management.base import BaseCommand
+from core.hashers import scrypt_maxmem
+
+SAMPLE_PASSWORD = 'calibration-password'
+SAMPLE_SALT = 'calibrationsalt1'
+
+
+def _time_hash(hasher, repeat):
+    """Best-of-repeat wall time of one hash in seconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hasher.encode(SAMPLE_PASSWORD, SAMPLE_SALT)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the password hashers on this host and recommend cost parameters for a latency budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Time one password check may take')
+        parser.add_argument('--repeat', type=int, default=3, help='Timing runs per candidate (the fastest is used)')
+
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        repeat = options['repeat']
+        self.stdout.write(f'Calibrating for {options["target_ms"]:.0f} ms per hash\n')
+        recommendations = {}
+
+        # PBKDF2 time grows linearly with the iteration count, so one measurement can be scaled
+        hasher = PBKDF2PasswordHasher()
+        hasher.iterations = 100_000
+        per_iteration = _time_hash(hasher, repeat) / hasher.iterations
+        iterations = int(target / per_iteration) // 1000 * 1000
+        if iterations < PBKDF2PasswordHasher.iterations:
+            # Never recommend weaker hashes than Django's default, however slow the host
+            self.stdout.write(self.style.WARNING(
+                f'PBKDF2: only {iterations} iterations fit the budget; keeping the default '
+                f'{PBKDF2PasswordHasher.iterations}'
+            ))
+            iterations = PBKDF2PasswordHasher.iterations
+        self.report('PBKDF2-SHA256', f'iterations={iterations}', per_iteration * iterations,
+                    f'default {PBKDF2PasswordHasher.iterations} takes {per_iteration * PBKDF2PasswordHasher.iterations * 1000:.0f} ms')
+        recommendations['PASSWORD_PBKDF2_ITERATIONS'] = iterations
+
+        # scrypt's cost is a power of two; take the largest one that fits
+        hasher, chosen = ScryptPasswordHasher(), None
+        for exponent in range(12, 21):
+            hasher.work_factor = 2 ** exponent
+            hasher.maxmem = scrypt_maxmem(hasher.work_factor, hasher.block_size)
+            elapsed = _time_hash(hasher, repeat)
+            if elapsed > target:
+                break
+            chosen = (hasher.work_factor, elapsed)
+        if chosen:
+            memory_mb = 128 * chosen[0] * hasher.block_size / 2 ** 20
+            self.report('scrypt', f'work_factor={chosen[0]}', chosen[1], f'{memory_mb:.0f} MB per hash')
+            recommendations['PASSWORD_SCRYPT_WORK_FACTOR'] = chosen[0]
+        else:
+            self.stdout.write(self.style.WARNING('scrypt: even the smallest work factor exceeds the budget'))
+
+        # Argon2 keeps Django's memory cost and raises the number of passes
+        hasher = Argon2PasswordHasher()
+        try:
+            hasher._load_library()
+        except ValueError:
+            self.stdout.write(self.style.WARNING('Argon2: skipped, argon2-cffi is not installed'))
+        else:
+            chosen = None
+            for time_cost in range(1, 21):
+                hasher.time_cost = time_cost
+                elapsed = _time_hash(hasher, repeat)
+                if elapsed > target:
+                    break
+                chosen = (time_cost, elapsed)
+            if chosen:
+                self.report('Argon2id', f'time_cost={chosen[0]} memory_cost={hasher.memory_cost}', chosen[1],
+                            f'{hasher.memory_cost / 1024:.0f} MB per hash')
+                recommendations['PASSWORD_ARGON2_TIME_COST'] = chosen[0]
+                recommendations['PASSWORD_ARGON2_MEMORY_COST'] = hasher.memory_cost
+            else:
+                self.stdout.write(self.style.WARNING('Argon2: even time_cost=1 exceeds the budget'))
+
+        self.stdout.write('\nRecommended settings (bioaccess_project/settings.py):')
+        for name, value in recommendations.items():
+            self.stdout.write(f'{name} = {value}')
+        self.stdout.write(self.style.SUCCESS(
+            'Hashes made with other parameters are upgraded as users log in; '
+            'reorder PASSWORD_HASHERS to change the algorithm used for new hashes'
+        ))
+
+    def report(self, name, parameters, seconds, note):
+        self.stdout.write(f'{name:<14} {parameters:<36} {seconds * 1000:7.0f} ms  ({note})')
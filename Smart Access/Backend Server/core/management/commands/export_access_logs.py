@@ -0,0 +1,135 @@
+# core/management/commands/export_access_logs.py
+import gzip
+import io
+import os
+from django.core.management.base import BaseCommand, CommandError
+from core.models import AccessLog, Company
+from core.access_logs import EXPORT_FORMATS, EXPORT_CHUNK_SIZE, apply_access_log_filters, iter_export_rows
+from core.pagination import decode_cursor, InvalidCursor
+
+
+class Command(BaseCommand):
+    help = 'Stream a company\'s access logs to a CSV or NDJSON file (gzip-compressed if the name ends in .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=str, required=True, help='Company name')
+        parser.add_argument('--output', type=str, required=True, help='Output file path')
+        parser.add_argument('--format', type=str, choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--start-date', type=str)
+        parser.add_argument('--end-date', type=str)
+        parser.add_argument('--room-id', type=str)
+        parser.add_argument('--username', type=str)
+        parser.add_argument('--access-status', type=str, choices=['true', 'false'])
+        parser.add_argument('--cursor', type=str, help='Resume after this cursor')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue from the .cursor checkpoint file, dropping output written after it')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(name=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f'Company {options["company"]} not found')
+
+        output = options['output']
+        checkpoint = f'{output}.cursor'
+        cursor = options['cursor']
+        offset = None
+        if options['resume'] and os.path.exists(checkpoint):
+            cursor, offset = self._read_checkpoint(checkpoint)
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except InvalidCursor:
+                raise CommandError(f'Invalid cursor: {cursor}')
+
+        logs = apply_access_log_filters(AccessLog.objects.filter(company=company), {
+            'start_date': options['start_date'],
+            'end_date': options['end_date'],
+            'room_id': options['room_id'],
+            'username': options['username'],
+            'access_status': options['access_status'],
+        })
+
+        rows = iter_export_rows(logs, cursor=cursor, chunk_size=options['chunk_size'])
+        write_lines = EXPORT_FORMATS[options['format']][0]
+        appending = bool(cursor and options['resume'])
+        compress = output.endswith('.gz')
+        out_file = self._open_output(output, appending, offset)
+
+        exported = 0
+        last_cursor = cursor
+        # Every checkpoint records the cursor of the last row and the size of the file up to it. Rows written after
+        # the last checkpoint (a crash between a chunk and its checkpoint) are cut off again by --resume, so they are
+        # never exported twice. A .gz output gets a new gzip member per chunk, which gzip readers concatenate
+        # transparently, so the file is valid at every checkpoint.
+        with out_file:
+            out = self._start_chunk(out_file, compress)
+            for line, row_cursor in self._with_cursor(write_lines, rows):
+                if row_cursor is None and appending:
+                    continue  # The CSV header is already in the file
+                out.write(line)
+                if row_cursor:
+                    exported += 1
+                    last_cursor = row_cursor
+                    if exported % options['chunk_size'] == 0:
+                        self._save_checkpoint(checkpoint, last_cursor, self._end_chunk(out_file, out, compress))
+                        out = self._start_chunk(out_file, compress)
+            self._save_checkpoint(checkpoint, last_cursor, self._end_chunk(out_file, out, compress))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {exported} access logs to {output} (resume cursor: {last_cursor or "none"})'
+        ))
+
+    def _open_output(self, output, appending, offset):
+        if not appending:
+            return open(output, 'wb')
+        if offset is None:
+            return open(output, 'ab')  # A checkpoint written before offsets were recorded
+        if not os.path.exists(output) or os.path.getsize(output) < offset:
+            raise CommandError(f'{output} is shorter than its checkpoint; export it again without --resume')
+        out_file = open(output, 'r+b')
+        out_file.truncate(offset)
+        out_file.seek(offset)
+        return out_file
+
+    def _start_chunk(self, out_file, compress):
+        stream = gzip.GzipFile(fileobj=out_file, mode='wb') if compress else out_file
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    def _end_chunk(self, out_file, out, compress):
+        """Finish the chunk written through out (closing its gzip member) and return the output offset after it"""
+        out.flush()
+        stream = out.detach()
+        if compress:
+            stream.close()  # Writes the gzip trailer; out_file itself stays open
+        out_file.flush()
+        return out_file.tell()
+
+    def _with_cursor(self, write_lines, rows):
+        """Pair every output line with the cursor of the row it came from (None for headers)"""
+        current = {}
+
+        def tracked():
+            for row in rows:
+                current['cursor'] = row['cursor']
+                yield row
+
+        for line in write_lines(tracked()):
+            yield line, current.pop('cursor', None)
+
+    def _read_checkpoint(self, checkpoint):
+        """Return the (cursor, offset) saved in a checkpoint file; offset is None in checkpoints without one"""
+        with open(checkpoint) as checkpoint_file:
+            fields = checkpoint_file.read().split()
+        if not fields:
+            return None, None
+        try:
+            return fields[0], int(fields[1]) if len(fields) > 1 else None
+        except ValueError:
+            raise CommandError(f'Invalid checkpoint file: {checkpoint}')
+
+    def _save_checkpoint(self, checkpoint, cursor, offset):
+        if cursor:
+            with open(checkpoint, 'w') as checkpoint_file:
+                checkpoint_file.write(f'{cursor}\n{offset}\n')
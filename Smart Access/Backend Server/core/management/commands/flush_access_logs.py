@@ -0,0 +1,11 @@
+# core/management/commands/flush_access_logs.py
+from django.core.management.base import BaseCommand
+from core.log_writer import access_log_writer
+
+
+class Command(BaseCommand):
+    help = 'Replay access log spill files left behind by web workers that stopped before flushing'
+
+    def handle(self, *args, **options):
+        replayed = access_log_writer.recover()
+        self.stdout.write(self.style.SUCCESS(f'Replayed {replayed} buffered access logs'))
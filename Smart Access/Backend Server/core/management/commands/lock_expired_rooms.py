@@ -5,5 +5,5 @@ class Command(BaseCommand):
     help = 'Lock any rooms whose unlock has expired'
 
     def handle(self, *args, **options):
-        lock_expired_rooms()
-        self.stdout.write(self.style.SUCCESS('Successfully checked and locked expired rooms'))
+        locked = lock_expired_rooms()
+        self.stdout.write(self.style.SUCCESS(f'Successfully checked and locked {locked} expired rooms'))
@@ -0,0 +1,24 @@
+# core/management/commands/rebuild_effective_access.py
+from django.core.management.base import BaseCommand, CommandError
+from core.models import User
+from core.effective_access import rebuild_all, sync_user
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized user-to-room access table from room group memberships'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='Only rebuild this user')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f'User {options["username"]} not found')
+            sync_user(user.id)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt effective room access for {user.username}'))
+            return
+
+        written = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt effective room access ({written} rows)'))
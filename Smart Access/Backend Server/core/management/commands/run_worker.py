@@ -0,0 +1,77 @@
+# core/management/commands/run_worker.py
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core import task_queue
+
+
+class Command(BaseCommand):
+    help = ('Run background tasks from the database queue: claims due tasks, runs them in a thread pool, retries '
+            'failures with backoff and queues periodic tasks. Several workers can run side by side')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Tasks run at the same time')
+        parser.add_argument('--poll-interval', type=float, default=1, help='Seconds to wait when no task is due')
+        parser.add_argument('--once', action='store_true', help='Exit when no task is due instead of waiting')
+        parser.add_argument('--no-schedule', action='store_true', help='Do not queue periodic tasks from this worker')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        stopping = threading.Event()
+        running = set()
+        running_lock = threading.Lock()
+        counts = {'succeeded': 0, 'failed': 0}
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping after the running tasks finish...')
+            stopping.set()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        def execute(task_row):
+            outcome = 'failed'
+            try:
+                outcome = 'succeeded' if task_queue.run(task_row) else 'failed'
+            finally:
+                # Each pool thread has its own database connection
+                close_old_connections()
+                with running_lock:
+                    running.discard(task_row.pk)
+                    counts[outcome] += 1
+
+        if not options['no_schedule']:
+            task_queue.sync_schedules()
+        self.stdout.write(f'Worker {worker_id} started with concurrency {concurrency}')
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='task') as pool:
+            while not stopping.is_set():
+                requeued, failed = task_queue.requeue_stale()
+                if requeued or failed:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} and failed {failed} timed-out tasks'))
+                if not options['no_schedule']:
+                    task_queue.enqueue_due_periodic_tasks()
+
+                with running_lock:
+                    free = concurrency - len(running)
+                claimed = task_queue.claim(worker_id, free) if free > 0 else []
+                for task_row in claimed:
+                    with running_lock:
+                        running.add(task_row.pk)
+                    pool.submit(execute, task_row)
+
+                if not claimed:
+                    with running_lock:
+                        idle = not running
+                    if options['once'] and idle:
+                        break
+                    close_old_connections()
+                    stopping.wait(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker {worker_id} stopped: {counts["succeeded"]} tasks succeeded, {counts["failed"]} failed'
+        ))
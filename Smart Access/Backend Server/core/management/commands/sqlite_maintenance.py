@@ -0,0 +1,28 @@
+# core/management/commands/sqlite_maintenance.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.sqlite import run_maintenance
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint the SQLite write-ahead log and refresh query planner statistics (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checkpoint', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'], default='TRUNCATE',
+            help='WAL checkpoint mode (TRUNCATE also shrinks the -wal file back to zero bytes)'
+        )
+        parser.add_argument('--analyze', action='store_true', help='Run a full ANALYZE instead of only PRAGMA optimize')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('sqlite_maintenance only applies to SQLite databases')
+
+        busy, log_pages, checkpointed = run_maintenance(connection, options['checkpoint'], options['analyze'])
+        if busy:
+            self.stdout.write(self.style.WARNING(
+                f'Checkpoint could not complete while readers were active ({checkpointed}/{log_pages} pages copied)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Checkpointed {checkpointed} WAL pages'))
+        self.stdout.write(self.style.SUCCESS('Query planner statistics refreshed'))
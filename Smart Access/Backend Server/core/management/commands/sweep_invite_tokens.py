@@ -0,0 +1,22 @@
+# core/management/commands/sweep_invite_tokens.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.invite_tokens import SWEEP_CHUNK_SIZE, sweep_dead_tokens
+
+
+class Command(BaseCommand):
+    help = ('Delete invite tokens that expired more than INVITE_TOKEN_RETENTION_DAYS ago, in small chunks '
+            '(also run hourly by the task worker)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.INVITE_TOKEN_RETENTION_DAYS,
+                            help='Keep tokens this many days past their expiry')
+        parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE, help='Tokens deleted per transaction')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks and leave the rest for the next run')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to wait between chunks')
+
+    def handle(self, *args, **options):
+        deleted = sweep_dead_tokens(
+            options['retention_days'], options['chunk_size'], options['max_chunks'], options['pause']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired invite tokens'))
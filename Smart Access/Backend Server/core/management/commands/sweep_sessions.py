@@ -0,0 +1,16 @@
+# core/management/commands/sweep_sessions.py
+from django.core.management.base import BaseCommand
+from core.session_backend import SWEEP_CHUNK_SIZE, sweep_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in small chunks so the sweep does not block logins (safe to run often)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE, help='Sessions deleted per transaction')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks and leave the rest for the next run')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to wait between chunks')
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired_sessions(options['chunk_size'], options['max_chunks'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions'))
@@ -0,0 +1,43 @@
+# core/management/commands/sync_replica.py
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into the read replica file. A stand-in for real replication '
+            'when running the replica setup locally or in tests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep syncing every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASE:
+            raise CommandError('No replica configured; set DJANGO_REPLICA_DB to the replica database file')
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases')
+
+        while True:
+            started = time.monotonic()
+            self.sync(primary)
+            self.stdout.write(self.style.SUCCESS(
+                f'Replica synced in {(time.monotonic() - started) * 1000:.0f} ms'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def sync(primary):
+        # The online backup API copies a consistent snapshot while the primary keeps taking writes, and replica
+        # readers that are already connected see the new pages on their next transaction
+        primary.ensure_connection()
+        replica_path = settings.DATABASES[settings.REPLICA_DATABASE]['NAME']
+        replica = sqlite3.connect(replica_path, timeout=settings.SQLITE_TUNING.get('busy_timeout', 5000) / 1000)
+        try:
+            primary.connection.backup(replica)
+        finally:
+            replica.close()
@@ -0,0 +1,22 @@
+# core/management/commands/throttle_stats.py
+from django.core.management.base import BaseCommand
+from core.throttling import shed_counts, shed_scopes
+
+
+class Command(BaseCommand):
+    help = 'Show how many login attempts were shed by throttling and IP lockout in each recent hour'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Number of hours to show')
+
+    def handle(self, *args, **options):
+        scopes = shed_scopes()
+        self.stdout.write('hour              ' + ''.join(f'{scope:>10}' for scope in scopes))
+        totals = dict.fromkeys(scopes, 0)
+        for hour, counts in shed_counts(options['hours']):
+            self.stdout.write(f'{hour:%Y-%m-%d %H:00}  ' + ''.join(f'{counts[scope]:>10}' for scope in scopes))
+            for scope in scopes:
+                totals[scope] += counts[scope]
+        self.stdout.write(self.style.SUCCESS(
+            'Shed in total: ' + ', '.join(f'{scope} {count}' for scope, count in totals.items())
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoorEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=64)),
+                ('sequence', models.PositiveBigIntegerField()),
+                ('event_type', models.CharField(choices=[('opened', 'Door opened'), ('closed', 'Door closed'), ('forced', 'Door forced open'), ('held_open', 'Door held open')], max_length=20)),
+                ('occurred_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('access_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='door_events', to='core.accesslog')),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='door_events', to='core.company')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='door_events', to='core.room')),
+            ],
+            options={
+                'unique_together': {('device_id', 'sequence')},
+            },
+        ),
+    ]
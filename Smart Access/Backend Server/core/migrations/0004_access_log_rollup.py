@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_access_log_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('access_granted', models.BooleanField()),
+                ('failure_reason', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('speaker_similarity_sum', models.FloatField(default=0)),
+                ('transcription_score_sum', models.FloatField(default=0)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='access_rollups', to='core.company')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_rollups', to='core.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'granularity', 'bucket_start'], name='rollup_company_bucket_idx')],
+                'unique_together': {('granularity', 'bucket_start', 'company', 'room', 'user', 'access_granted', 'failure_reason')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_effective_access(apps, schema_editor):
+    UserRoomGroup = apps.get_model('core', 'UserRoomGroup')
+    EffectiveRoomAccess = apps.get_model('core', 'EffectiveRoomAccess')
+    pairs = (
+        UserRoomGroup.objects
+        .filter(room_group__rooms__isnull=False)
+        .values_list('user_id', 'room_group__rooms__id')
+        .distinct()
+    )
+    EffectiveRoomAccess.objects.bulk_create(
+        [EffectiveRoomAccess(user_id=user_id, room_id=room_id) for user_id, room_id in pairs],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_access_log_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveRoomAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_access', to='core.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_room_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'room')},
+            },
+        ),
+        migrations.RunPython(populate_effective_access, migrations.RunPython.noop),
+    ]
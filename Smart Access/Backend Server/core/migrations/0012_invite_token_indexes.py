@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invitetoken',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='invite_tokens', to='core.company'),
+        ),
+        migrations.AddIndex(
+            model_name='invitetoken',
+            index=models.Index(fields=['company', 'is_used', 'expires_at'], name='invite_company_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitetoken',
+            index=models.Index(fields=['expires_at'], name='invite_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkenrollment',
+            name='activation_tokens',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='bulkenrollment',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
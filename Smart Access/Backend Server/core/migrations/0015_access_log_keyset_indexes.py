@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_bulk_enrollment_tokens'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='accesslog',
+            name='accesslog_company_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='accesslog',
+            name='accesslog_user_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='accesslog',
+            name='accesslog_room_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='accesslog',
+            index=models.Index(fields=['company', '-timestamp', '-id'], name='accesslog_company_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accesslog',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='accesslog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accesslog',
+            index=models.Index(fields=['room', '-timestamp', '-id'], name='accesslog_room_ts_idx'),
+        ),
+    ]
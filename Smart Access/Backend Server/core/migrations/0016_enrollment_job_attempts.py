@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_access_log_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollmentjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
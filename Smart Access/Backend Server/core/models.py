@@ -1,6 +1,6 @@
 # core/models.py
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, router, transaction
 import os
 from django.conf import settings
 from cryptography.fernet import Fernet
@@ -17,15 +17,45 @@ def get_biometric_path(instance, filename):
     filename = f"{instance.username}_{base64.urlsafe_b64encode(os.urandom(8)).decode()}.{ext}"
     return os.path.join('biometric_data', instance.username, filename)
 
+# Users, rooms, room groups and permissions take the next company revision for delta sync (core/revisions.py) in
+# the transaction that saves them, so a sync can never see the company's revision pass a change that has not been
+# committed yet. Saves that only touch fields clients do not sync (revisions.UNSYNCED_FIELDS) are not stamped.
+class RevisionStampedMixin:
+    def save(self, *args, **kwargs):
+        from . import revisions
+        update_fields = kwargs.get('update_fields')
+        if not revisions.needs_stamp(self, update_fields):
+            return super().save(*args, **kwargs)
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            self.revision = revisions.next_revision(revisions.company_id_of(self))
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'revision'}
+            super().save(*args, **kwargs)
+
 # Company model represents an organization in our multi-tenant system. Each company has a unique name and
 # can have multiple users, rooms, and access logs associated with it.
 class Company(models.Model):
     name = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Access logs older than this are moved to compressed archive segments; empty keeps them in the database
+    access_log_retention_days = models.PositiveIntegerField(null=True, blank=True)
+    # Delta sync (core/revisions.py): the last revision handed out to a change in this company, and the newest
+    # revision whose tombstones have been purged; clients that synced before it must reload everything
+    revision = models.BigIntegerField(default=0)
+    tombstone_floor = models.BigIntegerField(default=0)
     
     def __str__(self):
         return self.name
 
+# InviteTokenQuerySet filters tokens by state in SQL, matching InviteToken.is_expired/is_valid: a token is valid
+# while it is unused and not past expires_at, and expired (dead) otherwise.
+class InviteTokenQuerySet(models.QuerySet):
+    def valid(self):
+        return self.filter(is_used=False, expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(models.Q(is_used=True) | models.Q(expires_at__lte=timezone.now()))
+
 # InviteToken model handles the invitation process for new users. It stores a unique token linked to an email address
 # and company, with an expiration date and information about who created it and who used it. Tokens can be for either
 # admin or regular user roles.
@@ -35,7 +65,8 @@ class InviteToken(models.Model):
         ('user', 'Regular User'),
     ]
     
-    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='invite_tokens')
+    # Indexed by invite_company_state_idx, which leads with company
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='invite_tokens', db_index=False)
     token = models.CharField(max_length=64, unique=True)
     email = models.EmailField()
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
@@ -44,19 +75,24 @@ class InviteToken(models.Model):
     is_used = models.BooleanField(default=False)
     used_by = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, related_name='used_token')
     created_by = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, related_name='created_tokens')
+
+    objects = InviteTokenQuerySet.as_manager()
+
+    # How long an invitation stays valid unless created with its own expires_at
+    VALID_FOR = timezone.timedelta(days=7)
     
     def __str__(self):
         return f"Invite to {self.email} for {self.company.name} ({self.role})"
-    
-    def save(self, *args, **kwargs):
-        # Generate token if this is a new instance
+
+    def set_defaults(self):
+        """Generate the token and set the default expiry where missing; bulk_create callers must call this"""
         if not self.token:
             self.token = secrets.token_urlsafe(32)
-        
-        # Set expiration time if not set (default 7 days)
         if not self.expires_at:
-            self.expires_at = timezone.now() + timezone.timedelta(days=7)
-            
+            self.expires_at = timezone.now() + self.VALID_FOR
+    
+    def save(self, *args, **kwargs):
+        self.set_defaults()
         super().save(*args, **kwargs)
     
     @property
@@ -67,9 +103,17 @@ class InviteToken(models.Model):
     def is_valid(self):
         return not self.is_expired
 
+    class Meta:
+        indexes = [
+            # A company's valid or expired tokens (token list, admin filters, pending invitations)
+            models.Index(fields=['company', 'is_used', 'expires_at'], name='invite_company_state_idx'),
+            # The sweeper's scan for tokens past their retention
+            models.Index(fields=['expires_at'], name='invite_expires_idx'),
+        ]
+
 # User model extends Django's AbstractUser to add biometric authentication capabilities. It stores references to
 # face and voice data, tracks security status (failed attempts, account freezing), and links users to companies.
-class User(AbstractUser):
+class User(RevisionStampedMixin, AbstractUser):
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=15)
     full_name = models.CharField(max_length=255)
@@ -80,6 +124,13 @@ class User(AbstractUser):
     failed_attempts = models.IntegerField(default=0)
     is_admin = models.BooleanField(default=False)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='users', null=True, blank=True)
+    revision = models.BigIntegerField(default=0)  # company revision of the last change, for delta sync
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Delta sync: a company's users changed since a revision
+            models.Index(fields=['company', 'revision'], name='user_company_revision_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -131,61 +182,360 @@ class User(AbstractUser):
 
 # RoomGroup model provides a way to organize rooms logically and assign access permissions efficiently.
 # Rooms in the same group can share access permissions, making it easier to manage who can access multiple rooms.
-class RoomGroup(models.Model):
+class RoomGroup(RevisionStampedMixin, models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='room_groups', null=True, blank=True)
+    revision = models.BigIntegerField(default=0)
 
     def __str__(self):
         return self.name
     
     class Meta:
         unique_together = ('name', 'company')
+        indexes = [
+            models.Index(fields=['company', 'revision'], name='roomgroup_company_revision_idx'),
+        ]
 
 # Room model represents a physical space controlled by the system. Each room has a unique ID that is used by
 # the hardware controller (ESP32), a name, and belongs to both a company and a room group.
-class Room(models.Model):
+class Room(RevisionStampedMixin, models.Model):
     room_id = models.CharField(max_length=50)
     name = models.CharField(max_length=255)
     is_unlocked = models.BooleanField(default=False)
     unlock_timestamp = models.DateTimeField(null=True, blank=True)
     group = models.ForeignKey(RoomGroup, on_delete=models.CASCADE, related_name='rooms')
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='rooms', null=True, blank=True)
+    revision = models.BigIntegerField(default=0)
 
     def __str__(self):
         return f"{self.name} ({self.room_id})"
     
     class Meta:
         unique_together = ('room_id', 'company')
+        indexes = [
+            # list_user_rooms: rooms of a company restricted to the user's groups
+            models.Index(fields=['company', 'group'], name='room_company_group_idx'),
+            models.Index(fields=['company', 'revision'], name='room_company_revision_idx'),
+        ]
 
 # UserRoomGroup is a junction model that links users to room groups, defining access permissions.
 # Each entry gives a specific user access to all rooms in a specific room group.
-class UserRoomGroup(models.Model):
+class UserRoomGroup(RevisionStampedMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='allowed_room_groups')
     room_group = models.ForeignKey(RoomGroup, on_delete=models.CASCADE)
+    revision = models.BigIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'room_group')
+        indexes = [
+            models.Index(fields=['revision'], name='userroomgroup_revision_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.room_group.name}"
 
+# EffectiveRoomAccess is a materialized view of UserRoomGroup: one row for every room a user may open. It is kept
+# in sync by the signal handlers in core/signals.py (and rebuilt by `manage.py rebuild_effective_access`), so a
+# permission check or a user's room list is a single indexed lookup instead of a walk through their groups.
+class EffectiveRoomAccess(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='effective_room_access')
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='effective_access')
+
+    class Meta:
+        unique_together = ('user', 'room')
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.room_id}"
+
 # AccessLog model records all access attempts, whether successful or failed. It includes details about
 # the biometric verification results, helping with security auditing and troubleshooting.
 class AccessLog(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    room = models.ForeignKey(Room, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # The composite indexes in Meta lead with each foreign key, so the single-column FK indexes are dropped
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, db_index=False)
+    timestamp = models.DateTimeField(default=timezone.now)  # set explicitly when written from the log buffer
     access_granted = models.BooleanField()
     face_spoofing_result = models.CharField(max_length=50)  # genuine/spoofed
     speaker_similarity_score = models.FloatField()
     audio_deepfake_result = models.IntegerField()  # 0 for deepfake, 1 for genuine
     transcription_score = models.FloatField()
     failure_reason = models.CharField(max_length=255, null=True, blank=True)
-    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='access_logs', null=True, blank=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='access_logs', null=True, blank=True, db_index=False)
 
     def __str__(self):
         return f"{self.user.username} - {self.room.room_id} - {'Granted' if self.access_granted else 'Denied'}"
 
+    class Meta:
+        # Match list_access_logs: filtered by company (admins) or user, optionally by room, newest first. The id
+        # column breaks timestamp ties so keyset pages in (-timestamp, -id) order read straight off the index
+        indexes = [
+            models.Index(fields=['company', '-timestamp', '-id'], name='accesslog_company_ts_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='accesslog_user_ts_idx'),
+            models.Index(fields=['room', '-timestamp', '-id'], name='accesslog_room_ts_idx'),
+        ]
+
+# AccessLogRollup model keeps pre-aggregated access statistics in hourly and daily buckets per company, room,
+# user, outcome and failure reason. It is updated as logs are written (see core/rollups.py) so dashboard
+# queries read a handful of buckets instead of scanning the raw access logs.
+class AccessLogRollup(models.Model):
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='access_rollups', null=True, blank=True)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='access_rollups')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='access_rollups')
+    access_granted = models.BooleanField()
+    failure_reason = models.CharField(max_length=255, blank=True, default='')  # '' when access was granted
+    count = models.PositiveIntegerField(default=0)
+    speaker_similarity_sum = models.FloatField(default=0)
+    transcription_score_sum = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} - {self.room_id} - {self.count}"
+
+    class Meta:
+        unique_together = ('granularity', 'bucket_start', 'company', 'room', 'user', 'access_granted', 'failure_reason')
+        indexes = [
+            models.Index(fields=['company', 'granularity', 'bucket_start'], name='rollup_company_bucket_idx'),
+        ]
+
+# AccessLogArchiveSegment model indexes the compressed files that aged access logs are moved into. Each segment
+# is an immutable gzip NDJSON file covering one month (or part of one) of a company's logs; the recorded time
+# and id ranges let the log API find the segments for a query without opening any other file.
+class AccessLogArchiveSegment(models.Model):
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='archive_segments')
+    path = models.CharField(max_length=255, unique=True)  # relative to ACCESS_LOG_ARCHIVE_ROOT
+    month = models.DateField()
+    start_timestamp = models.DateTimeField()
+    end_timestamp = models.DateTimeField()
+    first_log_id = models.BigIntegerField()
+    last_log_id = models.BigIntegerField()
+    row_count = models.PositiveIntegerField()
+    size_bytes = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.company.name} {self.month:%Y-%m} ({self.row_count} logs)"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-end_timestamp'], name='archive_company_end_idx'),
+        ]
+
+# DoorEvent model records physical door activity reported by the room controllers (ESP32). Controllers number
+# their events with a per-device sequence so batches flushed after an outage can be retried safely, and opened
+# doors are linked back to the AccessLog grant that unlocked them.
+class DoorEvent(models.Model):
+    EVENT_CHOICES = [
+        ('opened', 'Door opened'),
+        ('closed', 'Door closed'),
+        ('forced', 'Door forced open'),
+        ('held_open', 'Door held open'),
+    ]
+
+    device_id = models.CharField(max_length=64)
+    sequence = models.PositiveBigIntegerField()
+    event_type = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='door_events')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='door_events', null=True, blank=True)
+    access_log = models.ForeignKey(AccessLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='door_events')
+
+    def __str__(self):
+        return f"{self.device_id} #{self.sequence} - {self.room.room_id} - {self.event_type}"
+
+    class Meta:
+        unique_together = ('device_id', 'sequence')
+
+# EnrollmentJob model tracks a registration while its biometric samples are processed in the background. The
+# request stages the uploads and the account details (with the password already hashed) and returns the job id;
+# a worker decodes and checks the samples, encrypts them and only then creates the user, company and membership.
+class EnrollmentJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid_lib.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=50, blank=True, default='')
+    progress = models.PositiveSmallIntegerField(default=0)
+    username = models.CharField(max_length=150)
+    email = models.EmailField()
+    phone_number = models.CharField(max_length=15)
+    full_name = models.CharField(max_length=255)
+    password = models.CharField(max_length=128)  # already hashed
+    # Either an invite token or the name of a company to create once enrollment succeeds
+    invite_token = models.ForeignKey(InviteToken, on_delete=models.SET_NULL, null=True, blank=True, related_name='enrollment_jobs')
+    company_name = models.CharField(max_length=255, blank=True, default='')
+    face_upload = models.CharField(max_length=500)  # staged files under ENROLLMENT_STAGING_DIR
+    voice_upload = models.CharField(max_length=500)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='enrollment_jobs')
+    error = models.TextField(blank=True, default='')
+    errors = models.JSONField(null=True, blank=True)  # field errors, shaped like the register validation errors
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Enrollment {self.id} for {self.username} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='enrollment_status_idx'),
+        ]
+
+# BulkEnrollment model tracks a bulk provisioning run started from the admin API: a manifest of users plus a zip
+# of their face and voice samples, processed by the task worker (see core/bulk_enroll.py). The per-row report is
+# saved after every batch, so a run that is interrupted continues from the first unprocessed row.
+class BulkEnrollment(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid_lib.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='bulk_enrollments')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='bulk_enrollments')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    manifest_path = models.CharField(max_length=500)  # staged files under BULK_ENROLL_STAGING_DIR
+    archive_path = models.CharField(max_length=500)
+    total_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    report = models.JSONField(default=list, blank=True)  # one entry per manifest row
+    activation_tokens = models.JSONField(default=dict, blank=True)  # {row: token} not yet fetched from the status API
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Bulk enrollment {self.id} for {self.company.name} ({self.status})"
+
+# Task model is one unit of background work in the database-backed queue (core/task_queue.py). Requests enqueue a
+# task by name with JSON arguments, and `manage.py run_worker` processes claim due tasks, run them and retry failures
+# with exponential backoff until max_attempts is reached.
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    priority = models.SmallIntegerField(default=0)  # higher runs first
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True, default='')
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: due queued tasks, highest priority first
+            models.Index(fields=['status', 'run_at', 'priority'], name='task_due_idx'),
+        ]
+
+# PeriodicTask model holds the schedule for tasks that run at a fixed interval (e.g. relocking expired rooms).
+# Rows are created from settings.TASK_SCHEDULES when a worker starts; next_run_at is advanced with a conditional
+# update, so each run is enqueued once even with several workers.
+class PeriodicTask(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    interval_seconds = models.PositiveIntegerField()
+    enabled = models.BooleanField(default=True)
+    next_run_at = models.DateTimeField(default=timezone.now)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} every {self.interval_seconds}s"
+
+# Tombstone model records a deleted user, room, room group or permission with the company revision of the
+# deletion, so delta sync clients learn what to remove. Tombstones are purged after SYNC_TOMBSTONE_RETENTION_DAYS.
+class Tombstone(models.Model):
+    KIND_CHOICES = [
+        ('user', 'User'),
+        ('room', 'Room'),
+        ('room_group', 'Room group'),
+        ('permission', 'Permission'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='tombstones', db_index=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    revision = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted at revision {self.revision}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'revision'], name='tombstone_company_revision_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+# OutboundEmail model is one message in the outbound mail queue (core/mailer.py). Requests only insert rows; the
+# task worker renders them from their template and context and sends them in batches over one SMTP connection,
+# retrying failed deliveries with backoff until max_attempts is reached.
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=100)  # e.g. 'emails/invitation'; rendered from .html and .txt
+    context = models.JSONField(default=dict, blank=True)
+    invite_token = models.ForeignKey(
+        InviteToken, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True, default='')  # the sending batch that claimed it
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # The sender's claim query: queued messages whose next attempt is due
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
 # Create directories for biometric data
 os.makedirs(settings.BIOMETRIC_ROOT, exist_ok=True)
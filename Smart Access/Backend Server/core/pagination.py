@@ -0,0 +1,84 @@
+# core/pagination.py
+import base64
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded"""
+
+
+# Keyset (cursor) pagination walks a queryset ordered by (timestamp, id) and resumes strictly after the last row
+# of the previous page. Unlike OFFSET paging, each page is a bounded index range scan, so page 1,000 costs the
+# same as page 1 and rows inserted while a client is paging never shift or duplicate entries.
+def encode_cursor(timestamp, pk):
+    """Encode the position of a row as an opaque URL-safe cursor"""
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+    Returns (timestamp, pk) or raises InvalidCursor.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp_str, pk_str = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        timestamp = parse_datetime(timestamp_str)
+        pk = int(pk_str)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    if timestamp is None:
+        raise InvalidCursor('Invalid cursor')
+    return timestamp, pk
+
+
+def get_page_size(request, default=None, maximum=None):
+    """Read ?page_size= from the request, clamped to the configured maximum"""
+    default = default or settings.ACCESS_LOG_PAGE_SIZE
+    maximum = maximum or settings.ACCESS_LOG_MAX_PAGE_SIZE
+    try:
+        page_size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def after_cursor(queryset, cursor, descending=True, field='timestamp'):
+    """Restrict a queryset to rows that come after the cursor in (field, id) order"""
+    if not cursor:
+        return queryset
+    timestamp, pk = decode_cursor(cursor)
+    # The OR alone is not sargable on SQLite: the planner cannot turn it into an index range and falls back to
+    # scanning every row of the (company, timestamp) prefix. The redundant inclusive bound gives it one.
+    if descending:
+        return queryset.filter(
+            Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk}),
+            **{f'{field}__lte': timestamp},
+        )
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk}),
+        **{f'{field}__gte': timestamp},
+    )
+
+
+def keyset_page(queryset, cursor=None, page_size=100, descending=True, field='timestamp'):
+    """
+    Fetch one page of a queryset (of model instances or values() rows) ordered by (field, id).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    ordering = (f'-{field}', '-id') if descending else (field, 'id')
+    queryset = after_cursor(queryset, cursor, descending, field).order_by(*ordering)
+
+    # Fetch one extra row to know whether another page exists without a COUNT query
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last[field], last['id'])
+    return rows, encode_cursor(getattr(last, field), last.pk)
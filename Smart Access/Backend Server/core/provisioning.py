@@ -0,0 +1,274 @@
+# core/provisioning.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from . import effective_access, response_cache, revisions
+from .models import Room, RoomGroup, User, UserRoomGroup
+
+
+class ProvisioningError(Exception):
+    """The request cannot be applied; details maps each problem to the names involved"""
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def _as_list(value, name):
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        raise ProvisioningError(f'{name} must be an object or a list of objects')
+    return value
+
+
+def _names(item, key):
+    names = item.get(key) or []
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ProvisioningError(f'{key} must be a list of names')
+    return names
+
+
+def _check_size(count):
+    if count > settings.PROVISIONING_MAX_ITEMS:
+        raise ProvisioningError(f'At most {settings.PROVISIONING_MAX_ITEMS} changes can be made in one request')
+
+
+def apply_permissions(company, grant=None, revoke=None, dry_run=False):
+    """
+    Grant and revoke room group access for matrices of users x groups: each entry of grant/revoke is
+    {'usernames': [...], 'groups': [...]} and applies to every combination. Names are resolved with one IN query
+    per model and the changes are applied in one transaction. Returns the diff of what changed.
+    """
+    grant, revoke = _as_list(grant, 'grant'), _as_list(revoke, 'revoke')
+    _check_size(sum(len(_names(item, 'usernames')) * len(_names(item, 'groups')) for item in grant + revoke))
+
+    usernames = {name for item in grant + revoke for name in _names(item, 'usernames')}
+    group_names = {name for item in grant + revoke for name in _names(item, 'groups')}
+    users = dict(User.objects.filter(company=company, username__in=usernames).values_list('username', 'id'))
+    groups = dict(RoomGroup.objects.filter(company=company, name__in=group_names).values_list('name', 'id'))
+    unknown = {
+        'usernames': sorted(usernames - users.keys()),
+        'groups': sorted(group_names - groups.keys()),
+    }
+    if unknown['usernames'] or unknown['groups']:
+        raise ProvisioningError('Unknown users or room groups', {key: names for key, names in unknown.items() if names})
+
+    def pairs(items):
+        return {
+            (users[username], groups[group]) for item in items
+            for username in _names(item, 'usernames') for group in _names(item, 'groups')
+        }
+    usernames_by_id = {user_id: name for name, user_id in users.items()}
+    groups_by_id = {group_id: name for name, group_id in groups.items()}
+
+    def describe(changed):
+        return sorted(
+            ({'username': usernames_by_id[user_id], 'group': groups_by_id[group_id]} for user_id, group_id in changed),
+            key=lambda pair: (pair['username'], pair['group'])
+        )
+
+    grant_pairs, revoke_pairs = pairs(grant), pairs(revoke)
+    conflicts = grant_pairs & revoke_pairs
+    if conflicts:
+        raise ProvisioningError('The same access cannot be granted and revoked in one request', {
+            'conflicts': describe(conflicts)
+        })
+
+    with transaction.atomic():
+        existing = {
+            (user_id, group_id): pk for pk, user_id, group_id in
+            UserRoomGroup.objects.filter(user_id__in=users.values(), room_group_id__in=groups.values())
+            .values_list('pk', 'user_id', 'room_group_id')
+        }
+        to_add = grant_pairs - existing.keys()
+        to_remove = revoke_pairs & existing.keys()
+
+        if not dry_run:
+            revision = revisions.next_revision(company.id)
+            UserRoomGroup.objects.bulk_create(
+                [UserRoomGroup(user_id=user_id, room_group_id=group_id, revision=revision) for user_id, group_id in to_add],
+                batch_size=effective_access.INSERT_BATCH_SIZE, ignore_conflicts=True
+            )
+            users_by_group = {}
+            for user_id, group_id in to_remove:
+                users_by_group.setdefault(group_id, set()).add(user_id)
+            with effective_access.maintained_by_caller():
+                for group_id, user_ids in users_by_group.items():
+                    UserRoomGroup.objects.filter(room_group_id=group_id, user_id__in=user_ids).delete()
+            # bulk_create sends no signals and the deletes' signals are silenced, so effective access is updated here
+            effective_access.grant_groups(to_add)
+            effective_access.revoke_groups(to_remove)
+            revisions.record_deletions(UserRoomGroup, company.id, [existing[pair] for pair in to_remove])
+            response_cache.invalidate(company.id, 'users')
+
+    return {
+        'dry_run': dry_run,
+        'granted': describe(to_add),
+        'revoked': describe(to_remove),
+        'unchanged': len(grant_pairs - to_add) + len(revoke_pairs - to_remove),
+    }
+
+
+# The entries' fields that must be strings when given (group and room names end up in IN queries and sets)
+TEXT_FIELDS = {'groups': ('name', 'description'), 'rooms': ('room_id', 'name', 'group')}
+
+
+def apply_rooms(company, groups=None, rooms=None, delete_rooms=None, delete_groups=None, dry_run=False):
+    """
+    Create or update room groups ({'name', 'description'}) and rooms ({'room_id', 'name', 'group'}), and delete
+    rooms and groups by room_id/name, all in one transaction. A room may name a group created in the same request.
+    Deleting a group deletes its rooms, unless they are moved to another group in the same request; the diff lists
+    them among the deleted rooms. Returns the diff of what changed.
+    """
+    groups, rooms = _as_list(groups, 'groups'), _as_list(rooms, 'rooms')
+    delete_rooms = _names({'delete_rooms': delete_rooms}, 'delete_rooms')
+    delete_groups = _names({'delete_groups': delete_groups}, 'delete_groups')
+    _check_size(len(groups) + len(rooms) + len(delete_rooms) + len(delete_groups))
+
+    errors = {}
+    for key, items, fields in (('groups', groups, TEXT_FIELDS['groups']), ('rooms', rooms, TEXT_FIELDS['rooms'])):
+        not_text = sorted({field for item in items for field in fields if not isinstance(item.get(field, ''), str)})
+        if not_text:
+            errors.setdefault(key, []).append(f'Must be text: {", ".join(not_text)}')
+    if errors:
+        raise ProvisioningError('Invalid rooms or groups', errors)
+
+    for key, items, field in (('groups', groups, 'name'), ('rooms', rooms, 'room_id')):
+        for item in items:
+            if not item.get(field):
+                errors.setdefault(key, []).append(f'Every entry needs a {field}')
+                break
+        names = [item.get(field) for item in items]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            errors.setdefault(key, []).append(f'Duplicate entries: {", ".join(map(str, duplicates))}')
+    overlap = sorted({item.get('room_id') for item in rooms} & set(delete_rooms))
+    if overlap:
+        errors.setdefault('rooms', []).append(f'Both updated and deleted: {", ".join(overlap)}')
+    overlap = sorted({item.get('name') for item in groups} & set(delete_groups))
+    if overlap:
+        errors.setdefault('groups', []).append(f'Both updated and deleted: {", ".join(overlap)}')
+    if errors:
+        raise ProvisioningError('Invalid rooms or groups', errors)
+
+    diff = {
+        'dry_run': dry_run,
+        'groups': {'created': [], 'updated': [], 'deleted': []},
+        'rooms': {'created': [], 'updated': [], 'deleted': []},
+    }
+    with transaction.atomic():
+        group_names = {item['name'] for item in groups} | {item.get('group') for item in rooms if item.get('group')}
+        group_names |= set(delete_groups)
+        existing_groups = {group.name: group for group in RoomGroup.objects.filter(company=company, name__in=group_names)}
+        existing_rooms = {
+            room.room_id: room for room in Room.objects.filter(
+                company=company, room_id__in={item['room_id'] for item in rooms} | set(delete_rooms)
+            ).select_related('group')
+        }
+
+        # Groups: create the missing ones, update changed descriptions
+        new_groups, changed_groups = [], []
+        for item in groups:
+            group = existing_groups.get(item['name'])
+            if group is None:
+                new_groups.append(RoomGroup(name=item['name'], description=item.get('description', ''), company=company))
+            elif 'description' in item and item['description'] != group.description:
+                group.description = item['description']
+                changed_groups.append(group)
+        diff['groups']['created'] = [group.name for group in new_groups]
+        diff['groups']['updated'] = [group.name for group in changed_groups]
+        deleted_group_names = [name for name in delete_groups if name in existing_groups]
+        diff['groups']['deleted'] = deleted_group_names
+        deleted_room_ids = [room_id for room_id in delete_rooms if room_id in existing_rooms]
+        diff['rooms']['deleted'] = deleted_room_ids
+
+        missing = [item['room_id'] for item in rooms if not item.get('group') and item['room_id'] not in existing_rooms]
+        if missing:
+            raise ProvisioningError('New rooms need a group', {'rooms': missing})
+        unknown = sorted({
+            item['group'] for item in rooms
+            if item.get('group') and item['group'] not in existing_groups and item['group'] not in diff['groups']['created']
+        })
+        if unknown:
+            raise ProvisioningError('Unknown room groups', {'groups': unknown})
+        def target_group(item):
+            # The group a room ends up in: the one it names, or the one it is in now
+            room = existing_rooms.get(item['room_id'])
+            return item.get('group') or (room.group.name if room else None)
+        doomed = [item['room_id'] for item in rooms if target_group(item) in deleted_group_names]
+        if doomed:
+            raise ProvisioningError('Rooms cannot be assigned to a group that is being deleted', {'rooms': doomed})
+        # The rooms of deleted groups go with them, except those moved to another group above
+        moved = {item['room_id'] for item in rooms if item.get('group')}
+        cascaded = Room.objects.filter(company=company, group__name__in=deleted_group_names).exclude(
+            room_id__in=moved | set(deleted_room_ids)
+        ).values_list('room_id', flat=True)
+        diff['rooms']['deleted'] += sorted(cascaded)
+
+        if not dry_run:
+            revision = revisions.next_revision(company.id)
+            for group in new_groups + changed_groups:
+                group.revision = revision
+            RoomGroup.objects.bulk_create(new_groups)
+            RoomGroup.objects.bulk_update(changed_groups, ['description', 'revision'])
+            # bulk_create does not return primary keys on every backend, so read the new groups back
+            existing_groups.update(
+                (group.name, group) for group in
+                RoomGroup.objects.filter(company=company, name__in=diff['groups']['created'])
+            )
+
+        # Rooms: create the missing ones, rename or move the others
+        new_rooms, changed_rooms, moved_room_ids = [], [], []
+        for item in rooms:
+            room = existing_rooms.get(item['room_id'])
+            if room is None:
+                diff['rooms']['created'].append(item['room_id'])
+                if not dry_run:
+                    new_rooms.append(Room(
+                        room_id=item['room_id'], name=item.get('name') or item['room_id'],
+                        group=existing_groups[item['group']], company=company, revision=revision
+                    ))
+                continue
+            changed = False
+            if item.get('name') and item['name'] != room.name:
+                room.name, changed = item['name'], True
+            if item.get('group') and item['group'] != room.group.name:
+                if not dry_run:
+                    room.group = existing_groups[item['group']]
+                moved_room_ids.append(room.id)
+                changed = True
+            if changed:
+                diff['rooms']['updated'].append(item['room_id'])
+                changed_rooms.append(room)
+
+        if not dry_run:
+            for room in changed_rooms:
+                room.revision = revision
+            Room.objects.bulk_create(new_rooms)
+            Room.objects.bulk_update(changed_rooms, ['name', 'group', 'revision'])
+            # Rooms and memberships of deleted groups go with them through the cascade and need tombstones too
+            deleted_group_ids = [existing_groups[name].id for name in deleted_group_names]
+            deleted_ids = {
+                RoomGroup: deleted_group_ids,
+                Room: list(Room.objects.filter(
+                    Q(room_id__in=deleted_room_ids) | Q(group_id__in=deleted_group_ids), company=company
+                ).values_list('id', flat=True)),
+                UserRoomGroup: list(
+                    UserRoomGroup.objects.filter(room_group_id__in=deleted_group_ids).values_list('id', flat=True)
+                ),
+            }
+            with effective_access.maintained_by_caller():
+                Room.objects.filter(company=company, room_id__in=deleted_room_ids).delete()
+                RoomGroup.objects.filter(company=company, name__in=deleted_group_names).delete()
+            # New and moved rooms get their effective access here; bulk writes skip the Room post_save signal.
+            # Deleted rooms and groups take their access rows with them through the foreign key cascade.
+            new_room_ids = Room.objects.filter(
+                company=company, room_id__in=diff['rooms']['created']
+            ).values_list('id', flat=True)
+            effective_access.sync_rooms(list(new_room_ids) + moved_room_ids)
+            for model, ids in deleted_ids.items():
+                revisions.record_deletions(model, company.id, ids)
+            response_cache.invalidate(company.id, 'rooms', 'users')
+    return diff
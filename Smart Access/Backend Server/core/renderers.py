@@ -0,0 +1,30 @@
+# core/renderers.py
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional; without it responses are rendered by the stock json module
+    orjson = None
+
+# orjson writes datetimes, dates, times and UUIDs itself, in the same form as DRF's encoder (UTC as a trailing Z);
+# everything else it does not know (Decimal, lazy translations, querysets, ...) goes through DRF's encoder.
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+_fallback = JSONEncoder()
+
+
+# The FastJSONRenderer produces the same JSON as DRF's JSONRenderer with orjson, which encodes a page of
+# thousands of rows several times faster than json.dumps with a Python-level encoder class. Pretty printed output
+# (?format=api, Accept: application/json; indent=4) and ASCII-only output still use the stock renderer.
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_fallback.default, option=ORJSON_OPTIONS)
+        # Keep the output a strict JavaScript subset, as JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
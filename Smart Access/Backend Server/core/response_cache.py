@@ -0,0 +1,82 @@
+# core/response_cache.py
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+from .db_router import is_pinned, replica_enabled
+
+# Cached admin responses are grouped into scopes, each with its own version per company:
+#   users   - users, frozen accounts and user permissions (User, UserRoomGroup, RoomGroup names)
+#   rooms   - room and room group lists (Room, RoomGroup)
+#   company - company details (Company)
+# A cached response is stored under the current versions of the scopes it reads, so bumping a version on every
+# change makes all earlier entries unreachable; they expire on their own after RESPONSE_CACHE_TIMEOUT.
+SCOPES = ('users', 'rooms', 'company')
+
+
+def _version_key(company_id, scope):
+    return f'response-version:{company_id}:{scope}'
+
+
+def _versions(company_id, scopes):
+    keys = [_version_key(company_id, scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Versions are timestamps, so one that was evicted never comes back with a number used before
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(company_id, *scopes):
+    """
+    Bump the company's versions for the given scopes (all when none are given) once the current transaction
+    commits, so a concurrent request cannot cache the data as it was before the change under the new version.
+    """
+    if company_id is None:
+        return
+    keys = [_version_key(company_id, scope) for scope in scopes or SCOPES]
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, None))
+
+
+def cache_per_company(*scopes):
+    """
+    Cache a GET view's successful responses per company under the versions of the scopes it reads. Apply it
+    below @api_view (or with method_decorator on a viewset's list) so authentication runs first; the admin flag is
+    part of the key, so a cached admin response is never served to a user the view would have refused.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            company_id = getattr(request.user, 'company_id', None)
+            if request.method != 'GET' or company_id is None or not settings.RESPONSE_CACHE_TIMEOUT:
+                return view(request, *args, **kwargs)
+
+            versions = _versions(company_id, scopes)
+            if None in versions:
+                # The cache is unavailable (or a dummy backend) and cannot hold versions
+                return view(request, *args, **kwargs)
+            path = hashlib.sha256(request.get_full_path().encode()).hexdigest()[:32]
+            key = f'response:{company_id}:{int(request.user.is_admin)}:{":".join(map(str, versions))}:{path}'
+            cached = cache.get(key)
+            if cached is not None:
+                response = Response(cached)
+                response['X-Cache'] = 'hit'
+                return response
+
+            response = view(request, *args, **kwargs)
+            # A replica may not have the latest change yet for a few seconds after a bump; caching what it
+            # returned would keep serving the old data under the new version
+            lagging = replica_enabled() and not is_pinned(request) and (
+                time.time_ns() - max(versions) < settings.REPLICA_PIN_SECONDS * 10 ** 9
+            )
+            if response.status_code == 200 and not lagging:
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            response['X-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
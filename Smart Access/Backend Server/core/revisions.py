@@ -0,0 +1,109 @@
+# core/revisions.py
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+from . import effective_access
+from .models import Company, Room, RoomGroup, Tombstone, User, UserRoomGroup
+
+# Every change to a company's users, rooms, room groups and permissions is stamped with the next value of the
+# company's revision counter, and every deletion leaves a Tombstone with its revision, so a client that last synced
+# at revision N only needs the rows and tombstones with a revision above N. The counter is advanced with an UPDATE
+# on the company row inside the writing transaction; that row lock orders the revisions of concurrent writers by
+# commit, so a sync that has seen revision N has also seen every change numbered below it.
+KINDS = {User: 'user', Room: 'room', RoomGroup: 'room_group', UserRoomGroup: 'permission'}
+STAMP_BATCH_SIZE = 500
+# Fields that change at runtime without being part of what clients sync: login bookkeeping, and a room's lock
+# state, which is set on every unlock and read live from the room status endpoint instead
+UNSYNCED_FIELDS = {User: {'last_login', 'password'}, Room: {'is_unlocked', 'unlock_timestamp'}}
+
+
+def company_id_of(instance):
+    return instance.user.company_id if isinstance(instance, UserRoomGroup) else instance.company_id
+
+
+def needs_stamp(instance, update_fields):
+    """Whether saving instance (with update_fields, None for all) is a change clients have to sync"""
+    # Bulk writers stamp their rows themselves
+    if effective_access.is_maintained_by_caller():
+        return False
+    if update_fields is not None and set(update_fields) <= UNSYNCED_FIELDS.get(type(instance), set()):
+        return False
+    return company_id_of(instance) is not None
+
+
+def next_revision(company_id):
+    """Advance the company's revision and return the new value. Call inside the transaction making the change"""
+    Company.objects.filter(pk=company_id).update(revision=F('revision') + 1)
+    return Company.objects.values_list('revision', flat=True).get(pk=company_id)
+
+
+def stamp(model, company_id, ids):
+    """Mark rows (changed without signals, e.g. by bulk_update or a queryset update) as changed at a new revision"""
+    ids = list(ids)
+    if not ids or company_id is None:
+        return None
+    with transaction.atomic():
+        revision = next_revision(company_id)
+        for start in range(0, len(ids), STAMP_BATCH_SIZE):
+            model.objects.filter(pk__in=ids[start:start + STAMP_BATCH_SIZE]).update(revision=revision)
+    return revision
+
+
+def record_deletions(model, company_id, ids):
+    """Leave tombstones for deleted rows at a new revision"""
+    ids = list(ids)
+    if not ids or company_id is None:
+        return None
+    with transaction.atomic():
+        revision = next_revision(company_id)
+        Tombstone.objects.bulk_create(
+            [Tombstone(company_id=company_id, kind=KINDS[model], object_id=pk, revision=revision) for pk in ids],
+            batch_size=STAMP_BATCH_SIZE
+        )
+    return revision
+
+
+def changes_since(company, since):
+    """
+    The company's rows and tombstones changed after revision since, up to the current revision. Returns
+    (revision, reset, changes, deleted): changes maps each kind to a queryset of changed rows and deleted maps each
+    kind to the deleted ids. reset is True when since predates the purged tombstones (or is ahead of the counter,
+    e.g. after a restore); the rows are then those of a full sync, which the client uses to replace its copy.
+    """
+    revision, floor = Company.objects.values_list('revision', 'tombstone_floor').get(pk=company.pk)
+    reset = since < floor or since > revision
+    if reset:
+        since = 0
+    # Rows written before delta sync existed have revision 0, so a full sync has no lower bound
+    window = Q(revision__gt=since, revision__lte=revision) if since else Q(revision__lte=revision)
+    changes = {
+        'users': User.objects.filter(window, company=company).select_related('company'),
+        # Rooms show their group's name, so a renamed group brings its rooms along
+        'rooms': Room.objects.filter(
+            window | Q(group__revision__gt=since, group__revision__lte=revision), company=company
+        ).select_related('group', 'company'),
+        'room_groups': RoomGroup.objects.filter(window, company=company).select_related('company'),
+        'permissions': UserRoomGroup.objects.filter(window, user__company=company).select_related('user', 'room_group'),
+    }
+    deleted = {kind: [] for kind in ('users', 'rooms', 'room_groups', 'permissions')}
+    if since:
+        plural = {'user': 'users', 'room': 'rooms', 'room_group': 'room_groups', 'permission': 'permissions'}
+        for kind, object_id in Tombstone.objects.filter(window, company=company).values_list('kind', 'object_id'):
+            deleted[plural[kind]].append(object_id)
+    return revision, reset, changes, deleted
+
+
+def purge_tombstones(retention_days):
+    """
+    Delete tombstones older than retention_days and raise each company's tombstone_floor to the newest revision
+    purged, so clients that synced before it are told to reload. Returns the number deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted = 0
+    old = Tombstone.objects.filter(deleted_at__lt=cutoff)
+    for company_id, newest in old.values('company_id').annotate(newest=Max('revision')).values_list('company_id', 'newest'):
+        with transaction.atomic():
+            Company.objects.filter(pk=company_id, tombstone_floor__lt=newest).update(tombstone_floor=newest)
+            deleted += Tombstone.objects.filter(company_id=company_id, revision__lte=newest).delete()[0]
+    return deleted
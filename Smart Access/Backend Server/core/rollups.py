@@ -0,0 +1,138 @@
+# core/rollups.py
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from .models import AccessLog, AccessLogArchiveSegment, AccessLogRollup
+
+GRANULARITIES = ('hour', 'day')
+BUCKET_LENGTHS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+
+def bucket_start(timestamp, granularity):
+    """Truncate a timestamp to the start of its hourly or daily bucket (UTC)"""
+    if granularity == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def record_access_logs(logs):
+    """
+    Add newly written access logs to the hourly and daily rollups.
+    Logs are first aggregated in memory, so a batch costs one UPDATE per distinct bucket.
+    """
+    totals = {}
+    for log in logs:
+        for granularity in GRANULARITIES:
+            key = (
+                granularity, bucket_start(log.timestamp, granularity), log.company_id,
+                log.room_id, log.user_id, log.access_granted, log.failure_reason or '',
+            )
+            count, speaker_sum, transcription_sum = totals.get(key, (0, 0.0, 0.0))
+            totals[key] = (
+                count + 1,
+                speaker_sum + (log.speaker_similarity_score or 0),
+                transcription_sum + (log.transcription_score or 0),
+            )
+
+    with transaction.atomic():
+        for key, (count, speaker_sum, transcription_sum) in totals.items():
+            _add_to_bucket(key, count, speaker_sum, transcription_sum)
+
+
+def _add_to_bucket(key, count, speaker_sum, transcription_sum):
+    granularity, start, company_id, room_id, user_id, access_granted, failure_reason = key
+    bucket = AccessLogRollup.objects.filter(
+        granularity=granularity, bucket_start=start, company_id=company_id, room_id=room_id,
+        user_id=user_id, access_granted=access_granted, failure_reason=failure_reason,
+    )
+    increments = {
+        'count': F('count') + count,
+        'speaker_similarity_sum': F('speaker_similarity_sum') + speaker_sum,
+        'transcription_score_sum': F('transcription_score_sum') + transcription_sum,
+    }
+    if bucket.update(**increments):
+        return
+    try:
+        # Savepoint so a concurrent insert of the same bucket only rolls back this attempt
+        with transaction.atomic():
+            AccessLogRollup.objects.create(
+                granularity=granularity, bucket_start=start, company_id=company_id, room_id=room_id,
+                user_id=user_id, access_granted=access_granted, failure_reason=failure_reason,
+                count=count, speaker_similarity_sum=speaker_sum, transcription_score_sum=transcription_sum,
+            )
+    except IntegrityError:
+        bucket.update(**increments)
+
+
+def _archived_ranges(company, granularity):
+    """
+    Return a (logs, rollups) pair of filters matching the buckets that hold archived logs: for every company with
+    archive segments, each bucket up to and including the one of its newest archived log. Those buckets can no
+    longer be recomputed from the hot table, so a rebuild leaves them as they are. Returns None if nothing is archived.
+    """
+    segments = AccessLogArchiveSegment.objects.all()
+    if company is not None:
+        segments = segments.filter(company=company)
+    logs, rollups = Q(), Q()
+    for row in segments.values('company_id').annotate(end=Max('end_timestamp')).order_by():
+        floor = bucket_start(row['end'], granularity) + BUCKET_LENGTHS[granularity]
+        logs |= Q(company_id=row['company_id'], timestamp__lt=floor)
+        rollups |= Q(company_id=row['company_id'], bucket_start__lt=floor)
+    return (logs, rollups) if logs else None
+
+
+def rebuild_rollups(company=None, since=None, batch_size=1000):
+    """
+    Recompute rollups from the raw access logs with one GROUP BY per granularity.
+    Existing buckets in the selected range are replaced, except those covering logs already moved into
+    archive segments. Returns the number of buckets written.
+    """
+    written = 0
+    with transaction.atomic():
+        for granularity in GRANULARITIES:
+            logs = AccessLog.objects.all()
+            rollups = AccessLogRollup.objects.filter(granularity=granularity)
+            if company is not None:
+                logs = logs.filter(company=company)
+                rollups = rollups.filter(company=company)
+            if since is not None:
+                start = bucket_start(since, granularity)
+                logs = logs.filter(timestamp__gte=start)
+                rollups = rollups.filter(bucket_start__gte=start)
+            archived = _archived_ranges(company, granularity)
+            if archived:
+                logs = logs.exclude(archived[0])
+                rollups = rollups.exclude(archived[1])
+            rollups.delete()
+
+            grouped = (
+                logs.annotate(
+                    bucket=Trunc('timestamp', granularity),
+                    reason=Coalesce('failure_reason', Value('')),
+                )
+                .values('bucket', 'company_id', 'room_id', 'user_id', 'access_granted', 'reason')
+                .annotate(
+                    total=Count('id'),
+                    speaker_sum=Sum('speaker_similarity_score'),
+                    transcription_sum=Sum('transcription_score'),
+                )
+                .order_by()
+            )
+
+            batch = []
+            for row in grouped.iterator():
+                batch.append(AccessLogRollup(
+                    granularity=granularity, bucket_start=row['bucket'], company_id=row['company_id'],
+                    room_id=row['room_id'], user_id=row['user_id'], access_granted=row['access_granted'],
+                    failure_reason=row['reason'], count=row['total'],
+                    speaker_similarity_sum=row['speaker_sum'] or 0,
+                    transcription_score_sum=row['transcription_sum'] or 0,
+                ))
+                if len(batch) >= batch_size:
+                    AccessLogRollup.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            AccessLogRollup.objects.bulk_create(batch)
+            written += len(batch)
+    return written
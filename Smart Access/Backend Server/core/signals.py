@@ -0,0 +1,116 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models import DEFERRED, QuerySet
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .models import AccessLog, Company, Room, RoomGroup, User, UserRoomGroup
+from .rollups import record_access_logs
+from . import effective_access, response_cache, revisions
+
+
+# Keep the access rollups current as logs are written. Counting happens after commit so a rolled back
+# request never inflates the statistics.
+@receiver(post_save, sender=AccessLog)
+def update_access_rollups(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: record_access_logs([instance]))
+
+
+# The handlers below maintain EffectiveRoomAccess. Deleting a user, room or room group needs no handler:
+# the rows cascade with their foreign keys.
+@receiver(post_save, sender=UserRoomGroup)
+def grant_effective_access(sender, instance, created, **kwargs):
+    if effective_access.is_maintained_by_caller():
+        return
+    if created:
+        effective_access.grant_groups([(instance.user_id, instance.room_group_id)])
+    else:
+        # The membership was edited in place (e.g. through the Django admin)
+        effective_access.sync_user(instance.user_id)
+
+
+@receiver(post_delete, sender=UserRoomGroup)
+def revoke_effective_access(sender, instance, **kwargs):
+    if effective_access.is_maintained_by_caller():
+        return
+    effective_access.revoke_groups([(instance.user_id, instance.room_group_id)])
+
+
+@receiver(post_init, sender=Room)
+def remember_room_group(sender, instance, **kwargs):
+    # Read through __dict__ so rooms loaded with only()/defer() don't fetch the group one query per row
+    instance._loaded_group_id = instance.__dict__.get('group_id', DEFERRED)
+
+
+@receiver(post_save, sender=Room)
+def sync_room_access(sender, instance, created, **kwargs):
+    # Rooms are saved on every lock/unlock, so only a new room or a group change is recomputed
+    group_id = instance.__dict__.get('group_id', DEFERRED)
+    if created or group_id != instance._loaded_group_id:
+        effective_access.sync_room(instance)
+    instance._loaded_group_id = group_id
+
+
+def _origin_model(origin):
+    # The model a delete started from: post_delete's origin is the deleted instance or queryset
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+# The handlers below invalidate the cached admin responses (core/response_cache.py) of the company whose data
+# changed. Bulk writers that silence signals with effective_access.maintained_by_caller() invalidate themselves.
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_responses(sender, instance, update_fields=None, **kwargs):
+    # Logins and password changes save the user but change nothing the cached responses show
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    if not effective_access.is_maintained_by_caller():
+        response_cache.invalidate(instance.company_id, 'users')
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def invalidate_room_responses(sender, instance, **kwargs):
+    if not effective_access.is_maintained_by_caller():
+        response_cache.invalidate(instance.company_id, 'rooms')
+
+
+@receiver(post_save, sender=RoomGroup)
+@receiver(post_delete, sender=RoomGroup)
+def invalidate_room_group_responses(sender, instance, **kwargs):
+    # Group names also appear in the user permission responses
+    if not effective_access.is_maintained_by_caller():
+        response_cache.invalidate(instance.company_id, 'rooms', 'users')
+
+
+@receiver(post_save, sender=UserRoomGroup)
+@receiver(post_delete, sender=UserRoomGroup)
+def invalidate_permission_responses(sender, instance, origin=None, **kwargs):
+    if effective_access.is_maintained_by_caller():
+        return
+    # Memberships deleted along with their user or group are covered by that deletion's own invalidation
+    if origin is not None and _origin_model(origin) is not UserRoomGroup:
+        return
+    response_cache.invalidate(instance.user.company_id, 'users')
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_responses(sender, instance, **kwargs):
+    # The company name is part of every cached response
+    response_cache.invalidate(instance.pk)
+
+
+# Saved users, rooms, room groups and permissions are stamped with the next company revision by their save()
+# (RevisionStampedMixin); the handler below leaves tombstones for deleted ones, for delta sync (core/revisions.py).
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=RoomGroup)
+@receiver(post_delete, sender=UserRoomGroup)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # Nothing is left to sync when the whole company is deleted
+    if effective_access.is_maintained_by_caller() or _origin_model(origin) is Company:
+        return
+    # Rows deleted along with their user or group take the company from it instead of a query per row
+    company_id = getattr(origin, 'company_id', None) or revisions.company_id_of(instance)
+    revisions.record_deletions(sender, company_id, [instance.pk])
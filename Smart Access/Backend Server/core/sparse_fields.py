@@ -0,0 +1,154 @@
+# core/sparse_fields.py
+from importlib import import_module
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class InvalidFields(ValueError):
+    """Raised when ?fields= or ?expand= names a field or relation the serializer does not have"""
+
+
+def _names(value):
+    return [name.strip() for name in value.split(',') if name.strip()] if value else []
+
+
+def requested_fields(params):
+    """
+    Read ?fields= and ?expand= (comma separated, dotted for the fields of an expanded relation, e.g.
+    ?expand=room&fields=id,timestamp,room.name). Returns (fields, expand); fields is None when not given.
+    """
+    fields = _names(params.get('fields'))
+    return fields or None, _names(params.get('expand'))
+
+
+def _split(names):
+    """Split dotted names into the top-level names and {name: [the names below it]}"""
+    top, nested = [], {}
+    for name in names:
+        head, _, rest = name.partition('.')
+        if head not in top:
+            top.append(head)
+        if rest:
+            nested.setdefault(head, []).append(rest)
+    return top, nested
+
+
+# Serializers with this mixin take fields= (the output keys to keep, None for all) and expand= (relations in
+# Meta.expandable to embed as nested objects) when they render. optimize() then narrows a queryset to what the
+# remaining fields read: select_related() for the relations they traverse and only() for their columns, so a
+# field that was not asked for costs neither a join nor a column. Writes use the serializers as they are.
+class SparseFieldsMixin:
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        expand, expand_nested = _split(expand)
+        fields, fields_nested = _split(fields) if fields is not None else (None, {})
+
+        expandable = getattr(self.Meta, 'expandable', {})
+        unknown = [name for name in expand if name not in expandable]
+        if unknown:
+            raise InvalidFields(f"Cannot expand: {', '.join(unknown)}")
+        for name in fields_nested:
+            if name not in expand:
+                raise InvalidFields(f'Expand {name} to select its fields')
+        for name in expand:
+            serializer_class = expandable[name]
+            if isinstance(serializer_class, str):
+                serializer_class = getattr(import_module(type(self).__module__), serializer_class)
+            self.fields[name] = serializer_class(
+                read_only=True, fields=fields_nested.get(name), expand=expand_nested.get(name, ())
+            )
+
+        if fields is not None:
+            unknown = [name for name in fields if name not in self.fields or self.fields[name].write_only]
+            if unknown:
+                raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+            for name in list(self.fields):
+                if name not in fields and name not in expand:
+                    self.fields.pop(name)
+
+    def optimize(self, queryset, *columns):
+        """
+        Narrow a queryset to the relations and columns the serializer's fields read. columns are loaded as well,
+        e.g. the keyset pagination field.
+        """
+        related, loaded = self._lookups(queryset.model)
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        if loaded is not None:
+            queryset = queryset.only(*loaded, *columns)
+        return queryset
+
+    def _lookups(self, model, prefix=''):
+        """
+        The relation paths to join and the column paths to load for the readable fields. The columns are None
+        when a field reads something other than model columns (a method, a property, a reverse relation), which
+        only() cannot express.
+        """
+        related, columns = set(), set()
+        for field in self.fields.values():
+            if field.write_only:
+                continue
+            current, path = model, []
+            model_field = None
+            for attr in field.source_attrs:
+                try:
+                    model_field = current._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    model_field = None
+                    break
+                path.append(attr)
+                if len(path) < len(field.source_attrs):
+                    if not _is_forward_relation(model_field):
+                        model_field = None
+                        break
+                    related.add(prefix + '__'.join(path))
+                    current = model_field.related_model
+            if model_field is None or field.source == '*':
+                columns = None
+                continue
+
+            lookup = prefix + '__'.join(path)
+            if isinstance(field, SparseFieldsMixin) and _is_forward_relation(model_field):
+                related.add(lookup)
+                nested_related, nested_columns = field._lookups(model_field.related_model, lookup + '__')
+                related |= nested_related
+                if nested_columns is None:
+                    columns = None
+                elif columns is not None:
+                    columns |= nested_columns
+            elif model_field.is_relation and not _is_forward_relation(model_field):
+                columns = None
+            if columns is not None:
+                # The foreign keys on the way are loaded too; a deferred one cannot be followed by select_related
+                columns.update(prefix + '__'.join(path[:depth]) for depth in range(1, len(path) + 1))
+        return related, columns
+
+
+def _is_forward_relation(model_field):
+    return (model_field.many_to_one or model_field.one_to_one) and model_field.concrete
+
+
+# Viewsets with this mixin pass ?fields= and ?expand= to their serializer on GET requests and load only what the
+# chosen fields read. A name the serializer does not know is answered with a 400.
+class SparseFieldsViewMixin:
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            fields, expand = requested_fields(self.request.query_params)
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method == 'GET':
+            queryset = self.get_serializer().optimize(queryset)
+        return queryset
+
+    def handle_exception(self, exc):
+        if isinstance(exc, InvalidFields):
+            return Response({
+                'error': str(exc)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return super().handle_exception(exc)
@@ -0,0 +1,37 @@
+# core/sqlite.py
+from django.conf import settings
+
+# Order matters: journal_mode must be switched before the other pragmas, and page-cache settings apply per connection
+TUNING_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size', 'temp_store')
+
+
+def tuning_statements(tuning):
+    """Turn a SQLITE_TUNING dict into the PRAGMA statements to run on a new connection"""
+    return [f'PRAGMA {name} = {tuning[name]}' for name in TUNING_PRAGMAS if tuning.get(name) is not None]
+
+
+def apply_sqlite_tuning(sender, connection, **kwargs):
+    """connection_created handler: apply SQLITE_TUNING to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    tuning = getattr(settings, 'SQLITE_TUNING', None)
+    if not tuning:
+        return
+    with connection.cursor() as cursor:
+        for statement in tuning_statements(tuning):
+            cursor.execute(statement)
+
+
+def run_maintenance(connection, checkpoint='TRUNCATE', analyze=False):
+    """
+    Checkpoint the write-ahead log back into the database file and refresh the query planner statistics.
+    Returns the (busy, log_pages, checkpointed_pages) result of the checkpoint.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({checkpoint})')
+        result = cursor.fetchone()
+        if analyze:
+            cursor.execute('ANALYZE')
+        # Only re-analyzes tables whose statistics are stale, so it is cheap to run often
+        cursor.execute('PRAGMA optimize')
+    return result
@@ -0,0 +1,172 @@
+# core/task_queue.py
+import logging
+import random
+import traceback
+from datetime import timedelta
+from importlib import import_module
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import PeriodicTask, Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_modules_loaded = False
+
+
+class TaskNotRegistered(Exception):
+    """Raised when a task name has no registered function"""
+
+
+def task(name=None, max_attempts=3):
+    """
+    Register a function as a background task. The function is still callable directly; enqueue it with
+    enqueue('<name>', *args, **kwargs). Arguments are stored as JSON, so pass ids rather than model instances.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        _registry[task_name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    # Task modules are imported on first use, so code that only enqueues never has to load them
+    global _modules_loaded
+    if not _modules_loaded:
+        for module in settings.TASK_MODULES:
+            import_module(module)
+        _modules_loaded = True
+    try:
+        return _registry[name]
+    except KeyError:
+        raise TaskNotRegistered(name)
+
+
+def enqueue(name, *args, delay=None, priority=0, max_attempts=None, **kwargs):
+    """
+    Queue a task by name (or a function decorated with @task). The row is written in the caller's transaction,
+    so a task queued by a request that rolls back is never run.
+    """
+    func = name if callable(name) else None
+    return Task.objects.create(
+        name=func.task_name if func else name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay or 0),
+        max_attempts=max_attempts or getattr(func, 'max_attempts', None) or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def _due_tasks(now):
+    return Task.objects.filter(status='queued', run_at__lte=now).order_by('-priority', 'run_at', 'pk')
+
+
+def claim(worker_id, limit=1):
+    """
+    Claim up to limit due tasks for a worker and return them. On databases with SELECT ... FOR UPDATE SKIP LOCKED
+    (PostgreSQL, MySQL 8) workers lock different rows and never wait on each other. SQLite has no row locks; there
+    each candidate is claimed with a conditional update, which only one worker can win.
+    """
+    now = timezone.now()
+    claimed_fields = {'status': 'running', 'locked_by': worker_id, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(_due_tasks(now).select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Task.objects.filter(pk__in=ids).update(**claimed_fields)
+    else:
+        ids = []
+        # Read a few extra candidates so losing some races to other workers still fills the batch
+        for pk in _due_tasks(now).values_list('pk', flat=True)[:limit * 2]:
+            if Task.objects.filter(pk=pk, status='queued').update(**claimed_fields):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(Task.objects.filter(pk__in=ids).order_by('-priority', 'run_at', 'pk'))
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: TASK_RETRY_BASE_DELAY * 2^(attempts - 1), capped at TASK_RETRY_MAX_DELAY"""
+    delay = min(settings.TASK_RETRY_MAX_DELAY, settings.TASK_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run(task_row):
+    """Run a claimed task and record the outcome: succeeded, queued again with backoff, or failed"""
+    try:
+        get_task(task_row.name)(*task_row.args, **task_row.kwargs)
+    except Exception as e:
+        error = traceback.format_exc()
+        if task_row.attempts < task_row.max_attempts and not isinstance(e, TaskNotRegistered):
+            delay = retry_delay(task_row.attempts)
+            logger.warning(f'Task {task_row} failed (attempt {task_row.attempts}), retrying in {delay:.0f}s: {e}')
+            _release(task_row, status='queued', run_at=timezone.now() + timedelta(seconds=delay), last_error=error)
+        else:
+            logger.error(f'Task {task_row} failed permanently after {task_row.attempts} attempts: {e}')
+            _release(task_row, status='failed', finished_at=timezone.now(), last_error=error)
+        return False
+    _release(task_row, status='succeeded', finished_at=timezone.now())
+    return True
+
+
+def _release(task_row, **fields):
+    # Only the worker holding the claim may record the outcome; a task requeued as stale belongs to someone else
+    Task.objects.filter(pk=task_row.pk, status='running', locked_by=task_row.locked_by).update(
+        locked_by='', locked_at=None, **fields
+    )
+
+
+def requeue_stale(timeout=None):
+    """Queue tasks again whose worker died while running them (counted as a failed attempt)"""
+    cutoff = timezone.now() - timedelta(seconds=timeout or settings.TASK_TIMEOUT)
+    stale = Task.objects.filter(status='running', locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_by='', locked_at=None, finished_at=timezone.now(), last_error='Worker timed out'
+    )
+    requeued = stale.update(status='queued', locked_by='', locked_at=None, last_error='Worker timed out')
+    return requeued, failed
+
+
+def sync_schedules():
+    """Create or update the PeriodicTask rows for settings.TASK_SCHEDULES, keeping their next run times"""
+    for name, schedule in settings.TASK_SCHEDULES.items():
+        PeriodicTask.objects.update_or_create(name=name, defaults={
+            'task': schedule['task'],
+            'args': schedule.get('args', []),
+            'kwargs': schedule.get('kwargs', {}),
+            'interval_seconds': schedule['interval'],
+            'enabled': schedule.get('enabled', True),
+        })
+
+
+def enqueue_due_periodic_tasks():
+    """Queue one run of every periodic task that is due. Returns the number queued"""
+    now = timezone.now()
+    queued = 0
+    for periodic in PeriodicTask.objects.filter(enabled=True, next_run_at__lte=now):
+        next_run_at = now + timedelta(seconds=periodic.interval_seconds)
+        with transaction.atomic():
+            # Advancing next_run_at claims this run; a worker that read the same row loses the update
+            if not PeriodicTask.objects.filter(pk=periodic.pk, next_run_at=periodic.next_run_at).update(
+                next_run_at=next_run_at, last_run_at=now
+            ):
+                continue
+            # Skip the run while the previous one is still waiting, so a stopped worker does not build a backlog
+            if Task.objects.filter(name=periodic.task, status__in=('queued', 'running'), args=periodic.args).exists():
+                continue
+            enqueue(periodic.task, *periodic.args, max_attempts=1, **periodic.kwargs)
+            queued += 1
+    return queued
+
+
+def purge_finished(older_than_days):
+    """Delete succeeded and failed tasks that finished more than older_than_days ago"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = Task.objects.filter(status__in=('succeeded', 'failed'), finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,55 @@
+# core/tasks.py
+# Background tasks run by `manage.py run_worker`. Queue them with core.task_queue.enqueue('<name>', ...).
+from django.conf import settings
+from . import bulk_enroll, enrollment, invite_tokens, mailer, revisions, utils
+from .models import InviteToken
+from .session_backend import sweep_expired_sessions
+from .task_queue import purge_finished, task
+
+
+@task(name='core.send_invite_email', max_attempts=5)
+def send_invite_email(token_id):
+    """Queue the invitation email for a token (tasks queued before invitations went through the mail queue)"""
+    token = InviteToken.objects.select_related('company', 'created_by').get(pk=token_id)
+    mailer.queue_invitations([token])
+
+
+@task(name='core.send_queued_email', max_attempts=1)
+def send_queued_email():
+    # Failed deliveries are retried by the mail queue itself, per message
+    mailer.send_pending()
+
+
+@task(name='core.lock_expired_rooms', max_attempts=1)
+def lock_expired_rooms():
+    utils.lock_expired_rooms()
+
+
+@task(name='core.process_enrollment', max_attempts=settings.ENROLLMENT_MAX_ATTEMPTS)
+def process_enrollment(job_id):
+    enrollment.run_job(job_id)
+
+
+@task(name='core.bulk_enroll', max_attempts=settings.BULK_ENROLL_MAX_ATTEMPTS)
+def run_bulk_enrollment(bulk_id):
+    bulk_enroll.run_bulk_enrollment(bulk_id)
+
+
+@task(name='core.sweep_sessions', max_attempts=1)
+def sweep_sessions():
+    sweep_expired_sessions(pause=0.05)
+
+
+@task(name='core.purge_tasks', max_attempts=1)
+def purge_tasks():
+    purge_finished(settings.TASK_RETENTION_DAYS)
+
+
+@task(name='core.sweep_invite_tokens', max_attempts=1)
+def sweep_invite_tokens():
+    invite_tokens.sweep_dead_tokens(settings.INVITE_TOKEN_RETENTION_DAYS, pause=0.05)
+
+
+@task(name='core.purge_tombstones', max_attempts=1)
+def purge_tombstones():
+    revisions.purge_tombstones(settings.SYNC_TOMBSTONE_RETENTION_DAYS)
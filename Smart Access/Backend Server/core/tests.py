@@ -1,3 +1,2069 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher, identify_hasher, make_password
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.mail.backends import locmem
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .db_router import PrimaryPinningMiddleware, PrimaryReplicaRouter, use_replica
+from . import (
+    archive, bulk_enroll, checks, compression, effective_access, enrollment, hashers, lockout, log_writer, mailer,
+    renderers, session_backend, task_queue, throttling,
+)
+from .access_logs import filter_access_logs
+from .admin import InviteTokenAdmin, InviteTokenStatusFilter
+from .effective_access import grant_groups
+from .invite_tokens import SWEEP_CHUNK_SIZE, dead_tokens, sweep_dead_tokens
+from .management.commands import export_access_logs
+from .models import (
+    AccessLog, AccessLogArchiveSegment, AccessLogRollup, BulkEnrollment, Company, DoorEvent, EffectiveRoomAccess,
+    EnrollmentJob, InviteToken, OutboundEmail, PeriodicTask, Room, RoomGroup, Task, Tombstone, User, UserRoomGroup,
+)
+from .pagination import after_cursor, decode_cursor, encode_cursor
+from .provisioning import apply_permissions, apply_rooms
+from .renderers import FastJSONRenderer
+from .revisions import purge_tombstones
+from .rollups import rebuild_rollups
+from .serializers import ACCESS_LOG_VALUES, USER_VALUES, AccessLogSerializer, UserSerializer
+
+
+# These tests pin the query plans of the hot access-log and permission queries to the composite indexes
+# declared on the models, so a change to the filters or ordering that falls back to a table scan fails. The
+# access-log queries are the keyset pages the API runs: an index range bounded by the cursor, never a sort.
+class QueryPlanIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Plan Co')
+        cls.group = RoomGroup.objects.create(name='Lab', company=cls.company)
+        cls.room = Room.objects.create(room_id='R101', name='Lab 1', group=cls.group, company=cls.company)
+        cls.user = User.objects.create_user(
+            username='planner', email='planner@example.com', password='pw', company=cls.company
+        )
+        cls.admin = User.objects.create_user(
+            username='plan_admin', email='plan_admin@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        AccessLog.objects.bulk_create([
+            AccessLog(
+                user=cls.user, room=cls.room, company=cls.company, access_granted=bool(i % 2),
+                face_spoofing_result='genuine', speaker_similarity_score=0.9,
+                audio_deepfake_result=1, transcription_score=0.9
+            )
+            for i in range(50)
+        ])
+
+    def keyset(self, logs, descending=True):
+        """The queryset keyset_page runs for a page after the cursor of a row in the middle of the table"""
+        middle = AccessLog.objects.order_by('id')[25]
+        ordering = ('-timestamp', '-id') if descending else ('timestamp', 'id')
+        cursor = encode_cursor(middle.timestamp, middle.id)
+        return after_cursor(logs, cursor, descending=descending).order_by(*ordering)
+
+    def assertUsesIndex(self, queryset, index_name, bound='timestamp<'):
+        plan = queryset.explain()
+        search = [line for line in plan.splitlines() if index_name in line]
+        self.assertTrue(search and 'SEARCH' in search[0], f'Expected a {index_name} search in plan:\n{plan}')
+        self.assertIn(bound, search[0], f'Expected a timestamp range bound in plan:\n{plan}')
+        self.assertNotIn('TEMP B-TREE', plan, f'Unexpected sort in plan:\n{plan}')
+
+    def test_admin_company_logs(self):
+        logs = filter_access_logs(self.admin, {'start_date': timezone.now() - timezone.timedelta(days=30)})
+        self.assertUsesIndex(self.keyset(logs), 'accesslog_company_ts_idx')
+
+    def test_user_logs(self):
+        self.assertUsesIndex(self.keyset(filter_access_logs(self.user, {})), 'accesslog_user_ts_idx')
+
+    def test_room_logs(self):
+        self.assertUsesIndex(self.keyset(AccessLog.objects.filter(room=self.room)), 'accesslog_room_ts_idx')
+        # The API filters on the room's public id through a join, which must not bring back a sort either
+        logs = filter_access_logs(self.admin, {'room_id': 'R101'})
+        self.assertNotIn('TEMP B-TREE', self.keyset(logs).explain())
+
+    def test_export_logs(self):
+        logs = AccessLog.objects.filter(company=self.company)
+        self.assertUsesIndex(self.keyset(logs, descending=False), 'accesslog_company_ts_idx', bound='timestamp>')
+
+    def test_room_lookup(self):
+        rooms = Room.objects.filter(room_id='R101', company=self.company)
+        self.assertIn('INDEX', rooms.explain())
+
+    def test_permission_check(self):
+        allowed = self.user.allowed_room_groups.filter(room_group=self.group)
+        self.assertIn('INDEX', allowed.explain())
+
+    def test_valid_invite_tokens(self):
+        tokens = InviteToken.objects.valid().filter(company=self.company)
+        self.assertIn('invite_company_state_idx', tokens.explain())
+
+    def test_invite_token_sweep(self):
+        # The sweeper's chunk query, including the exclude of tokens that registrations in progress still need
+        chunk = dead_tokens(30).values_list('pk', flat=True)[:SWEEP_CHUNK_SIZE]
+        self.assertIn('invite_expires_idx', chunk.explain())
+
+
+# These tests post controller batches of door events: repeats inside a batch and resent batches are skipped, an
+# opened door is linked to the grant that unlocked it within the correlation window, and a room_id that several
+# companies use is resolved by company_id or by the room the device reported before.
+class DoorEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Door Co')
+        cls.other_company = Company.objects.create(name='Other Door Co')
+        cls.user = User.objects.create_user(username='door_user', email='door@example.com', company=cls.company)
+        cls.room = Room.objects.create(
+            room_id='D1', name='Door 1', company=cls.company,
+            group=RoomGroup.objects.create(name='Doors', company=cls.company)
+        )
+        cls.other_room = Room.objects.create(
+            room_id='D1', name='Door 1', company=cls.other_company,
+            group=RoomGroup.objects.create(name='Doors', company=cls.other_company)
+        )
+        cls.start = timezone.now().replace(microsecond=0) - timezone.timedelta(hours=1)
+
+    def post(self, events, **batch):
+        batch.setdefault('device_id', 'esp32-d1')
+        batch.setdefault('room_id', 'D1')
+        batch.setdefault('company_id', self.company.id)
+        if batch['company_id'] is None:
+            del batch['company_id']
+        batch['events'] = [
+            {'sequence': sequence, 'event_type': event_type, 'occurred_at': self.start + timezone.timedelta(seconds=at)}
+            for sequence, event_type, at in events
+        ]
+        return self.client.post('/api/controllers/door-events/', batch, content_type='application/json')
+
+    def test_repeats_are_skipped(self):
+        response = self.post([(1, 'opened', 0), (2, 'closed', 5), (2, 'closed', 5)])
+        self.assertEqual(response.json(), {'accepted': 2, 'duplicates': 1, 'last_sequence': 2})
+        response = self.post([(2, 'closed', 5), (3, 'forced', 60)])
+        self.assertEqual(response.json(), {'accepted': 1, 'duplicates': 1, 'last_sequence': 3})
+        self.assertEqual(
+            list(DoorEvent.objects.order_by('sequence').values_list('sequence', 'room', 'company')),
+            [(sequence, self.room.id, self.company.id) for sequence in (1, 2, 3)]
+        )
+
+    def test_opened_door_is_linked_to_its_grant(self):
+        grant = AccessLog.objects.create(
+            user=self.user, room=self.room, company=self.company, access_granted=True, timestamp=self.start,
+            face_spoofing_result='genuine', speaker_similarity_score=0.9, audio_deepfake_result=1,
+            transcription_score=0.9
+        )
+        self.post([(1, 'opened', 10), (2, 'opened', 45), (3, 'forced', 12)])
+        self.assertEqual(
+            dict(DoorEvent.objects.values_list('sequence', 'access_log')), {1: grant.id, 2: None, 3: None}
+        )
+
+    def test_shared_room_id_needs_company_or_history(self):
+        self.assertEqual(self.post([(1, 'opened', 0)], company_id=None).status_code, 400)
+        self.assertEqual(self.post([(1, 'opened', 0)], company_id=self.other_company.id).status_code, 200)
+        # The device's earlier events tell the rooms apart from now on
+        response = self.post([(2, 'closed', 5)], company_id=None)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(DoorEvent.objects.values_list('room', flat=True)), {self.other_room.id})
+        self.assertEqual(self.post([(1, 'opened', 0)], room_id='nope').status_code, 404)
+
+
+# These tests stream access log exports: rows come oldest first in CSV or NDJSON, limited to the admin's company
+# and the list filters, and an export resumes after the cursor of the last row received. The export_access_logs
+# runs crash between writing a chunk and checkpointing it, and --resume must not write the chunk twice.
+class AccessLogExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Export Co')
+        cls.admin = User.objects.create_user(
+            username='export_admin', email='export_admin@example.com', company=cls.company, is_admin=True
+        )
+        other = Company.objects.create(name='Other Export Co')
+        room = Room.objects.create(
+            room_id='E1', name='Export Room', company=cls.company,
+            group=RoomGroup.objects.create(name='Export', company=cls.company)
+        )
+        other_room = Room.objects.create(
+            room_id='E1', name='Export Room', company=other,
+            group=RoomGroup.objects.create(name='Export', company=other)
+        )
+        start = timezone.now() - timezone.timedelta(days=1)
+        AccessLog.objects.bulk_create([
+            AccessLog(
+                user=cls.admin, room=other_room if i == 5 else room, company=other if i == 5 else cls.company,
+                access_granted=i % 2 == 0, timestamp=start + timezone.timedelta(minutes=i),
+                face_spoofing_result='genuine', speaker_similarity_score=0.8, audio_deepfake_result=1,
+                transcription_score=0.7, failure_reason=None if i % 2 == 0 else 'Voice mismatch'
+            )
+            for i in range(6)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get('/api/admin/access-logs/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_is_oldest_first(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        expected = AccessLog.objects.filter(company=self.company).order_by('timestamp', 'id')
+        self.assertEqual([int(row['id']) for row in rows], list(expected.values_list('id', flat=True)))
+        self.assertEqual((rows[1]['access_granted'], rows[1]['failure_reason']), ('False', 'Voice mismatch'))
+
+    def test_ndjson_export_resumes_after_cursor(self):
+        _, body = self.export(export_format='ndjson', access_status='true')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['access_granted'] for row in rows], [True, True, True])
+
+        _, rest = self.export(export_format='ndjson', access_status='true', cursor=rows[0]['cursor'])
+        self.assertEqual([json.loads(line)['id'] for line in rest.splitlines()], [row['id'] for row in rows[1:]])
+
+    def test_bad_requests_are_refused_before_streaming(self):
+        for params in ({'export_format': 'xml'}, {'cursor': 'not-a-cursor'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/admin/access-logs/export/', params).status_code, 400)
+        self.admin.is_admin = False
+        self.admin.save(update_fields=['is_admin'])
+        self.assertEqual(self.client.get('/api/admin/access-logs/export/').status_code, 403)
+
+    def export_command(self, output, crash_at=None, **options):
+        """Run export_access_logs in chunks of 2 rows, failing instead of saving checkpoint number crash_at"""
+        command = export_access_logs.Command()
+        save_checkpoint = command._save_checkpoint
+        saved = []
+
+        def checkpoint(*args):
+            saved.append(args)
+            if len(saved) == crash_at:
+                raise RuntimeError('worker killed')
+            save_checkpoint(*args)
+
+        with mock.patch.object(command, '_save_checkpoint', checkpoint):
+            call_command(command, company='Export Co', output=output, chunk_size=2, stdout=io.StringIO(), **options)
+
+    def test_command_resume_after_crash_writes_each_row_once(self):
+        logs = AccessLog.objects.filter(company=self.company).order_by('timestamp', 'id')
+        expected = list(logs.values_list('id', flat=True))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, export_format in (('logs.ndjson.gz', 'ndjson'), ('logs.csv', 'csv')):
+            with self.subTest(output=name):
+                output = os.path.join(directory.name, name)
+                with self.assertRaises(RuntimeError):
+                    self.export_command(output, crash_at=2, format=export_format)
+                self.export_command(output, format=export_format, resume=True)
+
+                opener = gzip.open if name.endswith('.gz') else open
+                with opener(output, 'rt', newline='') as exported:
+                    if export_format == 'csv':
+                        ids = [int(row['id']) for row in csv.DictReader(exported)]
+                    else:
+                        ids = [json.loads(line)['id'] for line in exported]
+                self.assertEqual(ids, expected)
+                with open(f'{output}.cursor') as checkpoint:
+                    cursor, offset = checkpoint.read().split()
+                self.assertEqual(decode_cursor(cursor)[1], expected[-1])
+                self.assertEqual(int(offset), os.path.getsize(output))
+
+
+# These tests check that the hourly and daily rollups follow the access logs as they commit (and not when the
+# write rolls back), that a rebuild from the raw logs gives the same buckets, and that the statistics endpoint
+# reads them.
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class AccessRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Rollup Co')
+        cls.admin = User.objects.create_user(
+            username='rollup_admin', email='rollup_admin@example.com', company=cls.company, is_admin=True
+        )
+        cls.room = Room.objects.create(
+            room_id='S1', name='Stats Room', company=cls.company,
+            group=RoomGroup.objects.create(name='Stats', company=cls.company)
+        )
+        cls.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timezone.timedelta(hours=2)
+
+    def log(self, minutes, granted, reason=None):
+        return AccessLog.objects.create(
+            user=self.admin, room=self.room, company=self.company, access_granted=granted,
+            timestamp=self.hour + timezone.timedelta(minutes=minutes), face_spoofing_result='genuine',
+            speaker_similarity_score=0.5, audio_deepfake_result=1, transcription_score=1.0, failure_reason=reason
+        )
+
+    def buckets(self):
+        return sorted(AccessLogRollup.objects.values_list(
+            'granularity', 'bucket_start', 'access_granted', 'failure_reason', 'count', 'speaker_similarity_sum'
+        ))
+
+    def test_rollups_follow_committed_logs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(5, True)
+            self.log(10, True)
+            self.log(70, False, 'Face mismatch')
+        with self.captureOnCommitCallbacks(execute=False):
+            self.log(15, True)  # its transaction never commits
+        AccessLog.objects.filter(timestamp=self.hour + timezone.timedelta(minutes=15)).delete()
+
+        hourly = [row for row in self.buckets() if row[0] == 'hour']
+        self.assertEqual(hourly, [
+            ('hour', self.hour, True, '', 2, 1.0),
+            ('hour', self.hour + timezone.timedelta(hours=1), False, 'Face mismatch', 1, 0.5),
+        ])
+        incremental = self.buckets()
+        self.assertEqual(rebuild_rollups(company=self.company), len(incremental))
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_statistics_read_the_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(5, True)
+            self.log(10, False, 'Voice mismatch')
+            self.log(70, False, 'Voice mismatch')
+        self.client.force_login(self.admin)
+        stats = self.client.get('/api/admin/access-stats/', {'granularity': 'hour'}).json()
+        self.assertEqual((stats['total'], stats['granted'], stats['denied']), (3, 1, 2))
+        self.assertEqual([(row['granted'], row['denied']) for row in stats['series']], [(1, 1), (0, 1)])
+        self.assertEqual(stats['failure_reasons'], [{'reason': 'Voice mismatch', 'count': 2}])
+        self.assertEqual(self.client.get('/api/admin/access-stats/', {'granularity': 'week'}).status_code, 400)
+
+
+# These tests move aged access logs into archive segments on a temporary archive root: segments never span a month
+# and are indexed before the rows are deleted in chunks, archived pages are read newest first without opening more
+# segments than the page needs, and rebuilding the rollups keeps the buckets of logs that are no longer in the table.
+class AccessLogArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Archive Co', access_log_retention_days=30)
+        cls.admin = User.objects.create_user(
+            username='archive_admin', email='archive_admin@example.com', company=cls.company, is_admin=True
+        )
+        cls.member = User.objects.create_user(
+            username='archive_member', email='archive_member@example.com', company=cls.company
+        )
+        cls.room = Room.objects.create(
+            room_id='A1', name='Archive Room', company=cls.company,
+            group=RoomGroup.objects.create(name='Archive', company=cls.company)
+        )
+        moments = [
+            timezone.make_aware(timezone.datetime(2026, month, day, 9))
+            for month, day in ((4, 10), (4, 11), (4, 12), (5, 5), (5, 6))
+        ] + [timezone.now() - timezone.timedelta(days=1)]
+        cls.logs = [
+            AccessLog.objects.create(
+                user=cls.member if index == 1 else cls.admin, room=cls.room, company=cls.company,
+                access_granted=True, timestamp=moment, face_spoofing_result='genuine',
+                speaker_similarity_score=0.5, audio_deepfake_result=1, transcription_score=1.0
+            )
+            for index, moment in enumerate(moments)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive_root = override_settings(ACCESS_LOG_ARCHIVE_ROOT=directory.name)
+        archive_root.enable()
+        self.addCleanup(archive_root.disable)
+
+    def ids(self, rows):
+        return [row['id'] for row in rows]
+
+    def test_segments_split_by_month_and_size(self):
+        self.assertEqual(archive.archive_company_logs(self.company, segment_rows=2), 5)
+        segments = list(AccessLogArchiveSegment.objects.order_by('first_log_id'))
+        self.assertEqual(
+            [(str(segment.month), segment.row_count) for segment in segments],
+            [('2026-04-01', 2), ('2026-04-01', 1), ('2026-05-01', 2)],
+        )
+        self.assertEqual((segments[0].first_log_id, segments[0].last_log_id), (self.logs[0].id, self.logs[1].id))
+        self.assertEqual(segments[2].end_timestamp, self.logs[4].timestamp)
+        self.assertEqual(self.ids(archive.iter_segment(segments[2])), [self.logs[3].id, self.logs[4].id])
+        with gzip.open(os.path.join(settings.ACCESS_LOG_ARCHIVE_ROOT, segments[0].path), 'rt') as gz_file:
+            self.assertEqual(json.loads(gz_file.readline())['username'], 'archive_admin')
+        self.assertEqual(list(AccessLog.objects.values_list('id', flat=True)), [self.logs[5].id])
+
+    def test_rows_are_deleted_in_chunks(self):
+        with mock.patch.object(archive, 'DELETE_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            archive.archive_company_logs(self.company, segment_rows=10)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE FROM "core_accesslog"')]
+        self.assertEqual(len(deletes), 3)  # April's 3 rows in two chunks, May's 2 in one
+        self.assertEqual(AccessLog.objects.count(), 1)
+
+    def test_archived_pages_newest_first(self):
+        archive.archive_company_logs(self.company, segment_rows=10)
+        with mock.patch.object(archive, 'iter_segment', wraps=archive.iter_segment) as opened:
+            rows, cursor = archive.archived_page(self.admin, {}, page_size=1)
+        self.assertEqual(self.ids(rows), [self.logs[4].id])
+        self.assertEqual(opened.call_count, 1)  # the May segment alone fills the page
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = archive.archived_page(self.admin, {}, cursor, page_size=2)
+            seen += self.ids(rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [log.id for log in reversed(self.logs[:5])])
+        self.assertEqual(rows[-1]['company_name'], 'Archive Co')
+        self.assertNotIn('user_id', rows[-1])
+
+        rows, _ = archive.archived_page(self.member, {}, page_size=10)
+        self.assertEqual(self.ids(rows), [self.logs[1].id])
+        rows, _ = archive.archived_page(self.admin, {'start_date': '2026-04-11', 'end_date': '2026-05-05T12:00:00'})
+        self.assertEqual(self.ids(rows), [self.logs[3].id, self.logs[2].id, self.logs[1].id])
+
+    def test_rebuild_keeps_archived_rollups(self):
+        rebuild_rollups(company=self.company)
+        before = sorted(AccessLogRollup.objects.values_list('granularity', 'bucket_start', 'user_id', 'count'))
+        archive.archive_company_logs(self.company)
+        rebuild_rollups(company=self.company)
+        rebuild_rollups()
+        after = sorted(AccessLogRollup.objects.values_list('granularity', 'bucket_start', 'user_id', 'count'))
+        self.assertEqual(after, before)
+
+    def test_archive_command(self):
+        out = io.StringIO()
+        call_command('archive_access_logs', company='Archive Co', segment_rows=10, stdout=out)
+        self.assertIn('Archived 5 access logs for Archive Co (retention 30 days)', out.getvalue())
+        self.assertEqual(AccessLogArchiveSegment.objects.count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('archive_access_logs', company='Nobody', stdout=out)
+
+
+# These tests run a private AccessLogWriter on a temporary spill directory without its background flusher:
+# queued entries are spilled before they are inserted, a full batch is inserted and counted in the rollups, a spill
+# file left by a dead worker is replayed, and a worker that gets the pid of a crashed one loses none of its entries.
+@override_settings(ACCESS_LOG_BUFFERED=True, ACCESS_LOG_BATCH_SIZE=3, ACCESS_LOG_SPILL_FSYNC=False)
+class AccessLogWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Writer Co')
+        cls.user = User.objects.create_user(username='writer', email='writer@example.com', company=cls.company)
+        cls.room = Room.objects.create(
+            room_id='W1', name='Writer Room', company=cls.company,
+            group=RoomGroup.objects.create(name='Writer', company=cls.company)
+        )
+
+    def setUp(self):
+        spill_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spill_dir.cleanup)
+        overrides = override_settings(ACCESS_LOG_SPILL_DIR=spill_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.spill_dir = spill_dir.name
+
+    def writer(self):
+        writer = log_writer.AccessLogWriter()
+        writer._flusher = mock.Mock()  # flushed by hand
+        return writer
+
+    def fields(self, reason):
+        return dict(
+            user_id=self.user.id, room_id=self.room.id, company_id=self.company.id, access_granted=False,
+            face_spoofing_result='genuine', speaker_similarity_score=0.4, audio_deepfake_result=1,
+            transcription_score=0.5, failure_reason=reason
+        )
+
+    def orphan(self, name, reasons):
+        path = os.path.join(self.spill_dir, name)
+        with open(path, 'w') as spill_file:
+            for reason in reasons:
+                entry = log_writer.AccessLogWriter._to_entry(AccessLog(timestamp=timezone.now(), **self.fields(reason)))
+                spill_file.write(json.dumps(entry) + '\n')
+        return path
+
+    def spilled(self):
+        lines = []
+        for name in os.listdir(self.spill_dir):
+            with open(os.path.join(self.spill_dir, name)) as spill_file:
+                lines += [json.loads(line)['failure_reason'] for line in spill_file]
+        return sorted(lines)
+
+    def test_entries_are_spilled_then_inserted_in_batches(self):
+        writer = self.writer()
+        self.assertIsNone(writer.write(**self.fields('first')))
+        writer.write(**self.fields('second'))
+        self.assertEqual(self.spilled(), ['first', 'second'])
+        self.assertFalse(AccessLog.objects.exists())
+
+        writer.write(**self.fields('third'))  # fills the batch
+        reasons = sorted(AccessLog.objects.values_list('failure_reason', flat=True))
+        self.assertEqual(reasons, ['first', 'second', 'third'])
+        self.assertEqual(AccessLogRollup.objects.filter(granularity='hour').aggregate(Sum('count'))['count__sum'], 3)
+        self.assertEqual(self.spilled(), [])
+
+    def test_orphaned_spill_file_is_replayed(self):
+        path = self.orphan('access_logs.4242.0ld0ld00.ndjson', ['lost', 'found'])
+        with mock.patch.object(log_writer, '_process_alive', return_value=False):
+            self.assertEqual(self.writer().recover(), 2)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(sorted(AccessLog.objects.values_list('failure_reason', flat=True)), ['found', 'lost'])
+
+    def test_reused_pid_does_not_lose_entries(self):
+        # Left by a crashed worker with this process's pid (under the name spill files had before the suffix)
+        self.orphan(f'access_logs.{os.getpid()}.ndjson', ['crashed'])
+        writer = self.writer()
+        for reason in ('new-1', 'new-2', 'new-3'):
+            writer.write(**self.fields(reason))
+        # The flush inserted and removed only this writer's entries; the crashed worker's file is still there
+        self.assertEqual(self.spilled(), ['crashed'])
+        self.assertEqual(writer.recover(), 1)
+        self.assertEqual(
+            sorted(AccessLog.objects.values_list('failure_reason', flat=True)), ['crashed', 'new-1', 'new-2', 'new-3']
+        )
+
+
+# These tests follow EffectiveRoomAccess through the signal handlers: granting and revoking a room group, editing
+# a membership, creating a room in a group and moving it to another, and lock state saves that must not touch it.
+# After every step the table must equal a rebuild from the memberships.
+class EffectiveAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Effective Co')
+        cls.user = User.objects.create_user(username='effective', email='effective@example.com', company=cls.company)
+        cls.lab = RoomGroup.objects.create(name='Lab', company=cls.company)
+        cls.office = RoomGroup.objects.create(name='Office', company=cls.company)
+        cls.lab_room = Room.objects.create(room_id='EF1', name='Lab room', group=cls.lab, company=cls.company)
+        cls.office_room = Room.objects.create(room_id='EF2', name='Office room', group=cls.office, company=cls.company)
+
+    def assertRooms(self, rooms):
+        current = set(EffectiveRoomAccess.objects.values_list('user', 'room'))
+        self.assertEqual(current, {(self.user.id, room.id) for room in rooms})
+        effective_access.rebuild_all()
+        self.assertEqual(set(EffectiveRoomAccess.objects.values_list('user', 'room')), current)
+
+    def test_memberships_grant_and_revoke(self):
+        membership = UserRoomGroup.objects.create(user=self.user, room_group=self.lab)
+        self.assertRooms([self.lab_room])
+        membership.room_group = self.office
+        membership.save()
+        self.assertRooms([self.office_room])
+        membership.delete()
+        self.assertRooms([])
+
+    def test_rooms_created_and_moved(self):
+        UserRoomGroup.objects.create(user=self.user, room_group=self.lab)
+        new_room = Room.objects.create(room_id='EF3', name='New lab room', group=self.lab, company=self.company)
+        self.assertRooms([self.lab_room, new_room])
+        new_room.group = self.office
+        new_room.save()
+        self.assertRooms([self.lab_room])
+        self.office_room.group = self.lab
+        self.office_room.save()
+        self.assertRooms([self.lab_room, self.office_room])
+
+    def test_lock_state_saves_leave_access_alone(self):
+        UserRoomGroup.objects.create(user=self.user, room_group=self.lab)
+        room = Room.objects.get(pk=self.lab_room.pk)
+        room.is_unlocked = True
+        with CaptureQueriesContext(connection) as queries:
+            room.save(update_fields=['is_unlocked'])
+        self.assertFalse([query for query in queries if 'effectiveroomaccess' in query['sql'].lower()])
+        self.assertRooms([self.lab_room])
+
+
+# These tests pin the number of queries every list endpoint issues. Each endpoint is called with 1, 100 and 1000
+# rows and must stay within the same fixed budget, so a serializer field that starts loading a relation per row
+# (an N+1) fails here instead of in production. Every budget includes the 2 queries that load the logged in user
+# and their company; the session itself comes from the cache and is not written back when it did not change.
+# Reads are kept on the primary, since a configured replica is a second connection outside the test transaction.
+# The response cache is off here: rows are added with bulk_create, which sends no invalidating signals.
+@override_settings(
+    ACCESS_LOG_BUFFERED=False,
+    REPLICA_DATABASE=None,
+    RESPONSE_CACHE_TIMEOUT=0,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class QueryCountBudgetTests(TestCase):
+    ROW_COUNTS = (1, 100, 1000)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Budget Co')
+        cls.admin = User.objects.create_user(
+            username='budget_admin', email='admin@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        cls.member = User.objects.create_user(
+            username='budget_member', email='member@example.com', password='pw', company=cls.company
+        )
+
+    def assertQueryBudget(self, url, budget, populate, params=None):
+        """Grow the data set through ROW_COUNTS and check the query count of every call against the budget"""
+        created = 0
+        for count in self.ROW_COUNTS:
+            populate(created, count)
+            created = count
+            with self.subTest(rows=count), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params or {})
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f'{url} issued {len(queries)} queries for {count} rows:\n'
+                    + '\n'.join(query['sql'] for query in queries.captured_queries)
+                )
+        return response
+
+    def make_groups(self, start, stop):
+        return RoomGroup.objects.bulk_create([
+            RoomGroup(name=f'Group {i}', company=self.company) for i in range(start, stop)
+        ])
+
+    def make_rooms(self, start, stop):
+        group = RoomGroup.objects.get_or_create(name='Rooms', company=self.company)[0]
+        return Room.objects.bulk_create([
+            Room(room_id=f'R{i}', name=f'Room {i}', group=group, company=self.company) for i in range(start, stop)
+        ])
+
+    def make_users(self, start, stop, **fields):
+        return User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com', password='!', company=self.company, **fields)
+            for i in range(start, stop)
+        ])
+
+    def test_rooms(self):
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget('/api/manage/rooms/', 3, self.make_rooms)
+        self.assertEqual(len(response.json()), 1000)
+
+    def test_room_groups(self):
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget('/api/manage/room-groups/', 3, self.make_groups)
+        self.assertEqual(len(response.json()), 1000)
+
+    def test_invite_tokens(self):
+        def populate(start, stop):
+            InviteToken.objects.bulk_create([
+                InviteToken(
+                    token=f'token-{i}', email=f'invite{i}@example.com', company=self.company,
+                    created_by=self.admin, expires_at=timezone.now() + timezone.timedelta(days=7)
+                )
+                for i in range(start, stop)
+            ])
+
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget('/api/manage/invite-tokens/', 3, populate)
+        self.assertEqual(len(response.json()), 1000)
+
+    def test_users(self):
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget('/api/admin/users/', 3, self.make_users)
+        self.assertEqual(len(response.json()), 1002)
+
+    def test_frozen_accounts(self):
+        def populate(start, stop):
+            self.make_users(start, stop, is_frozen=True, frozen_at=timezone.now())
+
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget('/api/admin/frozen-accounts/', 3, populate)
+        self.assertEqual(len(response.json()), 1000)
+
+    def test_user_permissions(self):
+        def populate(start, stop):
+            UserRoomGroup.objects.bulk_create([
+                UserRoomGroup(user=self.member, room_group=group) for group in self.make_groups(start, stop)
+            ])
+
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget(f'/api/admin/user-permissions/{self.member.username}/', 4, populate)
+        self.assertEqual(len(response.json()['group_names']), 1000)
+
+    def test_access_logs(self):
+        room = self.make_rooms(0, 1)[0]
+
+        def populate(start, stop):
+            AccessLog.objects.bulk_create([
+                AccessLog(
+                    user=self.member, room=room, company=self.company, access_granted=True,
+                    face_spoofing_result='genuine', speaker_similarity_score=0.9,
+                    audio_deepfake_result=1, transcription_score=0.9
+                )
+                for _ in range(start, stop)
+            ])
+
+        self.client.force_login(self.admin)
+        response = self.assertQueryBudget('/api/admin/access-logs/', 3, populate, {'page_size': 1000})
+        self.assertEqual(len(response.json()), 1000)
+
+    def test_user_rooms(self):
+        def populate(start, stop):
+            rooms = self.make_rooms(start, stop)
+            membership, _ = UserRoomGroup.objects.get_or_create(user=self.member, room_group=rooms[0].group)
+            # bulk_create skips the signals that maintain effective access
+            grant_groups([(self.member.id, membership.room_group_id)])
+
+        self.client.force_login(self.member)
+        response = self.assertQueryBudget('/api/user/rooms/', 3, populate)
+        self.assertEqual(len(response.json()), 1000)
+
+
+# These tests page through the access logs with the cursor in X-Next-Cursor: every log is returned exactly once,
+# newest first, even when logs are written between pages, and a cursor that cannot be decoded is a 400.
+@override_settings(REPLICA_DATABASE=None, RESPONSE_CACHE_TIMEOUT=0, ACCESS_LOG_PAGE_SIZE=10, ACCESS_LOG_MAX_PAGE_SIZE=20)
+class AccessLogPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Paging Co')
+        cls.admin = User.objects.create_user(
+            username='paging_admin', email='paging@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        group = RoomGroup.objects.create(name='Lab', company=cls.company)
+        cls.room = Room.objects.create(room_id='P1', name='Room 1', group=group, company=cls.company)
+        # Pairs of logs share a timestamp, so the id has to break the tie
+        start = timezone.now()
+        logs = AccessLog.objects.bulk_create([cls.log() for _ in range(24)])
+        for i, log in enumerate(logs):
+            log.timestamp = start - timezone.timedelta(minutes=i // 2)
+        AccessLog.objects.bulk_update(logs, ['timestamp'])
+
+    @classmethod
+    def log(cls):
+        return AccessLog(
+            user=cls.admin, room=cls.room, company=cls.company, access_granted=True,
+            face_spoofing_result='genuine', speaker_similarity_score=0.9, audio_deepfake_result=1,
+            transcription_score=0.9
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages_cover_every_log_once_in_order(self):
+        expected = list(AccessLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        ids, params, pages = [], {}, 0
+        while True:
+            response = self.client.get('/api/admin/access-logs/', params)
+            self.assertEqual(response.status_code, 200)
+            ids += [log['id'] for log in response.json()]
+            pages += 1
+            if pages == 1:
+                # Logs written while the client pages belong before the first page and never shift the others
+                self.log().save()
+            if 'X-Next-Cursor' not in response:
+                break
+            self.assertIn('cursor=', response['Link'])
+            params = {'cursor': response['X-Next-Cursor']}
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, expected)
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.client.get('/api/admin/access-logs/', {'page_size': 1000}).json()), 20)
+        self.assertEqual(len(self.client.get('/api/admin/access-logs/', {'page_size': 'x'}).json()), 10)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/admin/access-logs/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+
+# These tests cover the read/write split: which alias the router picks inside and outside use_replica views,
+# and the cookie that pins a client to the primary after it writes.
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+        @use_replica
+        def read_view(request):
+            return HttpResponse(self.router.db_for_read(Room) or 'default')
+
+        self.read_view = read_view
+
+    def test_reads_outside_replica_views_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(Room))
+
+    def test_replica_view_reads_from_replica(self):
+        response = self.read_view(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica')
+        # The routing does not leak past the view
+        self.assertIsNone(self.router.db_for_read(Room))
+
+    def test_pinned_client_reads_from_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES['primary_pin'] = '1'
+        self.assertEqual(self.read_view(request).content, b'default')
+
+    def test_sessions_stay_on_primary(self):
+        @use_replica
+        def session_view(request):
+            return HttpResponse(self.router.db_for_read(Session) or 'default')
+
+        self.assertEqual(session_view(self.factory.get('/')).content, b'default')
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Room), 'default')
+
+    def test_replica_is_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+    def test_write_pins_client(self):
+        def writing_view(request):
+            self.router.db_for_write(Room)
+            return HttpResponse()
+
+        response = PrimaryPinningMiddleware(writing_view)(self.factory.post('/'))
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 10)
+
+    def test_read_and_session_save_do_not_pin(self):
+        def reading_view(request):
+            self.router.db_for_read(Room)
+            self.router.db_for_write(Session)
+            return HttpResponse()
+
+        response = PrimaryPinningMiddleware(reading_view)(self.factory.get('/'))
+        self.assertNotIn('primary_pin', response.cookies)
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_without_replica_nothing_is_routed(self):
+        self.assertEqual(self.read_view(self.factory.get('/')).content, b'default')
+
+
+# These tests open their own connections to a SQLite file in a temporary directory, since the in-memory test database
+# cannot switch to WAL: every new connection gets the SQLITE_TUNING pragmas, transactions take the write lock as soon
+# as they begin, and sqlite_maintenance checkpoints the WAL file and runs PRAGMA optimize.
+class SQLiteTuningTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tuning.sqlite3')
+
+    def open(self, alias):
+        database = DatabaseWrapper({**connection.settings_dict, 'NAME': self.path}, alias)
+        self.addCleanup(database.close)
+        database.ensure_connection()
+        return database
+
+    def pragma(self, database, name):
+        with database.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_are_tuned(self):
+        database = self.open('tuning')
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(database, 'busy_timeout'), settings.SQLITE_TUNING['busy_timeout'])
+        self.assertEqual(self.pragma(database, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(database, 'temp_store'), 2)  # MEMORY
+
+    def test_transactions_begin_immediate(self):
+        writer = self.open('tuning')
+        self.assertEqual(writer.transaction_mode, 'IMMEDIATE')
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE door (opened INTEGER)')
+        other = self.open('other')
+        with other.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout = 50')
+
+        connections['tuning'] = writer
+        self.addCleanup(connections.__delitem__, 'tuning')
+        with transaction.atomic(using='tuning'):
+            # Nothing has been written yet, but the transaction already holds the write lock
+            with self.assertRaisesMessage(OperationalError, 'database is locked'), other.cursor() as cursor:
+                cursor.execute('INSERT INTO door VALUES (1)')
+        with other.cursor() as cursor:
+            cursor.execute('INSERT INTO door VALUES (1)')
+
+    def test_maintenance_command(self):
+        database = self.open('tuning')
+        with database.cursor() as cursor:
+            cursor.execute('CREATE TABLE door (opened INTEGER)')
+            cursor.executemany('INSERT INTO door VALUES (%s)', [(index,) for index in range(100)])
+        self.assertGreater(os.path.getsize(f'{self.path}-wal'), 0)
+
+        out = io.StringIO()
+        database.force_debug_cursor = True
+        with mock.patch('core.management.commands.sqlite_maintenance.connection', database):
+            call_command('sqlite_maintenance', stdout=out)
+        statements = [query['sql'] for query in database.queries]
+        self.assertIn('PRAGMA wal_checkpoint(TRUNCATE)', statements)
+        self.assertIn('PRAGMA optimize', statements)
+        self.assertIn('Checkpointed', out.getvalue())
+        self.assertEqual(os.path.getsize(f'{self.path}-wal'), 0)
+
+
+# These tests check that repeat fetches of the cached admin endpoints are served from the cache and that a change
+# made through the models shows up on the next fetch. Version bumps run when the change commits, so writes are
+# wrapped in captureOnCommitCallbacks.
+@override_settings(
+    REPLICA_DATABASE=None,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'response-cache'}},
+)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Cache Co')
+        cls.admin = User.objects.create_user(
+            username='cache_admin', email='cache@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        cls.group = RoomGroup.objects.create(name='Lab', company=cls.company)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def fetch(self, url, expected_cache):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], expected_cache)
+        return response.json()
+
+    def test_repeat_fetch_is_cached(self):
+        self.fetch('/api/admin/users/', 'miss')
+        self.assertEqual(len(self.fetch('/api/admin/users/', 'hit')), 1)
+
+    def test_changes_invalidate(self):
+        self.fetch('/api/admin/users/', 'miss')
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='new', email='new@example.com', password='pw', company=self.company)
+        self.assertEqual(len(self.fetch('/api/admin/users/', 'miss')), 2)
+
+        self.fetch('/api/admin/user-permissions/new/', 'miss')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/admin/user-permissions/', {
+                'username': 'new', 'group_name': 'Lab', 'action': 'grant'
+            }, content_type='application/json')
+        self.assertEqual(self.fetch('/api/admin/user-permissions/new/', 'miss')['group_names'], ['Lab'])
+
+    def test_lockout_invalidates_frozen_accounts(self):
+        self.assertEqual(self.fetch('/api/admin/frozen-accounts/', 'miss'), [])
+        member = User.objects.create_user(username='member', email='m@example.com', password='pw', company=self.company)
+        with self.captureOnCommitCallbacks(execute=True):
+            lockout.freeze(member, 5)
+        self.assertEqual(len(self.fetch('/api/admin/frozen-accounts/', 'miss')), 1)
+
+    def test_scopes_are_independent(self):
+        self.fetch('/api/admin/users/', 'miss')
+        self.fetch('/api/manage/rooms/', 'miss')
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(room_id='R1', name='Room 1', group=self.group, company=self.company)
+        self.fetch('/api/admin/users/', 'hit')
+        self.assertEqual(len(self.fetch('/api/manage/rooms/', 'miss')), 1)
+
+    def test_companies_are_separate(self):
+        other = Company.objects.create(name='Other Co')
+        other_admin = User.objects.create_user(
+            username='other_admin', email='other@example.com', password='pw', company=other, is_admin=True
+        )
+        self.fetch('/api/admin/company/', 'miss')
+        self.client.force_login(other_admin)
+        self.assertEqual(self.fetch('/api/admin/company/', 'miss')['name'], 'Other Co')
+
+
+# These tests call the bulk provisioning endpoints: permission matrices are granted and revoked (with effective
+# access following), rooms and groups are created, moved and deleted in one request, the rooms a deleted group
+# takes with it show up in the diff, and malformed entries or unknown names are a 400 that changes nothing.
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ProvisioningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Provision Co')
+        cls.admin = User.objects.create_user(
+            username='prov_admin', email='prov_admin@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        cls.users = [
+            User.objects.create_user(username=f'prov{i}', email=f'prov{i}@example.com', password='pw', company=cls.company)
+            for i in range(2)
+        ]
+        cls.lab = RoomGroup.objects.create(name='Lab', company=cls.company)
+        cls.office = RoomGroup.objects.create(name='Office', company=cls.company)
+        Room.objects.create(room_id='L1', name='Lab 1', group=cls.lab, company=cls.company)
+        Room.objects.create(room_id='L2', name='Lab 2', group=cls.lab, company=cls.company)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post(self, url, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        return self.client.post(url, data, **kwargs)
+
+    def test_permission_matrix_is_granted_and_revoked(self):
+        grant = {'grant': [{'usernames': ['prov0', 'prov1'], 'groups': ['Lab', 'Office']}]}
+        preview = self.post('/api/admin/user-permissions/bulk/', {**grant, 'dry_run': True}).json()
+        self.assertEqual((preview['dry_run'], len(preview['granted'])), (True, 4))
+        self.assertFalse(UserRoomGroup.objects.exists())
+
+        self.assertEqual(len(self.post('/api/admin/user-permissions/bulk/', grant).json()['granted']), 4)
+        self.assertEqual(EffectiveRoomAccess.objects.filter(user=self.users[0]).count(), 2)
+        diff = self.post('/api/admin/user-permissions/bulk/', {
+            'grant': [{'usernames': ['prov0'], 'groups': ['Lab']}],
+            'revoke': [{'usernames': ['prov1'], 'groups': ['Lab']}],
+        }).json()
+        self.assertEqual((diff['granted'], diff['revoked'], diff['unchanged']),
+                         ([], [{'username': 'prov1', 'group': 'Lab'}], 1))
+        self.assertFalse(EffectiveRoomAccess.objects.filter(user=self.users[1]).exists())
+
+    def test_dry_run_false_as_text_applies_the_changes(self):
+        response = self.post('/api/admin/rooms/bulk/', {'delete_rooms': ['L2'], 'dry_run': 'false'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['dry_run'], False)
+        self.assertFalse(Room.objects.filter(room_id='L2').exists())
+
+    def test_rooms_and_groups_are_created_moved_and_deleted(self):
+        diff = self.post('/api/admin/rooms/bulk/', {
+            'groups': [{'name': 'Annex', 'description': 'New wing'}],
+            'rooms': [{'room_id': 'A1', 'name': 'Annex 1', 'group': 'Annex'}, {'room_id': 'L1', 'group': 'Office'}],
+            'delete_groups': ['Lab'],
+        }).json()
+        self.assertEqual(diff['groups'], {'created': ['Annex'], 'updated': [], 'deleted': ['Lab']})
+        # L2 goes with its group; L1 was moved out first
+        self.assertEqual(diff['rooms'], {'created': ['A1'], 'updated': ['L1'], 'deleted': ['L2']})
+        self.assertEqual(
+            sorted(Room.objects.filter(company=self.company).values_list('room_id', 'group__name')),
+            [('A1', 'Annex'), ('L1', 'Office')]
+        )
+
+    def test_invalid_entries_are_rejected(self):
+        cases = (
+            ({'rooms': [{'room_id': 'X1', 'group': ['Lab']}]}, {'rooms': ['Must be text: group']}),
+            ({'rooms': [{'room_id': 'X1'}]}, {'rooms': ['X1']}),
+            ({'rooms': [{'room_id': 'X1', 'group': 'Attic'}]}, {'groups': ['Attic']}),
+            ({'rooms': [{'room_id': 'L1', 'name': 'Kept'}], 'delete_groups': ['Lab']}, {'rooms': ['L1']}),
+        )
+        for data, errors in cases:
+            with self.subTest(data=data):
+                response = self.post('/api/admin/rooms/bulk/', data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['errors'], errors)
+        response = self.post('/api/admin/user-permissions/bulk/', {'grant': [{'usernames': ['ghost'], 'groups': ['Lab']}]})
+        self.assertEqual(response.json()['errors'], {'usernames': ['ghost']})
+        self.assertEqual(Room.objects.filter(company=self.company).count(), 2)
+
+
+# These tests follow a client through delta syncs: each sync returns only what changed since the revision the
+# client sent, deletions come back as tombstones, and a client older than the purged tombstones is told to reset.
+@override_settings(
+    REPLICA_DATABASE=None,
+    RESPONSE_CACHE_TIMEOUT=0,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class DeltaSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Sync Co')
+        cls.admin = User.objects.create_user(
+            username='sync_admin', email='sync@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        cls.member = User.objects.create_user(
+            username='sync_member', email='member@example.com', password='pw', company=cls.company
+        )
+        cls.group = RoomGroup.objects.create(name='Lab', company=cls.company)
+        cls.room = Room.objects.create(room_id='R1', name='Room 1', group=cls.group, company=cls.company)
+
+    def sync(self, since=0):
+        response = self.client.get('/api/sync/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_then_delta(self):
+        self.client.force_login(self.admin)
+        full = self.sync()
+        self.assertEqual(len(full['users']), 2)
+        self.assertEqual(len(full['rooms']), 1)
+        self.assertEqual(self.sync(full['revision'])['users'], [])
+
+        self.room.name = 'Renamed'
+        self.room.save()
+        delta = self.sync(full['revision'])
+        self.assertEqual([room['name'] for room in delta['rooms']], ['Renamed'])
+        self.assertEqual(delta['users'], [])
+        self.assertGreater(delta['revision'], full['revision'])
+
+    def test_lock_changes_are_not_stamped(self):
+        self.client.force_login(self.admin)
+        since = self.sync()['revision']
+        self.room.is_unlocked = True
+        self.room.unlock_timestamp = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            self.room.save(update_fields=['is_unlocked', 'unlock_timestamp'])
+        self.assertEqual(len(queries), 1, [query['sql'] for query in queries.captured_queries])
+        delta = self.sync(since)
+        self.assertEqual((delta['revision'], delta['rooms']), (since, []))
+        self.assertNotIn('is_unlocked', self.sync()['rooms'][0])
+
+    def test_revision_is_taken_in_the_saving_transaction(self):
+        revision = Company.objects.get(pk=self.company.pk).revision
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Room.objects.create(room_id='R1', name='Duplicate', group=self.group, company=self.company)
+        self.assertEqual(Company.objects.get(pk=self.company.pk).revision, revision)
+
+        self.room.name = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            self.room.save(update_fields=['name'])
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertTrue(sql[0].startswith('SAVEPOINT') and sql[-1].startswith('RELEASE SAVEPOINT'), sql)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.revision, revision + 1)
+        self.assertEqual(Company.objects.get(pk=self.company.pk).revision, revision + 1)
+
+    def test_deletes_leave_tombstones(self):
+        self.client.force_login(self.admin)
+        since = self.sync()['revision']
+        other = RoomGroup.objects.create(name='Other', company=self.company)
+        membership = UserRoomGroup.objects.create(user=self.member, room_group=other)
+        group_id = other.pk
+        other.delete()
+        delta = self.sync(since)
+        self.assertEqual(delta['deleted']['room_groups'], [group_id])
+        self.assertEqual(delta['deleted']['permissions'], [membership.pk])
+
+    def test_bulk_provisioning_is_tracked(self):
+        self.client.force_login(self.admin)
+        since = self.sync()['revision']
+        apply_permissions(self.company, grant=[{'usernames': ['sync_member'], 'groups': ['Lab']}])
+        apply_rooms(self.company, rooms=[{'room_id': 'R2', 'group': 'Lab'}])
+        delta = self.sync(since)
+        self.assertEqual([p['username'] for p in delta['permissions']], ['sync_member'])
+        self.assertEqual([room['room_id'] for room in delta['rooms']], ['R2'])
+
+        since = delta['revision']
+        apply_permissions(self.company, revoke=[{'usernames': ['sync_member'], 'groups': ['Lab']}])
+        apply_rooms(self.company, delete_rooms=['R2'])
+        deleted = self.sync(since)['deleted']
+        self.assertEqual(len(deleted['permissions']), 1)
+        self.assertEqual(len(deleted['rooms']), 1)
+
+    def test_member_sees_rooms_gained_through_permissions(self):
+        self.client.force_login(self.member)
+        first = self.sync()
+        self.assertEqual((first['rooms'], first['room_ids']), ([], []))
+        UserRoomGroup.objects.create(user=self.member, room_group=self.group)
+        delta = self.sync(first['revision'])
+        self.assertEqual([room['id'] for room in delta['rooms']], [self.room.pk])
+        self.assertEqual(delta['room_ids'], [self.room.pk])
+
+    def test_purged_tombstones_force_reset(self):
+        self.client.force_login(self.admin)
+        since = self.sync()['revision']
+        Room.objects.create(room_id='R3', name='Room 3', group=self.group, company=self.company).delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - timezone.timedelta(days=31))
+        self.assertEqual(purge_tombstones(30), 1)
+        self.assertTrue(self.sync(since)['reset'])
+
+
+# These tests keep the values() fast path of the large lists byte for byte identical to the serializers it replaces,
+# and check that list responses are compressed only when the client accepts it and the body is large enough.
+@override_settings(REPLICA_DATABASE=None, RESPONSE_CACHE_TIMEOUT=0, RESPONSE_COMPRESSION_MIN_SIZE=1024)
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Values Co')
+        cls.admin = User.objects.create_user(
+            username='values_admin', email='values@example.com', password='pw', company=cls.company, is_admin=True,
+            full_name='Values Admin \u2028', phone_number='+15550100'
+        )
+        User.objects.create_user(
+            username='values_frozen', email='frozen@example.com', password='pw', company=cls.company,
+            is_frozen=True, frozen_at=timezone.now()
+        )
+        group = RoomGroup.objects.create(name='Lab', company=cls.company)
+        room = Room.objects.create(room_id='R1', name='Room 1', group=group, company=cls.company)
+        AccessLog.objects.bulk_create([
+            AccessLog(
+                user=cls.admin, room=room, company=cls.company, access_granted=bool(i % 2),
+                face_spoofing_result='genuine', speaker_similarity_score=0.5 + i / 100, audio_deepfake_result=1,
+                transcription_score=0.75, failure_reason=None if i % 2 else 'Face mismatch'
+            )
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertSameJSON(self, values, serializer, queryset):
+        fast = FastJSONRenderer().render(values.to_representation(values.values(queryset)))
+        self.assertEqual(fast, JSONRenderer().render(serializer(queryset, many=True).data))
+
+    def test_users_match_serializer(self):
+        self.assertSameJSON(USER_VALUES, UserSerializer, User.objects.filter(company=self.company).order_by('id'))
+
+    def test_access_logs_match_serializer(self):
+        logs = AccessLog.objects.filter(company=self.company).order_by('-timestamp', '-id')
+        self.assertSameJSON(ACCESS_LOG_VALUES, AccessLogSerializer, logs)
+
+    def test_access_log_pages_follow_cursor(self):
+        first = self.client.get('/api/admin/access-logs/', {'page_size': 20})
+        second = self.client.get('/api/admin/access-logs/', {'page_size': 20, 'cursor': first['X-Next-Cursor']})
+        ids = [log['id'] for log in first.json() + second.json()]
+        self.assertEqual(ids, list(AccessLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True)))
+
+    def test_large_responses_are_compressed(self):
+        plain = self.client.get('/api/admin/access-logs/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('/api/admin/access-logs/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        refused = self.client.get('/api/admin/access-logs/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(refused.has_header('Content-Encoding'))
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/admin/company/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_missing_speedups_are_reported(self):
+        with mock.patch.object(renderers, 'orjson', None), mock.patch.object(compression, 'brotli', None):
+            self.assertEqual([w.id for w in checks.check_optional_speedups(None)], ['core.W002', 'core.W003'])
+            # The fallbacks still produce the same JSON and gzip
+            self.assertSameJSON(USER_VALUES, UserSerializer, User.objects.filter(company=self.company).order_by('id'))
+            response = self.client.get('/api/admin/access-logs/', HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+        with mock.patch.object(renderers, 'orjson', object()), mock.patch.object(compression, 'brotli', object()):
+            self.assertEqual(checks.check_optional_speedups(None), [])
+
+
+# These tests check ?fields= and ?expand= on the list endpoints: only the requested keys come back, and the list
+# query joins only the relations those keys read.
+@override_settings(REPLICA_DATABASE=None, RESPONSE_CACHE_TIMEOUT=0)
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Sparse Co')
+        cls.admin = User.objects.create_user(
+            username='sparse_admin', email='sparse@example.com', password='pw', company=cls.company, is_admin=True
+        )
+        cls.group = RoomGroup.objects.create(name='Lab', company=cls.company)
+        cls.room = Room.objects.create(room_id='R1', name='Room 1', group=cls.group, company=cls.company)
+        AccessLog.objects.create(
+            user=cls.admin, room=cls.room, company=cls.company, access_granted=True, face_spoofing_result='genuine',
+            speaker_similarity_score=0.9, audio_deepfake_result=1, transcription_score=0.9
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def fetch(self, url, params, table):
+        """GET url and return the JSON body and the SQL of the last query that read from table"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        sql = [query['sql'] for query in queries.captured_queries if f'FROM "{table}"' in query['sql']]
+        return response.json(), sql[-1]
+
+    def test_access_log_fields(self):
+        data, sql = self.fetch('/api/admin/access-logs/', {'fields': 'username,access_granted'}, 'core_accesslog')
+        self.assertEqual(data, [{'username': 'sparse_admin', 'access_granted': True}])
+        self.assertNotIn('core_company', sql)
+        self.assertNotIn('core_room', sql)
+        self.assertNotIn('speaker_similarity_score', sql)
+
+    def test_access_log_expand(self):
+        data, sql = self.fetch(
+            '/api/admin/access-logs/', {'fields': 'access_granted,room.name', 'expand': 'room'}, 'core_accesslog'
+        )
+        self.assertEqual(data, [{'access_granted': True, 'room': {'name': 'Room 1'}}])
+        self.assertIn('core_room', sql)
+        self.assertNotIn('core_company', sql)
+        self.assertNotIn('core_user', sql)
+
+    def test_users_expand_company(self):
+        data, _ = self.fetch('/api/admin/users/', {'fields': 'username', 'expand': 'company'}, 'core_user')
+        self.assertEqual(data[0]['company']['name'], 'Sparse Co')
+        self.assertEqual(set(data[0]), {'username', 'company'})
+
+    def test_viewset_fields(self):
+        data, sql = self.fetch(
+            '/api/manage/rooms/', {'fields': 'room_id,group.name', 'expand': 'group'}, 'core_room'
+        )
+        self.assertEqual(data, [{'room_id': 'R1', 'group': {'name': 'Lab'}}])
+        self.assertNotIn('core_company', sql)
+
+    def test_unknown_names_are_rejected(self):
+        for url, params in (
+            ('/api/admin/access-logs/', {'fields': 'password'}),
+            ('/api/admin/access-logs/', {'expand': 'door'}),
+            ('/api/admin/users/', {'fields': 'company.name'}),
+            ('/api/manage/rooms/', {'fields': 'group.name'}),
+        ):
+            with self.subTest(url=url, **params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+# These tests drive the failed-attempt lockout on a fake clock: failures decay out of the sliding window, the
+# account is frozen once on reaching LOCKOUT_MAX_FAILURES, and a frozen account is released after the cool-down.
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'lockout'}},
+    LOCKOUT_MAX_FAILURES=3, LOCKOUT_WINDOW=100, LOCKOUT_COOLDOWN=None,
+)
+class LockoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Lockout Co')
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='locked', email='locked@example.com', password='pw', company=self.company
+        )
+        self.request = RequestFactory().post('/api/auth/login/step1/')
+        patch = mock.patch.object(lockout, 'time')
+        self.addCleanup(patch.stop)
+        self.clock = patch.start()
+        self.clock.time.return_value = 1000.0
+
+    def fail(self, at):
+        self.clock.time.return_value = at
+        return lockout.record_failure(self.user, self.request)
+
+    def test_failures_decay_out_of_the_window(self):
+        self.assertEqual([self.fail(1000), self.fail(1050)], [2, 1])
+        # Half of the previous bucket still overlaps the window
+        self.assertEqual(self.fail(1150), 1)
+        # The first two failures are out of the window now
+        self.assertEqual(self.fail(1210), 2)
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_frozen)
+
+    def test_user_is_frozen_once_at_the_limit(self):
+        self.assertEqual([self.fail(1000) for _ in range(3)], [2, 1, 0])
+        frozen = User.objects.get(pk=self.user.pk)
+        self.assertEqual((frozen.is_frozen, frozen.failed_attempts), (True, 3))
+        self.assertEqual(self.fail(1010), 0)
+        self.assertEqual(User.objects.get(pk=self.user.pk).frozen_at, frozen.frozen_at)
+        self.assertTrue(lockout.is_frozen(self.user))
+
+    @override_settings(LOCKOUT_COOLDOWN=60)
+    def test_frozen_user_is_released_after_the_cooldown(self):
+        for _ in range(3):
+            self.fail(1000)
+        self.assertTrue(lockout.is_frozen(self.user))
+        User.objects.filter(pk=self.user.pk).update(frozen_at=timezone.now() - timezone.timedelta(seconds=61))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(lockout.is_frozen(user))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_frozen)
+        # The released user starts with a clean window
+        self.assertEqual(lockout.record_failure(user, self.request), 2)
+
+
+# These tests cover the login token buckets: a bucket allows its burst and then refills at its rate, an over-limit
+# login is refused with 429 and Retry-After before the password is checked, and a login for a username that does
+# not exist still costs a hash and sends user_login_failed, like a wrong password.
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'login-throttle'}},
+    LOGIN_THROTTLE_RATES={'ip': {'burst': 100, 'per_minute': 60}, 'username': {'burst': 2, 'per_minute': 6}},
+    PASSWORD_HASH_WORKERS=0,
+)
+class LoginThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Throttle Co')
+        cls.user = User.objects.create_user(
+            username='throttled', email='throttled@example.com', password='right-pw', company=cls.company
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, username='throttled', password='wrong-pw'):
+        return self.client.post('/api/auth/login/step1/', {'username': username, 'password': password})
+
+    def test_bucket_allows_burst_then_refills(self):
+        now = 1000.0
+        self.assertEqual([throttling._take_token('bucket', 2, 6, now) for _ in range(2)], [0, 0])
+        # 6 a minute is one token every 10 seconds
+        self.assertAlmostEqual(throttling._take_token('bucket', 2, 6, now), 10)
+        self.assertAlmostEqual(throttling._take_token('bucket', 2, 6, now + 4), 6)
+        self.assertEqual(throttling._take_token('bucket', 2, 6, now + 10), 0)
+
+    def test_over_limit_login_is_refused_before_the_password_check(self):
+        with mock.patch('core.views.auth.check_user_password', return_value=False) as check:
+            responses = [self.login() for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [401, 401, 429])
+        self.assertEqual(check.call_count, 2)
+        self.assertEqual(responses[2]['Retry-After'], '10')
+        self.assertEqual(responses[2].json()['retry_after'], 10)
+        self.assertEqual(throttling.shed_counts(hours=1)[0][1]['username'], 1)
+
+    def test_unknown_username_costs_a_hash_and_sends_login_failed(self):
+        failures = []
+
+        def record(sender, credentials, **kwargs):
+            failures.append(credentials)
+
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+        with mock.patch('core.hashers.make_password', wraps=make_password) as hashed:
+            response = self.login(username='nobody')
+        self.assertEqual(response.status_code, 401)
+        hashed.assert_called_once_with('wrong-pw')
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(failures, [{'username': 'nobody'}, {'username': 'throttled'}])
+
+
+# These tests cover the write-coalescing session engine: a session saved again with unchanged data inside
+# SESSION_WRITE_INTERVAL costs no query, while changed data or an elapsed interval writes the row (pushing its expiry
+# forward), and the sweeper deletes only expired sessions, a chunk at a time.
+class SessionBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        session = session_backend.SessionStore()
+        session['room'] = 'R1'
+        session.save()
+        self.key = session.session_key
+
+    def reload(self):
+        session = session_backend.SessionStore(self.key)
+        session.load()
+        return session
+
+    def session_writes(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith(('UPDATE "django_session"', 'INSERT'))]
+
+    def test_unchanged_session_is_not_written(self):
+        session = self.reload()
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(len(queries), 0)
+
+    def test_changed_session_is_written(self):
+        session = self.reload()
+        session['room'] = 'R2'
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(len(self.session_writes(queries)), 1)
+        self.assertEqual(Session.objects.get(session_key=self.key).get_decoded()['room'], 'R2')
+
+    def test_session_is_written_once_the_interval_has_passed(self):
+        session = self.reload()
+        expire_date = Session.objects.get(session_key=self.key).expire_date
+        written_at = session[session_backend.WRITTEN_AT_KEY]
+        later = written_at + settings.SESSION_WRITE_INTERVAL
+        with mock.patch.object(session_backend, 'time') as clock, CaptureQueriesContext(connection) as queries:
+            clock.time.return_value = later
+            with mock.patch('django.utils.timezone.now', return_value=expire_date):
+                session.save()
+        self.assertEqual(len(self.session_writes(queries)), 1)
+        self.assertEqual(self.reload()[session_backend.WRITTEN_AT_KEY], later)
+        self.assertGreater(Session.objects.get(session_key=self.key).expire_date, expire_date)
+
+    def test_sweep_deletes_expired_sessions_in_chunks(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{index}', session_data='', expire_date=now - timezone.timedelta(hours=1))
+            for index in range(5)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(session_backend.sweep_expired_sessions(chunk_size=2), 5)
+        deletes = [query for query in queries if query['sql'].startswith('DELETE FROM "django_session"')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.key])
+
+
+# These tests cover the password hashers: calibrated parameters upgrade older hashes on login while hashes from
+# the other listed hashers are still recognised, scrypt works past OpenSSL's default memory limit, calibrate_hashers
+# prints settings to copy (never below Django's default PBKDF2 iterations), and the hashing limits
+# (checks hash on the calling thread, at most PASSWORD_HASH_WORKERS at once, busy past PASSWORD_HASH_MAX_PENDING).
+@override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=2, PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Hashing Co')
+        cls.user = User.objects.create_user(username='hashed', email='hashed@example.com', company=cls.company)
+
+    def setUp(self):
+        # Fresh slots and pool for the settings above
+        for name in ('_admitted', '_slots', '_pool'):
+            patcher = mock.patch.object(hashers, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: hashers._pool and hashers._pool.shutdown())
+
+    def test_older_hashes_are_upgraded_and_others_recognised(self):
+        self.user.password = PBKDF2PasswordHasher().encode('right-pw', 'saltsaltsalt', iterations=2000)
+        self.user.save(update_fields=['password'])
+        self.assertFalse(hashers.check_user_password(self.user, 'wrong-pw'))
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(hashers.check_user_password(self.user, 'right-pw'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+        for encoded, algorithm in (
+            ('bcrypt_sha256$$2b$12$LNtSyGV8eRRC3jT1jJ5bTOTuR1Uq9eWq0Yy0Lqki0IY2nGzDsXN0W', 'bcrypt_sha256'),
+            ('pbkdf2_sha1$1000$salt$Eyn/2pRXnnrWAkzs9IJ3+P4orVI=', 'pbkdf2_sha1'),
+        ):
+            self.assertEqual(identify_hasher(encoded).algorithm, algorithm)
+
+    def test_calibrate_hashers_recommends_settings(self):
+        out = io.StringIO()
+        call_command('calibrate_hashers', '--target-ms', '20', '--repeat', '1', stdout=out)
+        recommended = dict(
+            line.split(' = ') for line in out.getvalue().splitlines() if line.startswith('PASSWORD_')
+        )
+        # 20 ms is far too little for the default iterations; the recommendation is clamped to them
+        self.assertEqual(int(recommended['PASSWORD_PBKDF2_ITERATIONS']), PBKDF2PasswordHasher.iterations)
+        self.assertIn('keeping the default', out.getvalue())
+
+    @override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 15)
+    def test_scrypt_above_the_openssl_memory_limit(self):
+        hasher = hashers.CalibratedScryptPasswordHasher()
+        encoded = hasher.encode('right-pw', hasher.salt())
+        self.assertTrue(encoded.startswith(f'scrypt${2 ** 15}$'))
+        self.assertTrue(hasher.verify('right-pw', encoded))
+        self.assertFalse(hasher.verify('wrong-pw', encoded))
+        # A hash made with Django's default still verifies and is due for an upgrade
+        older = ScryptPasswordHasher().encode('right-pw', hasher.salt())
+        self.assertTrue(hasher.verify('right-pw', older))
+        self.assertTrue(hasher.must_update(older))
+
+    def test_checks_hash_on_the_calling_thread_within_the_limits(self):
+        release = threading.Event()
+        threads, running, most_running = [], [0], [0]
+
+        def slow_verify(password, encoded):
+            threads.append(threading.current_thread())
+            running[0] += 1
+            most_running[0] = max(most_running[0], running[0])
+            release.wait(5)
+            running[0] -= 1
+            return False, None
+
+        with mock.patch.object(hashers, '_verify', slow_verify):
+            callers = [threading.Thread(target=hashers.check_user_password, args=(self.user, 'pw')) for _ in range(2)]
+            for caller in callers:
+                caller.start()
+            # Wait until both are admitted (the semaphore's free count is 0)
+            for _ in range(500):
+                if threads and not hashers._admitted._value:
+                    break
+                release.wait(0.01)
+            # One check hashes, one waits for the slot: a third is refused
+            with self.assertRaises(hashers.HashingBusy):
+                hashers.check_user_password(self.user, 'pw')
+            release.set()
+            for caller in callers:
+                caller.join(5)
+
+        self.assertEqual(set(threads), set(callers))
+        self.assertEqual(most_running[0], 1)
+        self.assertEqual(hashers._admitted._value, 2)
+
+    def test_async_check_hashes_in_the_pool(self):
+        threads = []
+
+        def verify(password, encoded):
+            threads.append(threading.current_thread().name)
+            return True, None
+
+        with mock.patch.object(hashers, '_verify', verify):
+            self.assertTrue(asyncio.run(hashers.acheck_user_password(self.user, 'pw')))
+        self.assertTrue(threads[0].startswith('password-hash'))
+
+
+# These tests follow a registration through the staging area: the samples are encrypted as soon as they are
+# written, nothing is left behind when the job cannot be queued, a job hitting a database error is queued again
+# with its samples until its last attempt, and the public status endpoint does not return the account. The face
+# and voice models are not loaded; the checks are replaced to see what they were given.
+class EnrollmentStagingTests(TestCase):
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(ENROLLMENT_STAGING_DIR=staging.name, MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.staging = staging.name
+
+    def register(self, username='newcomer'):
+        return self.client.post('/api/auth/register/', {
+            'username': username, 'password': 'Secret-pass-1', 'email': f'{username}@example.com',
+            'phone_number': '+15550100', 'full_name': 'New Comer', 'create_company': 'true',
+            'company_name': f'{username} Co',
+            'face_image': SimpleUploadedFile('face.jpg', b'face-bytes'),
+            'voice_recording': SimpleUploadedFile('voice.wav', b'voice-bytes'),
+        })
+
+    def test_uploads_are_staged_encrypted(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 202, response.content)
+        job = EnrollmentJob.objects.get(pk=response.json()['job_id'])
+        for path, plain in ((job.face_upload, b'face-bytes'), (job.voice_upload, b'voice-bytes')):
+            with open(path, 'rb') as staged:
+                content = staged.read()
+            self.assertNotIn(plain, content)
+            self.assertTrue(content.startswith(b'gAAAAA'))
+
+    def test_failed_queueing_leaves_nothing_staged(self):
+        with mock.patch.object(enrollment, 'dispatch', side_effect=RuntimeError('queue down')):
+            with self.assertRaises(RuntimeError):
+                self.register()
+        self.assertEqual(os.listdir(self.staging), [])
+        self.assertFalse(EnrollmentJob.objects.exists())
+
+    def test_job_checks_decrypted_copies_and_status_hides_account(self):
+        job_id = self.register().json()['job_id']
+        seen = {}
+
+        def check(kind):
+            def read(path):
+                with open(path, 'rb') as sample:
+                    seen[kind] = sample.read()
+            return read
+
+        with mock.patch.object(enrollment, 'check_face', check('face')), \
+                mock.patch.object(enrollment, 'check_voice', check('voice')):
+            self.assertTrue(enrollment.run_job(job_id))
+
+        self.assertEqual(seen, {'face': b'face-bytes', 'voice': b'voice-bytes'})
+        self.assertEqual(os.listdir(self.staging), [])
+        self.assertTrue(User.objects.filter(username='newcomer').exists())
+        status = self.client.get(f'/api/auth/register/status/{job_id}/').json()
+        self.assertEqual(status['status'], 'completed')
+        self.assertNotIn('user', status)
+
+    def test_database_errors_are_retried_with_the_staged_samples(self):
+        job_id = self.register().json()['job_id']
+        self.assertEqual(
+            task_queue.get_task('core.process_enrollment').max_attempts, settings.ENROLLMENT_MAX_ATTEMPTS
+        )
+        with mock.patch.object(enrollment, 'check_face'), mock.patch.object(enrollment, 'check_voice'), \
+                mock.patch.object(enrollment, 'create_account', side_effect=OperationalError('database is locked')):
+            for attempt in range(1, settings.ENROLLMENT_MAX_ATTEMPTS):
+                with self.assertRaises(OperationalError):
+                    enrollment.run_job(job_id)
+                job = EnrollmentJob.objects.get(pk=job_id)
+                self.assertEqual((job.status, job.attempts), ('queued', attempt))
+                self.assertTrue(os.path.exists(job.face_upload) and os.path.exists(job.voice_upload))
+            with self.assertRaises(OperationalError):
+                enrollment.run_job(job_id)
+
+        job = EnrollmentJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('database is locked', job.error)
+        self.assertEqual(os.listdir(self.staging), [])
+
+
+# A task for the queue tests: records each call and raises for 'fail'
+task_calls = []
+
+
+@task_queue.task(name='tests.record', max_attempts=2)
+def record_task(value):
+    task_calls.append(value)
+    if value == 'fail':
+        raise ValueError('boom')
+
+
+# These tests cover the task queue: claiming due tasks by priority exactly once, retrying failures with capped
+# backoff until max_attempts, requeueing tasks whose worker died (without letting that worker record an outcome
+# afterwards) and queueing one run of a periodic task per interval while the previous run is not waiting.
+@override_settings(TASK_RETRY_BASE_DELAY=10, TASK_RETRY_MAX_DELAY=60, TASK_TIMEOUT=600)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        task_calls.clear()
+        jitter = mock.patch.object(task_queue.random, 'uniform', return_value=1.0)
+        jitter.start()
+        self.addCleanup(jitter.stop)
+
+    def test_claim_takes_due_tasks_by_priority_once(self):
+        low = task_queue.enqueue(record_task, 'low')
+        high = task_queue.enqueue(record_task, 'high', priority=5)
+        task_queue.enqueue(record_task, 'later', delay=60)
+
+        claimed = task_queue.claim('worker-1', limit=5)
+        self.assertEqual([task_row.pk for task_row in claimed], [high.pk, low.pk])
+        self.assertEqual({(t.status, t.locked_by, t.attempts) for t in claimed}, {('running', 'worker-1', 1)})
+        self.assertEqual(task_queue.claim('worker-2', limit=5), [])
+
+    def test_failures_are_retried_with_backoff(self):
+        self.assertEqual([task_queue.retry_delay(n) for n in (1, 2, 3, 4)], [10, 20, 40, 60])
+        queued = task_queue.enqueue(record_task, 'fail')
+
+        started = timezone.now()
+        self.assertFalse(task_queue.run(task_queue.claim('worker-1')[0]))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.locked_by, queued.attempts), ('queued', '', 1))
+        self.assertAlmostEqual((queued.run_at - started).total_seconds(), 10, delta=1)
+        self.assertIn('ValueError: boom', queued.last_error)
+        self.assertEqual(task_queue.claim('worker-1'), [])
+
+        Task.objects.update(run_at=timezone.now())
+        self.assertFalse(task_queue.run(task_queue.claim('worker-1')[0]))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIsNotNone(queued.finished_at)
+        self.assertEqual(task_calls, ['fail', 'fail'])
+
+    def test_unregistered_task_fails_without_retry(self):
+        queued = task_queue.enqueue('tests.missing', max_attempts=5)
+        self.assertFalse(task_queue.run(task_queue.claim('worker-1')[0]))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 1))
+
+    def test_stale_tasks_are_requeued_or_failed(self):
+        task_queue.enqueue(record_task, 'retry')
+        task_queue.enqueue(record_task, 'last', max_attempts=1)
+        abandoned = {task_row.args[0]: task_row for task_row in task_queue.claim('worker-1', limit=2)}
+        Task.objects.update(locked_at=timezone.now() - timezone.timedelta(seconds=601))
+
+        self.assertEqual(task_queue.requeue_stale(), (1, 1))
+        statuses = {task_row.args[0]: task_row.status for task_row in Task.objects.all()}
+        self.assertEqual(statuses, {'retry': 'queued', 'last': 'failed'})
+
+        # The dead worker finishing late does not overwrite the requeued task
+        self.assertTrue(task_queue.run(abandoned['retry']))
+        self.assertEqual(Task.objects.get(pk=abandoned['retry'].pk).status, 'queued')
+
+    def test_periodic_task_is_queued_once_per_interval(self):
+        periodic = PeriodicTask.objects.create(
+            name='record', task='tests.record', args=['tick'], interval_seconds=60, next_run_at=timezone.now()
+        )
+        self.assertEqual(task_queue.enqueue_due_periodic_tasks(), 1)
+        self.assertEqual(task_queue.enqueue_due_periodic_tasks(), 0)
+        periodic.refresh_from_db()
+        self.assertAlmostEqual((periodic.next_run_at - periodic.last_run_at).total_seconds(), 60)
+
+        # Due again while the previous run still waits: the run is skipped, not stacked
+        PeriodicTask.objects.update(next_run_at=timezone.now())
+        self.assertEqual(task_queue.enqueue_due_periodic_tasks(), 0)
+        Task.objects.update(status='succeeded')
+        PeriodicTask.objects.update(next_run_at=timezone.now())
+        self.assertEqual(task_queue.enqueue_due_periodic_tasks(), 1)
+        self.assertEqual(Task.objects.filter(status='queued', args=['tick'], max_attempts=1).count(), 1)
+
+
+# These tests cover bulk enrollment: row validation, the encrypted staging area and its cleanup, resuming a run
+# from its report and the activation tokens, which the status endpoint hands out once. The sample checks are
+# replaced and samples are processed in the test process (no worker pool).
+@override_settings(BULK_ENROLL_WORKERS=0)
+class BulkEnrollmentTests(TestCase):
+    MANIFEST = (
+        'username,email,full_name,face,voice,password,groups\n'
+        'ann,ann@example.com,Ann,ann.jpg,ann.wav,Plain-text-pw-1,Lab\n'
+        'bob,bob@example.com,Bob,bob.jpg,bob.wav,,\n'
+    )
+
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(BULK_ENROLL_STAGING_DIR=staging.name, MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.staging = staging.name
+
+        self.company = Company.objects.create(name='Bulk Co')
+        self.group = RoomGroup.objects.create(name='Lab', company=self.company)
+        self.admin = User.objects.create_user(
+            username='bulk_admin', email='bulk_admin@example.com', password='pw', company=self.company, is_admin=True
+        )
+        for patch in (mock.patch.object(bulk_enroll, 'check_face'), mock.patch.object(bulk_enroll, 'check_voice')):
+            self.addCleanup(patch.stop)
+            setattr(self, patch.attribute, patch.start())
+
+    def archive(self, names=('ann', 'bob')):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            for name in names:
+                archive.writestr(f'{name}.jpg', f'{name}-face')
+                archive.writestr(f'{name}.wav', f'{name}-voice')
+        return data.getvalue()
+
+    def archive_path(self):
+        archive = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
+        self.addCleanup(os.unlink, archive.name)
+        with archive:
+            archive.write(self.archive())
+        return archive.name
+
+    def upload(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/api/admin/bulk-enroll/', {
+            'manifest': SimpleUploadedFile('users.csv', self.MANIFEST.encode()),
+            'archive': SimpleUploadedFile('samples.zip', self.archive()),
+        })
+        self.assertEqual(response.status_code, 202, response.content)
+        return BulkEnrollment.objects.get(pk=response.json()['id'])
+
+    def test_validate_reports_row_errors_and_skips_enrolled_users(self):
+        User.objects.create_user(username='ann', email='ann@example.com', password='pw', company=self.company)
+        User.objects.create_user(username='cat', email='other@example.com', password='pw', company=self.company)
+        rows = bulk_enroll.read_manifest(self.MANIFEST.encode() + (
+            'cat,cat@example.com,Cat,ann.jpg,ann.wav,,\n'
+            'dan,dan@example.com,Dan,dan.jpg,bob.wav,,Lab;Attic\n'
+            'bob,bob2@example.com,Bob,bob.jpg,bob.wav,,\n'
+            'eve,,Eve,bob.jpg,bob.wav,,\n'
+        ).encode(), 'users.csv')
+        with zipfile.ZipFile(io.BytesIO(self.archive())) as archive:
+            valid, report = bulk_enroll.validate(rows, self.company, archive)
+
+        self.assertEqual([index for index, row in valid], [1])
+        self.assertEqual(valid[0][1]['group_ids'], [])
+        entries = {entry['row']: entry for entry in report}
+        self.assertEqual(entries[1]['status'], 'skipped')
+        self.assertEqual(entries[3]['errors'], {'username': ['Username already exists.']})
+        self.assertEqual(entries[4]['errors'], {
+            'face': ['File not found in the archive.'], 'groups': ['Unknown room groups: Attic'],
+        })
+        self.assertEqual(entries[5]['errors'], {'username': ['Duplicate username in the manifest.']})
+        self.assertEqual(entries[6]['errors'], {'email': ['This field is required.']})
+
+    def test_resume_processes_only_rows_not_done(self):
+        self.check_face.side_effect = [None, enrollment.EnrollmentError('No face.', 'face_image')]
+        report = bulk_enroll.enroll(bulk_enroll.read_manifest(self.MANIFEST.encode(), 'users.csv'),
+                                    self.archive_path(), self.company)
+        self.assertEqual([entry['status'] for entry in report], ['created', 'failed'])
+        self.assertEqual(report[1]['errors'], {'face': ['No face.']})
+
+        self.check_face.side_effect = None
+        self.check_face.reset_mock()
+        report = bulk_enroll.enroll(bulk_enroll.read_manifest(self.MANIFEST.encode(), 'users.csv'),
+                                    self.archive_path(), self.company, report=report)
+        self.assertEqual([entry['status'] for entry in report], ['created', 'created'])
+        self.assertEqual(self.check_face.call_count, 1)
+        ann = User.objects.get(username='ann')
+        self.assertTrue(ann.check_password('Plain-text-pw-1'))
+        self.assertEqual(list(ann.allowed_room_groups.values_list('room_group', flat=True)), [self.group.id])
+        with ann.face_reference_image.open('rb') as face:
+            self.assertNotIn(b'ann-face', face.read())
+
+    def test_uploads_are_staged_encrypted_and_removed_when_done(self):
+        bulk = self.upload()
+        for path, plain in ((bulk.manifest_path, b'Plain-text-pw-1'), (bulk.archive_path, b'ann-face')):
+            with open(path, 'rb') as staged:
+                self.assertNotIn(plain, staged.read())
+
+        bulk_enroll.run_bulk_enrollment(bulk.id)
+        bulk.refresh_from_db()
+        self.assertEqual((bulk.status, bulk.created_count, bulk.attempts), ('completed', 2, 1))
+        self.assertEqual(os.listdir(self.staging), [])
+
+    @override_settings(BULK_ENROLL_MAX_ATTEMPTS=2)
+    def test_staging_is_kept_for_retries_and_removed_after_the_last_attempt(self):
+        bulk = self.upload()
+        with mock.patch.object(bulk_enroll, 'enroll', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                bulk_enroll.run_bulk_enrollment(bulk.id)
+            self.assertEqual(os.listdir(self.staging), [str(bulk.id)])
+            with self.assertRaises(RuntimeError):
+                bulk_enroll.run_bulk_enrollment(bulk.id)
+        bulk.refresh_from_db()
+        self.assertEqual((bulk.status, bulk.attempts), ('failed', 2))
+        self.assertIsNotNone(bulk.finished_at)
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_unreadable_manifest_fails_and_removes_staging(self):
+        bulk = self.upload()
+        with open(bulk.manifest_path, 'wb') as staged:
+            bulk_enroll.stage_encrypted(SimpleUploadedFile('users.csv', b'username,email\n'), staged.name)
+        bulk_enroll.run_bulk_enrollment(bulk.id)
+        bulk.refresh_from_db()
+        self.assertEqual((bulk.status, bulk.error), ('failed', 'The manifest has no rows'))
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_activation_tokens_are_returned_once_and_activate_once(self):
+        bulk = self.upload()
+        bulk_enroll.run_bulk_enrollment(bulk.id)
+        bulk.refresh_from_db()
+        self.assertNotIn('activation_token', bulk.report[1])
+        self.assertTrue(bulk.report[1]['activation_token_issued'])
+
+        url = f'/api/admin/bulk-enroll/{bulk.id}/'
+        token = self.client.get(url).json()['report'][1]['activation_token']
+        self.assertNotIn('activation_token', self.client.get(url).json()['report'][1])
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+
+        self.client.logout()
+        response = self.client.post('/api/auth/activate/', {'token': token, 'password': 'Bobs-new-pass-9'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(User.objects.get(username='bob').check_password('Bobs-new-pass-9'))
+        response = self.client.post('/api/auth/activate/', {'token': token, 'password': 'Another-pass-9'})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(User.objects.get(username='bob').check_password('Bobs-new-pass-9'))
+
+
+# A locmem mail connection that fails like an SMTP server: errors maps a recipient to the exception its next send
+# raises, and unreachable makes open() fail. Reconnects are counted.
+class FlakyMailConnection(locmem.EmailBackend):
+    def __init__(self, errors=None, unreachable=False, **kwargs):
+        super().__init__(**kwargs)
+        self.errors = dict(errors or {})
+        self.unreachable = unreachable
+        self.opened = 0
+
+    def open(self):
+        if self.unreachable:
+            raise ConnectionRefusedError('Connection refused')
+        self.opened += 1
+
+    def send_messages(self, messages):
+        error = self.errors.pop(messages[0].to[0], None)
+        if error:
+            raise error
+        return super().send_messages(messages)
+
+
+# These tests send invitations through the outbound mail queue with the locmem backend standing in for SMTP:
+# claiming due and abandoned messages, retrying rejected ones with backoff until max_attempts, reconnecting when the
+# server drops the connection, and queueing from the bulk invite endpoint.
+@override_settings(TASK_RETRY_BASE_DELAY=10, TASK_TIMEOUT=600, MAIL_MAX_ATTEMPTS=2)
+class MailerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Mail Co')
+        cls.admin = User.objects.create_user(
+            username='mail_admin', email='mail_admin@example.com', password='pw', company=cls.company, is_admin=True
+        )
+
+    def queue(self, *addresses):
+        tokens = [InviteToken(company=self.company, email=address, created_by=self.admin) for address in addresses]
+        for token in tokens:
+            token.save()
+        mailer.queue_invitations(tokens)
+        return list(OutboundEmail.objects.filter(to_email__in=addresses).order_by('pk'))
+
+    def send(self, connection):
+        with mock.patch.object(mailer, 'get_connection', return_value=connection):
+            return mailer.send_batch(mailer.claim(10))
+
+    def test_claim_takes_due_and_abandoned_messages_once(self):
+        due, later, stale, busy = self.queue('due@example.com', 'later@example.com', 'stale@example.com',
+                                             'busy@example.com')
+        now = timezone.now()
+        OutboundEmail.objects.filter(pk=later.pk).update(next_attempt_at=now + timezone.timedelta(hours=1))
+        OutboundEmail.objects.filter(pk=stale.pk).update(
+            status='sending', locked_by='dead', locked_at=now - timezone.timedelta(seconds=601), attempts=1
+        )
+        OutboundEmail.objects.filter(pk=busy.pk).update(status='sending', locked_by='alive', locked_at=now)
+
+        claimed = mailer.claim(10)
+        self.assertEqual([email.pk for email in claimed], [due.pk, stale.pk])
+        self.assertEqual([email.attempts for email in claimed], [1, 2])
+        self.assertEqual(len({email.locked_by for email in claimed}), 1)
+        self.assertEqual(mailer.claim(10), [])
+
+    def test_rejected_message_is_retried_with_backoff_then_failed(self):
+        rejected, accepted = self.queue('rejected@example.com', 'ok@example.com')
+        refused = smtplib.SMTPRecipientsRefused({'rejected@example.com': (550, b'No such user')})
+        connection = FlakyMailConnection(errors={'rejected@example.com': refused})
+        before = timezone.now()
+        self.assertEqual(self.send(connection), (1, 0))
+
+        self.assertEqual([message.to for message in mail.outbox], [['ok@example.com']])
+        self.assertIn('Mail Co', mail.outbox[0].subject)
+        self.assertEqual(OutboundEmail.objects.get(pk=accepted.pk).status, 'sent')
+        rejected.refresh_from_db()
+        self.assertEqual((rejected.status, rejected.attempts, rejected.locked_by), ('queued', 1, ''))
+        self.assertIn('No such user', rejected.last_error)
+        # retry_delay(1) is TASK_RETRY_BASE_DELAY give or take 20% jitter
+        delay = (rejected.next_attempt_at - before).total_seconds()
+        self.assertTrue(7 <= delay <= 13, delay)
+
+        OutboundEmail.objects.filter(pk=rejected.pk).update(next_attempt_at=timezone.now())
+        connection = FlakyMailConnection(errors={'rejected@example.com': refused})
+        self.assertEqual(self.send(connection), (0, 1))
+        self.assertEqual(OutboundEmail.objects.get(pk=rejected.pk).status, 'failed')
+
+    def test_dropped_connection_is_reopened_for_the_rest_of_the_batch(self):
+        self.queue('first@example.com', 'second@example.com')
+        dropped = smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        connection = FlakyMailConnection(errors={'first@example.com': dropped})
+        self.assertEqual(self.send(connection), (1, 0))
+        self.assertEqual(connection.opened, 2)
+        self.assertEqual([message.to for message in mail.outbox], [['second@example.com']])
+        self.assertEqual(OutboundEmail.objects.get(to_email='first@example.com').status, 'queued')
+
+    def test_unreachable_server_queues_the_whole_batch_again(self):
+        self.queue('first@example.com', 'second@example.com')
+        self.assertEqual(self.send(FlakyMailConnection(unreachable=True)), (0, 0))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            list(OutboundEmail.objects.values_list('status', 'attempts', 'last_error')),
+            [('queued', 1, 'Connection refused')] * 2
+        )
+
+    def test_bulk_invites_are_queued_and_sent(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/api/admin/bulk-invite/', {'emails': ['a@example.com', 'b@example.com']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        for token in InviteToken.objects.filter(company=self.company):
+            self.assertAlmostEqual(token.expires_at - token.created_at, InviteToken.VALID_FOR,
+                                   delta=timezone.timedelta(seconds=5))
+        self.assertEqual(mailer.send_pending(), (2, 0))
+        token = InviteToken.objects.get(email='a@example.com')
+        self.assertIn(token.token, next(message.body for message in mail.outbox if message.to == ['a@example.com']))
+
+
+# These tests cover the invite token states and the sweeper: expired means no longer valid (used or past expiry)
+# in the model, the queryset, the admin filter and the API alike, and the sweeper deletes tokens past their
+# retention in chunks while keeping the ones a queued or processing registration still needs.
+class InviteTokenSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Sweep Co')
+        cls.admin = User.objects.create_user(
+            username='sweep_admin', email='sweep_admin@example.com', password='pw', company=cls.company,
+            is_admin=True, is_staff=True, is_superuser=True
+        )
+
+    def token(self, email, expired_days_ago, is_used=False):
+        return InviteToken.objects.create(
+            company=self.company, email=email, is_used=is_used, created_by=self.admin,
+            expires_at=timezone.now() - timezone.timedelta(days=expired_days_ago)
+        )
+
+    def job(self, token, status):
+        return EnrollmentJob.objects.create(
+            status=status, username=token.email.split('@')[0], email=token.email, phone_number='+15550100',
+            full_name='Sweep Job', password='!', invite_token=token, face_upload='face', voice_upload='voice'
+        )
+
+    def test_expired_means_the_same_everywhere(self):
+        self.token('valid@example.com', -1)
+        self.token('used@example.com', -1, is_used=True)
+        self.token('lapsed@example.com', 1)
+        tokens = InviteToken.objects.filter(company=self.company)
+        expected = {token.email for token in tokens if token.is_expired}
+        self.assertEqual(expected, {'used@example.com', 'lapsed@example.com'})
+
+        self.assertEqual({token.email for token in tokens.expired()}, expected)
+        status_filter = InviteTokenStatusFilter(
+            RequestFactory().get('/'), {'status': ['expired']}, InviteToken, InviteTokenAdmin
+        )
+        self.assertEqual({token.email for token in status_filter.queryset(None, tokens)}, expected)
+        self.client.force_login(self.admin)
+        listed = self.client.get('/api/manage/invite-tokens/', {'status': 'expired'}).json()
+        self.assertEqual({token['email'] for token in listed}, expected)
+
+    def test_sweep_keeps_tokens_of_registrations_in_progress(self):
+        self.token('old@example.com', 31)
+        self.token('old-used@example.com', 31, is_used=True)
+        self.token('recent@example.com', 29)
+        finished = self.job(self.token('finished@example.com', 31), 'completed')
+        waiting = [self.job(self.token(f'{status}@example.com', 31), status) for status in ('queued', 'processing')]
+
+        self.assertEqual(sweep_dead_tokens(30, chunk_size=2, max_chunks=1), 2)
+        self.assertEqual(sweep_dead_tokens(30, chunk_size=2), 1)
+        self.assertEqual(
+            set(InviteToken.objects.values_list('email', flat=True)),
+            {'recent@example.com', 'queued@example.com', 'processing@example.com'}
+        )
+        finished.refresh_from_db()
+        self.assertIsNone(finished.invite_token)
+        for job in waiting:
+            job.refresh_from_db()
+            self.assertIsNotNone(job.invite_token)
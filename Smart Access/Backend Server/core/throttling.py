@@ -0,0 +1,72 @@
+# core/throttling.py
+import logging
+import math
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SHED_COUNTER_TTL = 2 * 24 * 60 * 60  # keep two days of hourly shed counters
+
+
+# Token buckets refill continuously at per_minute / 60 tokens a second up to burst, and every attempt takes one
+# token. The bucket state lives in the shared cache, so all workers see the same buckets. The read and write of a
+# bucket are not one atomic step, so a burst racing across workers can let a few extra attempts through, which
+# is fine for load shedding.
+def _take_token(key, burst, per_minute, now):
+    """Take a token from a bucket. Returns 0 when allowed, otherwise the seconds until a token is available"""
+    rate = per_minute / 60
+    tokens, updated_at = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+
+    if tokens >= 1:
+        cache.set(key, (tokens - 1, now), timeout=math.ceil(burst / rate) + 1)
+        return 0
+    cache.set(key, (tokens, now), timeout=math.ceil(burst / rate) + 1)
+    return (1 - tokens) / rate
+
+
+def throttle(scope, value):
+    """
+    Take a token from the LOGIN_THROTTLE_RATES bucket for scope (e.g. 'ip', 'username', 'company') and value.
+    Returns None when the caller may proceed, or the number of seconds it should wait.
+    """
+    rate = settings.LOGIN_THROTTLE_RATES.get(scope)
+    if not rate or value in (None, ''):
+        return None
+    wait = _take_token(f'throttle:{scope}:{value}', rate['burst'], rate['per_minute'], time.time())
+    if not wait:
+        return None
+    record_shed(scope)
+    logger.warning(f'Login throttled by {scope} bucket for {value!r}')
+    return math.ceil(wait)
+
+
+def record_shed(scope):
+    """Count a rejected attempt in the hourly shed-load counters"""
+    key = f'throttle:shed:{scope}:{timezone.now():%Y%m%d%H}'
+    cache.add(key, 0, timeout=SHED_COUNTER_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=SHED_COUNTER_TTL)
+
+
+def shed_scopes():
+    # 'lockout' counts logins refused because the client IP is locked out by core/lockout.py
+    return [*settings.LOGIN_THROTTLE_RATES, 'lockout']
+
+
+def shed_counts(hours=24):
+    """Rejected attempts per scope for each of the last hours, newest first: [(hour, {scope: count})]"""
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    hours = [now - timezone.timedelta(hours=offset) for offset in range(hours)]
+    counts = cache.get_many([
+        f'throttle:shed:{scope}:{hour:%Y%m%d%H}' for hour in hours for scope in shed_scopes()
+    ])
+    return [
+        (hour, {scope: counts.get(f'throttle:shed:{scope}:{hour:%Y%m%d%H}', 0) for scope in shed_scopes()})
+        for hour in hours
+    ]
@@ -1,7 +1,7 @@
 # core/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import auth, admin, test  # Keep test if needed, otherwise remove
+from .views import auth, admin, test, door, sync  # Keep test if needed, otherwise remove
 # Import new view for user rooms
 from .views.room import list_user_rooms  # Add this import
 
@@ -18,7 +18,9 @@ urlpatterns = [
 
     # Authentication endpoints (Session based)
     path('auth/register/', auth.register, name='register'),
+    path('auth/register/status/<uuid:job_id>/', auth.registration_status, name='registration-status'),
     path('auth/verify-token/', auth.verify_token, name='verify-token'),
+    path('auth/activate/', auth.activate_account, name='activate-account'),
     path('auth/login/step1/', auth.login_step1, name='login-step1'),
     path('auth/login/step2/', auth.login_step2, name='login-step2'),
     path('auth/login/step3/', auth.login_step3, name='login-step3'),
@@ -30,6 +32,9 @@ urlpatterns = [
     # User rooms endpoint (for regular users)
     path('user/rooms/', list_user_rooms, name='user-rooms'),  # Add this line and move it up
 
+    # Delta sync for the admin and mobile apps
+    path('sync/', sync.sync_changes, name='sync'),
+
     # Room access endpoints (Session based)
     path('rooms/access/request/', auth.request_room_access, name='request-room-access'),
     path('rooms/access/face-verify/', auth.room_access_face_verify, name='room-access-face'),
@@ -37,15 +42,25 @@ urlpatterns = [
     path('rooms/<str:room_id>/status/', auth.get_room_status, name='room-status'),
     path('rooms/<str:room_id>/toggle-lock/', auth.toggle_room_lock, name='toggle-room-lock'),
 
+    # Door controller endpoints (ESP32)
+    path('controllers/door-events/', door.ingest_door_events, name='door-events'),
+
     # Admin management endpoints (Require session authentication)
     path('admin/access-logs/', admin.list_access_logs, name='access-logs'),
+    path('admin/access-logs/export/', admin.export_access_logs, name='export-access-logs'),
+    path('admin/access-stats/', admin.access_statistics, name='access-stats'),
     path('admin/frozen-accounts/', admin.list_frozen_accounts, name='frozen-accounts'),
     path('admin/unfreeze-account/', admin.unfreeze_account, name='unfreeze-account'),
     path('admin/user-permissions/', admin.manage_user_permissions, name='manage-permissions'),
+    path('admin/user-permissions/bulk/', admin.bulk_user_permissions, name='bulk-permissions'),  # before <username>
+    path('admin/rooms/bulk/', admin.bulk_provision_rooms, name='bulk-rooms'),
     path('admin/user-permissions/<str:username>/', admin.get_user_permissions, name='user-permissions'),
     path('admin/users/', admin.list_users, name='list-users'),
     path('admin/company/', admin.get_company_details, name='company-details'),
     path('admin/create-invite/', admin.create_invite_token, name='create-invite'),
+    path('admin/bulk-invite/', admin.bulk_create_invites, name='bulk-invite'),
+    path('admin/bulk-enroll/', admin.bulk_enroll_users, name='bulk-enroll'),
+    path('admin/bulk-enroll/<uuid:bulk_id>/', admin.bulk_enrollment_status, name='bulk-enroll-status'),
 
     # Test endpoints (Keep if needed)
     path('test/biometrics/<str:username>/', test.test_biometric_decryption, name='test-biometrics'),
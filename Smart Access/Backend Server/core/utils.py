@@ -101,6 +101,12 @@ CIPHER_SUITE = Fernet(ENCRYPTION_KEY)
 # sensitive biometric templates are never stored in plaintext on the server, protecting user privacy and
 # enhancing system security against unauthorized access to the stored biometric data.
 class BiometricEncryption:
+    def encrypt_upload(self, upload, file_path):
+        """Write an uploaded file to file_path encrypted, without the plain samples ever touching the disk"""
+        data = b''.join(upload.chunks())
+        with open(file_path, 'wb') as file:
+            file.write(CIPHER_SUITE.encrypt(data))
+
     def encrypt_file(self, file_path):
         try:
             with open(file_path, 'rb') as file:
@@ -267,6 +273,18 @@ class BiometricVerification:
         return "It took him a while to realize that everything he decided not to change, he was actually choosing."
         
         
+# The models behind BiometricVerification take seconds to load and a lot of memory, so each process shares one
+# instance: the web views and the enrollment worker both get it through this function.
+_biometric_verifier = None
+
+
+def get_biometric_verifier():
+    global _biometric_verifier
+    if _biometric_verifier is None:
+        _biometric_verifier = BiometricVerification()
+    return _biometric_verifier
+
+
 # This function locks any rooms whose unlock status has expired. It's designed to be called periodically
 # by a management command or scheduled task to ensure that doors don't remain unlocked indefinitely if
 # the unlock timeout passes.
@@ -274,17 +292,19 @@ def lock_expired_rooms():
     """
     Utility function to lock any rooms whose unlock has expired.
     This can be called by a management command or a scheduled task.
+    Returns the number of rooms locked.
     """
-    now = timezone.now()
-    # Get all unlocked rooms
-    unlocked_rooms = Room.objects.filter(is_unlocked=True).exclude(unlock_timestamp=None)
+    from .models import Room  # models imports this module
+
+    # Rooms unlocked more than 30 seconds ago
+    cutoff = timezone.now() - timedelta(seconds=30)
+    expired_rooms = Room.objects.filter(is_unlocked=True, unlock_timestamp__lt=cutoff)
 
-    # Check each room's unlock time
-    for room in unlocked_rooms:
-        time_since_unlock = now - room.unlock_timestamp
-    # If unlocked more than 30 seconds ago, lock it
-    if time_since_unlock.total_seconds() > 30:
+    locked = 0
+    for room in expired_rooms:
         room.is_unlocked = False
         room.unlock_timestamp = None
-        room.save()
+        room.save(update_fields=['is_unlocked', 'unlock_timestamp'])
+        locked += 1
         print(f"Locked room {room.room_id} due to timeout")
+    return locked
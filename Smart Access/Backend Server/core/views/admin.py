@@ -1,19 +1,42 @@
 # core/views/admin.py
+import os
+import zipfile
 from rest_framework import status, viewsets
 from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q
-from django.core.mail import send_mail
+from django.db.models import Q, Sum
+from django.http import StreamingHttpResponse
 from django.conf import settings
-from django.template.loader import render_to_string
-from ..models import Room, RoomGroup, User, UserRoomGroup, AccessLog, Company, InviteToken
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from ..models import Room, RoomGroup, User, UserRoomGroup, AccessLog, AccessLogRollup, Company, InviteToken, BulkEnrollment
 from ..serializers import (
     RoomSerializer, RoomGroupSerializer, UserRoomGroupSerializer,
     AccessLogSerializer, UserSerializer, CompanySerializer,
-    InviteTokenSerializer, InviteTokenCreateSerializer
+    InviteTokenSerializer, InviteTokenCreateSerializer, ACCESS_LOG_VALUES, USER_VALUES
 )
+from ..pagination import keyset_page, get_page_size, decode_cursor, InvalidCursor
+from ..access_logs import EXPORT_FORMATS, filter_access_logs, iter_export_rows
+from ..archive import archived_page
+from ..db_router import use_replica
+from ..bulk_enroll import ManifestError, discard_staged, read_manifest, stage_encrypted
+from ..provisioning import ProvisioningError, apply_permissions, apply_rooms
+from ..mailer import queue_invitations
+from ..response_cache import cache_per_company
+from ..sparse_fields import InvalidFields, SparseFieldsViewMixin, requested_fields
+from ..task_queue import enqueue
+from .. import lockout
+
+def parse_flag(value):
+    # JSON bodies send a boolean, form bodies a string such as 'false'
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
 
 class AdminPermissionMixin:
     """Mixin to check if user is admin"""
@@ -28,7 +51,7 @@ class AdminPermissionMixin:
         """Get the company of the current user"""
         return request.user.company
 
-class RoomViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
+class RoomViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet, AdminPermissionMixin):
     """
     ViewSet for Room management (admin only)
     """
@@ -38,9 +61,14 @@ class RoomViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     def get_queryset(self):
         """Filter rooms by the current user's company"""
         if self.request.user.is_admin:
-            return Room.objects.filter(company=self.request.user.company)
+            # The serializer reads group.name and company.name for every room
+            return Room.objects.filter(company=self.request.user.company).select_related('group', 'company')
         return Room.objects.none()
 
+    @method_decorator(cache_per_company('rooms'))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def initial(self, request, *args, **kwargs):
         admin_check = self.check_admin(request)
         if admin_check:
@@ -51,7 +79,7 @@ class RoomViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
         """Set the company when creating a new room"""
         serializer.save(company=self.get_company(self.request))
 
-class RoomGroupViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
+class RoomGroupViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet, AdminPermissionMixin):
     """
     ViewSet for RoomGroup management (admin only)
     """
@@ -61,9 +89,13 @@ class RoomGroupViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     def get_queryset(self):
         """Filter room groups by the current user's company"""
         if self.request.user.is_admin:
-            return RoomGroup.objects.filter(company=self.request.user.company)
+            return RoomGroup.objects.filter(company=self.request.user.company).select_related('company')
         return RoomGroup.objects.none()
 
+    @method_decorator(cache_per_company('rooms'))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def initial(self, request, *args, **kwargs):
         admin_check = self.check_admin(request)
         if admin_check:
@@ -74,7 +106,7 @@ class RoomGroupViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
         """Set the company when creating a new room group"""
         serializer.save(company=self.get_company(self.request))
 
-class CompanyViewSet(viewsets.ReadOnlyModelViewSet, AdminPermissionMixin):
+class CompanyViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet, AdminPermissionMixin):
     """
     ViewSet for viewing company details (admin only, read-only)
     """
@@ -92,7 +124,7 @@ class CompanyViewSet(viewsets.ReadOnlyModelViewSet, AdminPermissionMixin):
             return admin_check
         super().initial(request, *args, **kwargs)
 
-class InviteTokenViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
+class InviteTokenViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet, AdminPermissionMixin):
     """
     ViewSet for managing invite tokens (admin only)
     """
@@ -101,7 +133,16 @@ class InviteTokenViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     
     def get_queryset(self):
         if self.request.user.is_admin:
-            return InviteToken.objects.filter(company=self.request.user.company)
+            tokens = InviteToken.objects.filter(
+                company=self.request.user.company
+            ).select_related('company', 'created_by')
+            # ?status=valid|expired narrows the list in SQL
+            token_status = self.request.query_params.get('status')
+            if token_status == 'valid':
+                tokens = tokens.valid()
+            elif token_status == 'expired':
+                tokens = tokens.expired()
+            return tokens
         return InviteToken.objects.none()
     
     def initial(self, request, *args, **kwargs):
@@ -117,104 +158,182 @@ class InviteTokenViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     
     def perform_create(self, serializer):
         company = self.get_company(self.request)
-        token = serializer.save(
-            company=company,
-            created_by=self.request.user
-        )
-        
-        # Send email with the token
-        self.send_invite_email(token)
+        with transaction.atomic():
+            token = serializer.save(
+                company=company,
+                created_by=self.request.user
+            )
+            # The email is sent from the mail queue, so the request does not wait on the mail server
+            queue_invitations([token])
         
         return token
-    
-    def send_invite_email(self, token):
-        """Send invitation email with token"""
-        subject = f"Invitation to join {token.company.name} on BioaccessControl"
-        
-        # Build the invitation URL
-        # In a real deployment, you'd use your domain name
-        invitation_url = f"http://localhost:5000/register?token={token.token}"
-        
-        # Context for the email template
-        context = {
-            'company_name': token.company.name,
-            'role': token.get_role_display(),
-            'invitation_url': invitation_url,
-            'expiry_date': token.expires_at.strftime('%Y-%m-%d %H:%M'),
-            'sender_name': token.created_by.full_name or token.created_by.username,
-        }
-        
-        # You would create an HTML email template in templates/emails/invitation.html
-        # html_message = render_to_string('emails/invitation.html', context)
-        
-        # Plain text fallback
-        message = f"""
-        You have been invited to join {token.company.name} as a {token.get_role_display()}.
-        
-        Please use the following link to register:
-        {invitation_url}
-        
-        This invitation expires on {token.expires_at.strftime('%Y-%m-%d %H:%M')}.
-        
-        Regards,
-        {token.created_by.full_name or token.created_by.username}
-        """
-        
-        try:
-            # Uncomment when ready to send emails
-            # send_mail(
-            #     subject,
-            #     message,
-            #     settings.DEFAULT_FROM_EMAIL,
-            #     [token.email],
-            #     fail_silently=False,
-            #     html_message=html_message,
-            # )
-            print(f"Email invitation would be sent to {token.email} with token {token.token}")
-        except Exception as e:
-            print(f"Error sending invitation email: {e}")
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_replica
 def list_access_logs(request):
     """
-    Get access logs - company-specific logs for admins, user-specific logs for regular users
+    Get access logs - company-specific logs for admins, user-specific logs for regular users.
+    Results are paginated newest first; pass the X-Next-Cursor response header back as ?cursor=
+    to fetch the next page, and ?page_size= to change the page length.
+    With ?archived=true the logs moved out by the retention policy are searched instead.
+    ?fields= limits the keys returned and ?expand=user,room,company embeds those objects.
     """
-    user = request.user
-    
-    # Get query parameters for filtering
+    cursor = request.query_params.get('cursor')
+    page_size = get_page_size(request)
+
+    try:
+        fields, expand = requested_fields(request.query_params)
+        if request.query_params.get('archived', '').lower() == 'true':
+            if expand:
+                raise InvalidFields('Archived logs cannot be expanded')
+            values = ACCESS_LOG_VALUES.subset(fields)
+            rows, next_cursor = archived_page(request.user, request.query_params, cursor, page_size)
+            data = [{key: row[key] for key, _ in values.fields} for row in rows]
+        elif expand:
+            serializer = AccessLogSerializer(many=True, fields=fields, expand=expand)
+            logs = serializer.child.optimize(filter_access_logs(request.user, request.query_params), 'timestamp')
+            page, next_cursor = keyset_page(logs, cursor=cursor, page_size=page_size)
+            data = serializer.to_representation(page)
+        else:
+            # Without expansions the rows come straight from values(), reading only the requested columns
+            values = ACCESS_LOG_VALUES.subset(fields, keep=('id', 'timestamp'))
+            logs = filter_access_logs(request.user, request.query_params)
+            page, next_cursor = keyset_page(values.values(logs), cursor=cursor, page_size=page_size)
+            data = values.to_representation(page)
+    except InvalidCursor:
+        return Response({
+            'error': 'Invalid cursor'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except InvalidFields as exc:
+        return Response({
+            'error': str(exc)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    response = Response(data)
+    if next_cursor:
+        query = request.query_params.copy()
+        query['cursor'] = next_cursor
+        response['X-Next-Cursor'] = next_cursor
+        response['Link'] = f'<{request.build_absolute_uri(request.path)}?{query.urlencode()}>; rel="next"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_access_logs(request):
+    """
+    Stream the full access history as CSV or NDJSON (admin only, company-specific).
+    Accepts the same filters as list_access_logs plus ?export_format= and ?cursor=
+    to resume after the last row received.
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response({
+            'error': f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        # Validate up front; an error inside the stream can no longer change the status code
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor:
+            return Response({
+                'error': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    logs = filter_access_logs(request.user, request.query_params)
+    write_lines, content_type = EXPORT_FORMATS[export_format]
+
+    response = StreamingHttpResponse(
+        write_lines(iter_export_rows(logs, cursor=cursor)),
+        content_type=content_type
+    )
+    filename = f"access_logs_{timezone.now().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def access_statistics(request):
+    """
+    Grant/deny counts over time, busiest rooms and failure reasons (admin only, company-specific).
+    Reads the pre-aggregated rollups; supports ?granularity=hour|day, start_date, end_date and room_id.
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return Response({
+            'error': 'granularity must be hour or day'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    buckets = AccessLogRollup.objects.filter(company=request.user.company, granularity=granularity)
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
     room_id = request.query_params.get('room_id')
-    access_status = request.query_params.get('access_status')
-    username = request.query_params.get('username')
-
-    # Base queryset - filter by company for admins, by user for regular users
-    if user.is_admin:
-        logs = AccessLog.objects.filter(company=user.company)
-    else:
-        logs = AccessLog.objects.filter(user=user, company=user.company)
-
-    # Apply filters
     if start_date:
-        logs = logs.filter(timestamp__gte=start_date)
+        buckets = buckets.filter(bucket_start__gte=start_date)
     if end_date:
-        logs = logs.filter(timestamp__lte=end_date)
+        buckets = buckets.filter(bucket_start__lte=end_date)
     if room_id:
-        logs = logs.filter(room__room_id=room_id)
-    if access_status:
-        logs = logs.filter(access_granted=(access_status.lower() == 'true'))
-    if username and user.is_admin:
-        logs = logs.filter(user__username=username)
+        buckets = buckets.filter(room__room_id=room_id)
 
-    # Order by timestamp
-    logs = logs.order_by('-timestamp')
+    totals = buckets.aggregate(
+        total=Sum('count'),
+        granted=Sum('count', filter=Q(access_granted=True)),
+        speaker_sum=Sum('speaker_similarity_sum'),
+        transcription_sum=Sum('transcription_score_sum'),
+    )
+    total = totals['total'] or 0
 
-    serializer = AccessLogSerializer(logs, many=True)
-    return Response(serializer.data)
+    series = buckets.values('bucket_start').annotate(
+        granted=Sum('count', filter=Q(access_granted=True)),
+        denied=Sum('count', filter=Q(access_granted=False)),
+    ).order_by('bucket_start')
+
+    busiest_rooms = buckets.values('room__room_id', 'room__name').annotate(
+        total=Sum('count')
+    ).order_by('-total')[:10]
+
+    failure_reasons = buckets.filter(access_granted=False).values('failure_reason').annotate(
+        total=Sum('count')
+    ).order_by('-total')
+
+    return Response({
+        'granularity': granularity,
+        'total': total,
+        'granted': totals['granted'] or 0,
+        'denied': total - (totals['granted'] or 0),
+        'average_speaker_similarity': (totals['speaker_sum'] or 0) / total if total else None,
+        'average_transcription_score': (totals['transcription_sum'] or 0) / total if total else None,
+        'series': [
+            {'bucket_start': row['bucket_start'], 'granted': row['granted'] or 0, 'denied': row['denied'] or 0}
+            for row in series
+        ],
+        'busiest_rooms': [
+            {'room_id': row['room__room_id'], 'room_name': row['room__name'], 'count': row['total']}
+            for row in busiest_rooms
+        ],
+        'failure_reasons': [
+            {'reason': row['failure_reason'], 'count': row['total']}
+            for row in failure_reasons
+        ],
+    })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_per_company('users')
+@use_replica
 def list_frozen_accounts(request):
     """
     List all frozen accounts (admin only, company-specific)
@@ -276,9 +395,7 @@ def unfreeze_account(request):
     try:
         # Only allow unfreezing users from the same company
         user = User.objects.get(username=username, company=request.user.company)
-        user.is_frozen = False
-        user.failed_attempts = 0
-        user.save()
+        lockout.unfreeze(user)
         return Response({
             'message': f'Account {username} has been unfrozen'
         })
@@ -335,11 +452,70 @@ def manage_user_permissions(request):
             'error': 'Room group not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_user_permissions(request):
+    """
+    Grant and revoke room group access for many users at once (admin only, company-specific).
+    Body: {"grant": [{"usernames": [...], "groups": [...]}], "revoke": [...], "dry_run": false}; every
+    username is combined with every group of its entry. Returns the access that was granted and revoked
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        diff = apply_permissions(
+            request.user.company,
+            grant=request.data.get('grant'),
+            revoke=request.data.get('revoke'),
+            dry_run=parse_flag(request.data.get('dry_run'))
+        )
+    except ProvisioningError as e:
+        return Response({
+            'error': str(e),
+            'errors': e.details
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response(diff)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_provision_rooms(request):
+    """
+    Create, update and delete room groups and rooms in one request (admin only, company-specific).
+    Body: {"groups": [{"name", "description"}], "rooms": [{"room_id", "name", "group"}],
+    "delete_rooms": [room_id, ...], "delete_groups": [name, ...], "dry_run": false}. Returns what changed
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        diff = apply_rooms(
+            request.user.company,
+            groups=request.data.get('groups'),
+            rooms=request.data.get('rooms'),
+            delete_rooms=request.data.get('delete_rooms'),
+            delete_groups=request.data.get('delete_groups'),
+            dry_run=parse_flag(request.data.get('dry_run'))
+        )
+    except ProvisioningError as e:
+        return Response({
+            'error': str(e),
+            'errors': e.details
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response(diff)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_per_company('users')
+@use_replica
 def list_users(request):
     """
-    List all users (admin only, company-specific)
+    List all users (admin only, company-specific).
+    ?fields= limits the keys returned and ?expand=company embeds the company.
     """
     if not request.user.is_admin:
         return Response({
@@ -347,11 +523,24 @@ def list_users(request):
         }, status=status.HTTP_403_FORBIDDEN)
 
     users = User.objects.filter(company=request.user.company)
-    serializer = UserSerializer(users, many=True)
-    return Response(serializer.data)
+    try:
+        fields, expand = requested_fields(request.query_params)
+        if expand:
+            serializer = UserSerializer(many=True, fields=fields, expand=expand)
+            data = serializer.to_representation(serializer.child.optimize(users))
+        else:
+            values = USER_VALUES.subset(fields)
+            data = values.to_representation(values.values(users))
+    except InvalidFields as exc:
+        return Response({
+            'error': str(exc)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_per_company('users')
+@use_replica
 def get_user_permissions(request, username):
     """
     Get all room groups a user has access to (admin only, company-specific)
@@ -364,11 +553,10 @@ def get_user_permissions(request, username):
     try:
         # Only allow viewing users from the same company
         user = User.objects.get(username=username, company=request.user.company)
-        # Get all UserRoomGroup associations for this user
-        user_room_groups = UserRoomGroup.objects.filter(user=user)
-        
-        # Extract the group names
-        group_names = [urg.room_group.name for urg in user_room_groups]
+        # Get the names of all room groups assigned to this user in a single join
+        group_names = list(
+            UserRoomGroup.objects.filter(user=user).values_list('room_group__name', flat=True)
+        )
         
         return Response({
             'username': username,
@@ -381,6 +569,7 @@ def get_user_permissions(request, username):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_per_company('company')
 def get_company_details(request):
     """
     Get details about the current user's company
@@ -407,22 +596,90 @@ def create_invite_token(request):
     
     serializer = InviteTokenCreateSerializer(data=request.data)
     if serializer.is_valid():
-        # Create token
-        token = InviteToken.objects.create(
-            email=serializer.validated_data['email'],
-            role=serializer.validated_data['role'],
-            company=request.user.company,
-            created_by=request.user
-        )
-        
-        # Send email with token
-        # In a real deployment, uncomment the email sending code in InviteTokenViewSet.send_invite_email
+        with transaction.atomic():
+            # Create token
+            token = InviteToken.objects.create(
+                email=serializer.validated_data['email'],
+                role=serializer.validated_data['role'],
+                company=request.user.company,
+                created_by=request.user
+            )
+            # Queue the invitation email; the task worker sends it
+            queue_invitations([token])
         
         result_serializer = InviteTokenSerializer(token)
         return Response(result_serializer.data, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_invites(request):
+    """
+    Invite many people at once (admin only). Body: {"emails": [...], "role": "user"}. Addresses that already
+    have an account or a pending invitation are skipped. The emails are queued and sent by the task worker
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    emails = request.data.get('emails')
+    role = request.data.get('role', 'user')
+    if not isinstance(emails, list) or not emails or not all(isinstance(email, str) for email in emails):
+        return Response({
+            'error': 'emails must be a non-empty list of addresses'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(emails) > settings.BULK_INVITE_MAX_EMAILS:
+        return Response({
+            'error': f'At most {settings.BULK_INVITE_MAX_EMAILS} people can be invited in one request'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if role not in dict(InviteToken.ROLE_CHOICES):
+        return Response({
+            'error': "role must be 'user' or 'admin'"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    emails = list(dict.fromkeys(email.strip() for email in emails))
+    invalid = []
+    for email in emails:
+        try:
+            validate_email(email)
+        except ValidationError:
+            invalid.append(email)
+    if invalid:
+        return Response({
+            'error': 'Invalid email addresses',
+            'errors': {'emails': invalid}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    company = request.user.company
+    with transaction.atomic():
+        registered = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        pending = set(InviteToken.objects.valid().filter(
+            company=company, email__in=emails
+        ).values_list('email', flat=True))
+        tokens = [
+            InviteToken(company=company, email=email, role=role, created_by=request.user)
+            for email in emails if email not in registered and email not in pending
+        ]
+        # bulk_create skips InviteToken.save(), which sets the token and expiry
+        for token in tokens:
+            token.set_defaults()
+        InviteToken.objects.bulk_create(tokens, batch_size=500)
+        # bulk_create does not return primary keys on every backend, so read them back
+        ids = dict(InviteToken.objects.filter(token__in=[token.token for token in tokens]).values_list('token', 'id'))
+        for token in tokens:
+            token.id = ids[token.token]
+        queue_invitations(tokens)
+
+    return Response({
+        'invited': InviteTokenSerializer(tokens, many=True).data,
+        'skipped': {
+            'registered': sorted(registered),
+            'pending': sorted(pending),
+        }
+    }, status=status.HTTP_201_CREATED)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def verify_invite_token(request):
@@ -436,7 +693,7 @@ def verify_invite_token(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        token = InviteToken.objects.get(token=token_str)
+        token = InviteToken.objects.select_related('company').get(token=token_str)
         
         if token.is_expired:
             return Response({
@@ -461,3 +718,95 @@ def verify_invite_token(request):
             'valid': False,
             'error': 'Invalid token'
         })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_enroll_users(request):
+    """
+    Enroll users in bulk (admin only): upload a CSV/JSON `manifest` and a zip `archive` of the samples it names.
+    Processing runs in the background; poll the returned status_url for progress and the per-row report
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    manifest = request.FILES.get('manifest')
+    archive = request.FILES.get('archive')
+    if not manifest or not archive:
+        return Response({
+            'error': 'A manifest and a sample archive are required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not zipfile.is_zipfile(archive):
+        return Response({
+            'error': 'The sample archive must be a zip file'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        rows = read_manifest(manifest.read(), manifest.name)
+    except ManifestError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    bulk = BulkEnrollment(company=request.user.company, created_by=request.user, total_rows=len(rows))
+    directory = os.path.join(settings.BULK_ENROLL_STAGING_DIR, str(bulk.id))
+    # The manifest's extension tells read_manifest its format; both files are staged encrypted
+    bulk.manifest_path = os.path.join(directory, 'manifest.json' if manifest.name.lower().endswith('.json') else 'manifest.csv')
+    bulk.archive_path = os.path.join(directory, 'samples.zip')
+    try:
+        with transaction.atomic():
+            os.makedirs(directory, exist_ok=True)
+            for upload, path in ((manifest, bulk.manifest_path), (archive, bulk.archive_path)):
+                upload.seek(0)
+                stage_encrypted(upload, path)
+            bulk.save()
+            enqueue('core.bulk_enroll', str(bulk.id))
+    except Exception:
+        discard_staged(bulk)
+        raise
+
+    return Response({
+        'message': 'Bulk enrollment queued',
+        'id': str(bulk.id),
+        'total_rows': bulk.total_rows,
+        'status_url': reverse('bulk-enroll-status', args=[bulk.id])
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bulk_enrollment_status(request, bulk_id):
+    """
+    Progress and per-row report of a bulk enrollment (admin only, company-specific)
+    """
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Admin privileges required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        with transaction.atomic():
+            bulk = BulkEnrollment.objects.select_for_update().get(pk=bulk_id, company=request.user.company)
+            # Activation tokens are handed out once: the first poll after a batch returns them and they are dropped
+            tokens, bulk.activation_tokens = bulk.activation_tokens, {}
+            if tokens:
+                bulk.save(update_fields=['activation_tokens'])
+    except BulkEnrollment.DoesNotExist:
+        return Response({
+            'error': 'Bulk enrollment not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    report = [
+        {**entry, 'activation_token': tokens[str(entry['row'])]} if str(entry['row']) in tokens else entry
+        for entry in bulk.report
+    ]
+    return Response({
+        'id': str(bulk.id),
+        'status': bulk.status,
+        'total_rows': bulk.total_rows,
+        'created': bulk.created_count,
+        'skipped': bulk.skipped_count,
+        'failed': bulk.failed_count,
+        'error': bulk.error,
+        'report': report,
+        'created_at': bulk.created_at,
+        'finished_at': bulk.finished_at,
+    })
+
@@ -1,32 +1,32 @@
 # core/views/auth.py
 import tempfile
 import os
-from django.core.files import File
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from django.contrib.auth import authenticate, login as django_login, logout as django_logout
+from django.contrib.auth import login as django_login, logout as django_logout
+from django.contrib.auth.signals import user_login_failed
 from django.middleware.csrf import get_token
 from django.utils import timezone
 from rest_framework.authentication import SessionAuthentication
 
-from ..models import User, AccessLog, Room, Company, InviteToken
-from ..utils import BiometricVerification, BiometricEncryption, AuthenticationTimer
+from ..models import User, AccessLog, Room, Company, InviteToken, EffectiveRoomAccess, EnrollmentJob
+from .. import enrollment
+from ..log_writer import access_log_writer
+from .. import lockout
+from ..throttling import record_shed, throttle
+from ..hashers import HashingBusy, check_missing_user_password, check_user_password
+from ..utils import AuthenticationTimer, get_biometric_verifier
 from ..serializers import RegistrationSerializer, LoginSerializer, UserSerializer, TokenVerificationSerializer
 
 
-biometric_verifier = BiometricVerification()
-biometric_encryption = BiometricEncryption()
-
-# Helper function to handle failed attempts and freezing
-def handle_failed_attempt(user):
-    user.failed_attempts += 1
-    if user.failed_attempts >= 3:
-        user.is_frozen = True
-        user.frozen_at = timezone.now() # Set frozen timestamp
-    user.save()
-    return 3 - user.failed_attempts
+biometric_verifier = get_biometric_verifier()
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -53,7 +53,7 @@ def verify_token(request):
     token_str = serializer.validated_data['token']
     
     try:
-        token = InviteToken.objects.get(token=token_str)
+        token = InviteToken.objects.select_related('company').get(token=token_str)
         
         if token.is_expired:
             return Response({
@@ -84,7 +84,8 @@ def verify_token(request):
 @permission_classes([AllowAny])
 def register(request):
     """
-    Register a new user with biometric data and company association
+    Queue a registration with biometric data and company association. The biometric samples are checked and
+    encrypted in the background; poll the returned status_url for the result
     """
     serializer = RegistrationSerializer(data=request.data)
     if not serializer.is_valid():
@@ -95,23 +96,27 @@ def register(request):
             'errors': field_errors
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    # Registrations still being processed count as taken, so two jobs cannot race for the same account
+    pending_jobs = EnrollmentJob.objects.filter(status__in=enrollment.ACTIVE_STATUSES)
+
     # Check if username or email already exists (more specific errors)
-    if User.objects.filter(username=serializer.validated_data['username']).exists():
+    username = serializer.validated_data['username']
+    if User.objects.filter(username=username).exists() or pending_jobs.filter(username=username).exists():
          return Response({
             'error': 'Registration failed',
             'errors': {'username': ['Username already exists.']}
          }, status=status.HTTP_400_BAD_REQUEST)
-    if User.objects.filter(email=serializer.validated_data['email']).exists():
+    email = serializer.validated_data['email']
+    if User.objects.filter(email=email).exists() or pending_jobs.filter(email=email).exists():
          return Response({
             'error': 'Registration failed',
             'errors': {'email': ['Email already exists.']}
          }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Process company creation or invitation
-    company = None
+    # Check the company creation or invitation; the company itself is created once enrollment succeeds
     invite_token = None
-    is_admin = False
-    
+    company_name = ''
+
     # Check if using an invite token
     if serializer.validated_data.get('invite_token'):
         token_str = serializer.validated_data.get('invite_token')
@@ -125,14 +130,11 @@ def register(request):
                 }, status=status.HTTP_400_BAD_REQUEST)
                 
             # Validate email matches token
-            if invite_token.email != serializer.validated_data['email']:
+            if invite_token.email != email:
                 return Response({
                     'error': 'Registration failed',
                     'errors': {'email': ['Email does not match the invitation.']}
                 }, status=status.HTTP_400_BAD_REQUEST)
-                
-            company = invite_token.company
-            is_admin = (invite_token.role == 'admin')
             
         except InviteToken.DoesNotExist:
             return Response({
@@ -150,15 +152,11 @@ def register(request):
             }, status=status.HTTP_400_BAD_REQUEST)
             
         # Check if company name already exists
-        if Company.objects.filter(name=company_name).exists():
+        if Company.objects.filter(name=company_name).exists() or pending_jobs.filter(company_name=company_name).exists():
             return Response({
                 'error': 'Registration failed',
                 'errors': {'company_name': ['Company name already exists.']}
             }, status=status.HTTP_400_BAD_REQUEST)
-            
-        # Create new company
-        company = Company.objects.create(name=company_name)
-        is_admin = True  # First user of a company is an admin
         
     else:
         # Neither creating company nor using invite token
@@ -167,111 +165,132 @@ def register(request):
             'errors': {'non_field_errors': ['Either create a new company or provide an invite token.']}
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    user = None # Initialize user to None
-    try:
-        # Create user
-        user_data = {
-            'username': serializer.validated_data['username'],
-            'email': serializer.validated_data['email'],
-            'phone_number': serializer.validated_data['phone_number'],
-            'full_name': serializer.validated_data['full_name'],
-            'is_admin': is_admin,
-            'company': company
-        }
-        user = User.objects.create_user(
-            password=serializer.validated_data['password'],
-            **user_data
-        )
-        user.save() # Ensure user is saved before file operations
-
-        # Process and encrypt face reference
-        face_image = request.FILES.get('face_image')
-        if not face_image:
-            raise ValueError("Face image is required.")
-
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            for chunk in face_image.chunks():
-                temp_file.write(chunk)
-            temp_path = temp_file.name
+    face_image = request.FILES.get('face_image')
+    if not face_image:
+        return Response({
+            'error': 'Registration failed: Face image is required.',
+            'errors': {'face_image': ['Face image is required.']}
+        }, status=status.HTTP_400_BAD_REQUEST)
+    voice_recording = request.FILES.get('voice_recording')
+    if not voice_recording:
+        return Response({
+            'error': 'Registration failed: Voice recording is required.',
+            'errors': {'voice_recording': ['Voice recording is required.']}
+        }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Encrypt face image before saving
-        if not biometric_encryption.encrypt_file(temp_path):
-             raise Exception("Failed to encrypt face image.")
-        with open(temp_path, 'rb') as encrypted_file:
-            user.face_reference_image.save(
-                f"{user.username}_face.jpg",
-                File(encrypted_file),
-                save=False # Don't save the user model again yet
-            )
-        os.unlink(temp_path)
-
-        # Process and encrypt voice reference
-        voice_recording = request.FILES.get('voice_recording')
-        if not voice_recording:
-             raise ValueError("Voice recording is required.")
+    # Stage the samples for the worker; the password is hashed now so the plain text is never stored
+    job = EnrollmentJob(
+        username=username,
+        email=email,
+        phone_number=serializer.validated_data['phone_number'],
+        full_name=serializer.validated_data['full_name'],
+        password=make_password(serializer.validated_data['password']),
+        invite_token=invite_token,
+        company_name=company_name,
+    )
+    try:
+        with transaction.atomic():
+            job.face_upload = enrollment.stage_upload(job.id, face_image, 'face.jpg')
+            job.voice_upload = enrollment.stage_upload(job.id, voice_recording, 'voice.wav')
+            job.save()
+            enrollment.dispatch(job)
+    except Exception:
+        # No job row refers to the staged files, so nothing else would ever delete them
+        enrollment.discard_staged(job.id)
+        raise
 
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            for chunk in voice_recording.chunks():
-                temp_file.write(chunk)
-            temp_path = temp_file.name
+    return Response({
+        'message': 'Registration received and is being processed',
+        'job_id': str(job.id),
+        'status_url': reverse('registration-status', args=[job.id])
+    }, status=status.HTTP_202_ACCEPTED)
 
-        # Encrypt voice recording before saving
-        if not biometric_encryption.encrypt_file(temp_path):
-             raise Exception("Failed to encrypt voice recording.")
-        with open(temp_path, 'rb') as encrypted_file:
-            user.voice_reference.save(
-                f"{user.username}_voice.wav",
-                File(encrypted_file),
-                save=False # Don't save the user model again yet
-            )
-        os.unlink(temp_path)
-
-        # Save the user model with the file paths attached
-        user.save()
-        
-        # Mark invite token as used if applicable
-        if invite_token:
-            invite_token.is_used = True
-            invite_token.used_by = user
-            invite_token.save()
 
-        # Serialize the created user data (excluding sensitive info)
-        response_user_data = UserSerializer(user).data
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def registration_status(request, job_id):
+    """
+    Poll the status of a queued registration. Anyone holding the job id can poll it, so only the progress and
+    errors are returned; the account itself is fetched by logging in
+    """
+    try:
+        job = EnrollmentJob.objects.get(pk=job_id)
+    except EnrollmentJob.DoesNotExist:
+        return Response({'error': 'Registration not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    data = {
+        'job_id': str(job.id),
+        'status': job.status,
+        'stage': job.stage,
+        'progress': job.progress,
+    }
+    if job.status == 'completed':
+        data['message'] = 'User registered successfully'
+    elif job.status == 'failed':
+        data['error'] = job.error
+        data['errors'] = job.errors
+    return Response(data)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def activate_account(request):
+    """
+    Set the password of an account provisioned by bulk enrollment, using its activation token
+    """
+    token_str = request.data.get('token')
+    password = request.data.get('password')
+    if not token_str or not password:
         return Response({
-            'message': 'User registered successfully',
-            'user': response_user_data
-        }, status=status.HTTP_201_CREATED)
+            'error': 'Token and password are required'
+        }, status=status.HTTP_400_BAD_REQUEST)
 
-    except Exception as e:
-        # Clean up user and files if registration fails mid-way
-        if user and user.pk: # Check if user object was created and has a PK
-            # Attempt to delete files only if they were associated
-            if user.face_reference_image and hasattr(user.face_reference_image, 'path') and os.path.exists(user.face_reference_image.path):
-                try:
-                    os.unlink(user.face_reference_image.path)
-                except OSError:
-                    pass # Ignore if deletion fails
-            if user.voice_reference and hasattr(user.voice_reference, 'path') and os.path.exists(user.voice_reference.path):
-                 try:
-                    os.unlink(user.voice_reference.path)
-                 except OSError:
-                    pass # Ignore if deletion fails
-            user.delete() # Delete the user record
-
-        # Check for specific ValueErrors from file checks
-        error_detail = str(e)
-        error_fields = {}
-        if "Face image is required" in error_detail:
-            error_fields['face_image'] = [error_detail]
-        elif "Voice recording is required" in error_detail:
-             error_fields['voice_recording'] = [error_detail]
+    try:
+        token = InviteToken.objects.select_related('used_by').get(token=token_str, used_by__isnull=False)
+    except InviteToken.DoesNotExist:
+        return Response({
+            'error': 'Invalid token'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if token.is_expired:
+        return Response({
+            'error': 'Token has expired or already been used'
+        }, status=status.HTTP_400_BAD_REQUEST)
 
+    user = token.used_by
+    try:
+        validate_password(password, user)
+    except ValidationError as e:
         return Response({
-            'error': f'Registration failed: {error_detail}',
-            'errors': error_fields if error_fields else None
+            'error': 'Activation failed',
+            'errors': {'password': list(e.messages)}
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    # Claim the token atomically so it activates the account only once
+    with transaction.atomic():
+        if not InviteToken.objects.filter(pk=token.pk, is_used=False).update(is_used=True):
+            return Response({
+                'error': 'Token has expired or already been used'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        user.set_password(password)
+        user.save(update_fields=['password'])
+
+    return Response({'message': 'Account activated. You can now log in.'})
+
+
+def hashing_busy_response():
+    response = Response({
+        'error': 'Server is busy. Please try again shortly.'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    return response
+
+def throttled_response(wait):
+    response = Response({
+        'error': 'Too many login attempts. Please try again later.',
+        'retry_after': wait
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(wait)
+    return response
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_step1(request):
@@ -287,37 +306,55 @@ def login_step1(request):
             'error': 'Please provide both username and password'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Use authenticate to check credentials without logging in
-    user = authenticate(request, username=username, password=password)
-
-    if not user:
-        # Check if user exists to provide a hint about freezing or bad password
+    # Everything up to the password check is cheap: shed over-limit and locked out callers before any hashing
+    if lockout.ip_blocked(request):
+        record_shed('lockout')
+        return Response({
+            'error': 'Too many failed attempts from this address. Please try again later.'
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    wait = throttle('ip', lockout.client_ip(request)) or throttle('username', username)
+    if wait:
+        return throttled_response(wait)
+
+    # Load the user once; it is reused for the company bucket, the frozen check and the password check
+    user = User.objects.select_related('company').filter(username=username).first()
+    if user is None:
+        # User doesn't exist: hash anyway so the response time doesn't reveal it, and count the failure against
+        # the client address
         try:
-            existing_user = User.objects.get(username=username)
-            if existing_user.is_frozen:
-                 return Response({
-                    'error': 'Account is frozen. Please contact administrator.'
-                 }, status=status.HTTP_403_FORBIDDEN)
-            else:
-                 # Increment failed attempts for existing, non-frozen user with bad password
-                 attempts_remaining = handle_failed_attempt(existing_user)
-                 return Response({
-                    'error': 'Invalid credentials.',
-                    'attempts_remaining': attempts_remaining,
-                    'is_frozen': existing_user.is_frozen
-                 }, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            # User doesn't exist
-             return Response({
-                'error': 'Invalid credentials.'
-             }, status=status.HTTP_401_UNAUTHORIZED)
-
-    # User exists and password is correct, check if frozen
-    if user.is_frozen:
+            check_missing_user_password(password)
+        except HashingBusy:
+            return hashing_busy_response()
+        lockout.record_ip_failure(request)
+        user_login_failed.send(sender=__name__, credentials={'username': username}, request=request)
+        return Response({
+            'error': 'Invalid credentials.'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+
+    wait = throttle('company', user.company_id)
+    if wait:
+        return throttled_response(wait)
+
+    if lockout.is_frozen(user):
         return Response({
             'error': 'Account is frozen. Please contact administrator.'
         }, status=status.HTTP_403_FORBIDDEN)
 
+    # Same checks as ModelBackend; the stored hash is upgraded when the hasher settings changed
+    try:
+        password_valid = user.is_active and check_user_password(user, password)
+    except HashingBusy:
+        return hashing_busy_response()
+    if not password_valid:
+        attempts_remaining = lockout.record_failure(user, request)
+        # authenticate() is bypassed, so the failure signal for auditing is sent here
+        user_login_failed.send(sender=__name__, credentials={'username': username}, request=request)
+        return Response({
+            'error': 'Invalid credentials.',
+            'attempts_remaining': attempts_remaining,
+            'is_frozen': user.is_frozen
+        }, status=status.HTTP_401_UNAUTHORIZED)
+
     # Store username in session for next steps - session starts here
     request.session['login_username'] = username
     request.session['login_step'] = 1 # Track progress
@@ -367,7 +404,7 @@ def login_step2(request):
 
     try:
         user = User.objects.get(username=username)
-        if user.is_frozen: # Double check in case status changed
+        if lockout.is_frozen(user): # Double check in case status changed
             request.session.flush() # Clear potentially invalid session
             return Response({'error': 'Account is frozen.'}, status=status.HTTP_403_FORBIDDEN)
 
@@ -379,7 +416,7 @@ def login_step2(request):
     # Check timer status
     is_valid, remaining_time = AuthenticationTimer.check_timer(request, 'face')
     if not is_valid:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         AuthenticationTimer.clear_timer(request, 'face')
         request.session.pop('login_step', None) # Reset step progress
 
@@ -418,7 +455,7 @@ def login_step2(request):
             os.unlink(temp_path) # Ensure cleanup
 
     if not face_verified:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         # Keep session active for retry, don't clear timer or step yet
         return Response({
             'error': 'Face verification failed',
@@ -465,7 +502,7 @@ def login_step3(request):
 
     try:
         user = User.objects.get(username=username)
-        if user.is_frozen:
+        if lockout.is_frozen(user):
             request.session.flush()
             return Response({'error': 'Account is frozen.'}, status=status.HTTP_403_FORBIDDEN)
     except User.DoesNotExist:
@@ -475,7 +512,7 @@ def login_step3(request):
     # Check timer
     is_valid, remaining_time = AuthenticationTimer.check_timer(request, 'voice')
     if not is_valid:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         AuthenticationTimer.clear_timer(request, 'voice')
         request.session.pop('login_step', None) # Reset step progress
 
@@ -516,7 +553,7 @@ def login_step3(request):
 
 
     if not voice_result:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         return Response({
             'error': 'Voice verification processing failed', # More specific internal error
             'attempts_remaining': attempts_remaining,
@@ -532,7 +569,7 @@ def login_step3(request):
     )
 
     if not threshold_passed:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         # Log detailed failure reasons if needed
         failure_details = f"Speaker: {voice_result['speaker_similarity']:.2f}, Transcription: {voice_result['transcription_similarity']:.2f}, Genuine: {voice_result['is_genuine_audio']}"
         print(f"Voice verification failed for {username}: {failure_details}") # Log for admin
@@ -545,8 +582,7 @@ def login_step3(request):
         }, status=status.HTTP_401_UNAUTHORIZED)
 
     # --- Login Successful ---
-    user.failed_attempts = 0 # Reset counter
-    user.save()
+    lockout.clear_failures(user) # Reset the failure window
 
     # Perform actual login using Django's session framework
     django_login(request, user) # This sets the session cookie properly
@@ -602,16 +638,15 @@ def request_room_access(request):
         }, status=status.HTTP_404_NOT_FOUND)
 
     user = request.user # request.user is available due to SessionAuthentication
-    if user.is_frozen:
+    if lockout.is_frozen(user):
         return Response({
             'error': 'Account is frozen'
         }, status=status.HTTP_403_FORBIDDEN)
 
-    # Check if user has permission for this room's group
-    # Ensure related_name 'allowed_room_groups' matches UserRoomGroup model
-    if not user.allowed_room_groups.filter(room_group=room.group).exists():
+    # Check if user has permission for this room (through any of their room groups)
+    if not EffectiveRoomAccess.objects.filter(user=user, room=room).exists():
         # Log the failed attempt
-        AccessLog.objects.create(
+        access_log_writer.write(
             user=user,
             room=room,
             company=user.company,
@@ -663,16 +698,16 @@ def room_access_face_verify(request):
          AuthenticationTimer.clear_timer(request, 'face')
          return Response({'error': 'Room not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if user.is_frozen: # Re-check frozen status
+    if lockout.is_frozen(user): # Re-check frozen status
         return Response({'error': 'Account is frozen'}, status=status.HTTP_403_FORBIDDEN)
 
     # Check timer
     is_valid, remaining_time = AuthenticationTimer.check_timer(request, 'face')
     if not is_valid:
-        attempts_remaining = handle_failed_attempt(user) # Use helper
+        attempts_remaining = lockout.record_failure(user, request) # Use helper
         request.session.pop('access_step', None) # Reset progress
 
-        AccessLog.objects.create(
+        access_log_writer.write(
             user=user,
             room=room,
             company=user.company,
@@ -720,8 +755,8 @@ def room_access_face_verify(request):
 
 
     if not face_verified:
-        attempts_remaining = handle_failed_attempt(user) # Use helper
-        AccessLog.objects.create(
+        attempts_remaining = lockout.record_failure(user, request) # Use helper
+        access_log_writer.write(
             user=user,
             room=room,
             company=user.company,
@@ -783,16 +818,16 @@ def room_access_voice_verify(request):
          AuthenticationTimer.clear_timer(request, 'voice')
          return Response({'error': 'Room not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if user.is_frozen: # Re-check frozen status
+    if lockout.is_frozen(user): # Re-check frozen status
         return Response({'error': 'Account is frozen'}, status=status.HTTP_403_FORBIDDEN)
 
     # Check timer
     is_valid, remaining_time = AuthenticationTimer.check_timer(request, 'voice')
     if not is_valid:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         request.session.pop('access_step', None) # Reset progress
 
-        AccessLog.objects.create(
+        access_log_writer.write(
             user=user,
             room=room,
             company=user.company,
@@ -840,8 +875,8 @@ def room_access_voice_verify(request):
     # --- End Voice Verification ---
 
     if not voice_result:
-        attempts_remaining = handle_failed_attempt(user)
-        AccessLog.objects.create(
+        attempts_remaining = lockout.record_failure(user, request)
+        access_log_writer.write(
             user=user,
             room=room,
             company=user.company,
@@ -868,11 +903,11 @@ def room_access_voice_verify(request):
     )
 
     if not threshold_passed:
-        attempts_remaining = handle_failed_attempt(user)
+        attempts_remaining = lockout.record_failure(user, request)
         failure_details = f"Speaker: {voice_result['speaker_similarity']:.2f}, Transcription: {voice_result['transcription_similarity']:.2f}, Genuine: {voice_result['is_genuine_audio']}"
         print(f"Room Access Voice verification failed for {user.username} in {room_id}: {failure_details}") # Log
 
-        AccessLog.objects.create(
+        access_log_writer.write(
             user=user,
             room=room,
             company=user.company,
@@ -892,11 +927,11 @@ def room_access_voice_verify(request):
         }, status=status.HTTP_401_UNAUTHORIZED)
 
     # --- Access Granted ---
-    user.failed_attempts = 0 # Reset counter on success
-    user.save()
+    lockout.clear_failures(user) # Reset the failure window on success
 
-    # Log successful access
-    AccessLog.objects.create(
+    # Log successful access (written immediately so door events can be matched to it)
+    access_log_writer.write(
+        sync=True,
         user=user,
         room=room,
         company=user.company,
@@ -909,7 +944,7 @@ def room_access_voice_verify(request):
     
     room.is_unlocked = True
     room.unlock_timestamp = timezone.now()
-    room.save()
+    room.save(update_fields=['is_unlocked', 'unlock_timestamp'])
 
 
     # Clear session data for this access attempt
@@ -962,7 +997,7 @@ def get_room_status(request, room_id):
                 # Lock the room again
                 room.is_unlocked = False
                 room.unlock_timestamp = None
-                room.save()
+                room.save(update_fields=['is_unlocked', 'unlock_timestamp'])
                 is_unlocked = False
         
         return Response({
@@ -1014,10 +1049,11 @@ def toggle_room_lock(request, room_id):
                 room.unlock_timestamp = None
                 operation = 'locked'
         
-        room.save()
+        room.save(update_fields=['is_unlocked', 'unlock_timestamp'])
         
         # Log this manual action
-        AccessLog.objects.create(
+        access_log_writer.write(
+            sync=True,
             user=request.user,
             room=room,
             company=request.user.company,
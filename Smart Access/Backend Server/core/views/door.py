@@ -0,0 +1,124 @@
+# core/views/door.py
+import bisect
+from datetime import timedelta
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from ..models import Room, AccessLog, DoorEvent
+from ..serializers import DoorEventBatchSerializer
+
+# A door opened within this window after a granted access is attributed to that grant.
+# Matches the 30 second unlock duration enforced by get_room_status.
+GRANT_CORRELATION_WINDOW = timedelta(seconds=30)
+
+
+def correlate_with_grants(room, events):
+    """
+    Attach the matching AccessLog grant to every 'opened' event.
+    Loads the grants for the whole batch window in a single query.
+    """
+    opened = [event for event in events if event.event_type == 'opened']
+    if not opened:
+        return
+
+    earliest = min(event.occurred_at for event in opened) - GRANT_CORRELATION_WINDOW
+    latest = max(event.occurred_at for event in opened)
+    grants = list(
+        AccessLog.objects.filter(
+            room=room,
+            access_granted=True,
+            timestamp__gte=earliest,
+            timestamp__lte=latest,
+        ).order_by('timestamp').values_list('timestamp', 'id')
+    )
+    if not grants:
+        return
+
+    grant_times = [timestamp for timestamp, _ in grants]
+    for event in opened:
+        # Most recent grant at or before the moment the door opened
+        index = bisect.bisect_right(grant_times, event.occurred_at) - 1
+        if index >= 0 and event.occurred_at - grant_times[index] <= GRANT_CORRELATION_WINDOW:
+            event.access_log_id = grants[index][1]
+
+
+def find_controller_rooms(device_id, room_id, company_id=None):
+    """
+    The rooms a controller's batch may belong to. room_id is only unique within a company, so the batch's
+    company_id narrows it down, or else the room the same device reported events for before.
+    """
+    rooms = Room.objects.filter(room_id=room_id)
+    if company_id is not None:
+        rooms = rooms.filter(company_id=company_id)
+    rooms = list(rooms)
+    if len(rooms) > 1:
+        known = DoorEvent.objects.filter(device_id=device_id, room__in=rooms).values_list('room', flat=True).first()
+        if known is not None:
+            rooms = [room for room in rooms if room.pk == known]
+    return rooms
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])  # Allow unauthenticated access for ESP32
+def ingest_door_events(request):
+    """
+    Accept a batch of sequence-numbered door events from a room controller.
+    Events already received (same device and sequence) are ignored, so a
+    controller can safely resend a batch it is unsure was delivered.
+    """
+    serializer = DoorEventBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'error': 'Invalid event batch',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    device_id = serializer.validated_data['device_id']
+    room_id = serializer.validated_data['room_id']
+
+    rooms = find_controller_rooms(device_id, room_id, serializer.validated_data.get('company_id'))
+    if not rooms:
+        return Response({
+            'error': 'Room not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    if len(rooms) > 1:
+        return Response({
+            'error': 'Several companies have a room with this room_id. Send company_id with the batch.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    room = rooms[0]
+
+    # Drop repeats inside the batch, then anything stored by an earlier delivery
+    incoming = {}
+    for event in serializer.validated_data['events']:
+        incoming.setdefault(event['sequence'], event)
+
+    existing = set(
+        DoorEvent.objects.filter(
+            device_id=device_id,
+            sequence__in=list(incoming)
+        ).values_list('sequence', flat=True)
+    )
+
+    new_events = [
+        DoorEvent(
+            device_id=device_id,
+            sequence=sequence,
+            event_type=event['event_type'],
+            occurred_at=event['occurred_at'],
+            room=room,
+            company_id=room.company_id,
+        )
+        for sequence, event in sorted(incoming.items())
+        if sequence not in existing
+    ]
+
+    correlate_with_grants(room, new_events)
+    # ignore_conflicts covers a concurrent retry of the same batch
+    DoorEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+
+    return Response({
+        'accepted': len(new_events),
+        'duplicates': len(serializer.validated_data['events']) - len(new_events),
+        'last_sequence': max(incoming),
+    })
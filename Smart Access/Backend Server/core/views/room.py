@@ -3,26 +3,32 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from ..models import Room, UserRoomGroup
+from ..models import Room
 from ..serializers import RoomSerializer
+from ..db_router import use_replica
+from ..sparse_fields import InvalidFields, requested_fields
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_replica
 def list_user_rooms(request):
     """
-    Get all rooms that the current user has access to via their room groups
+    Get all rooms that the current user has access to via their room groups.
+    ?fields= limits the keys returned and ?expand=group,company embeds those objects.
     """
     user = request.user
     
-    # Get user's room groups
-    user_room_groups = UserRoomGroup.objects.filter(user=user)
-    group_ids = [urg.room_group.id for urg in user_room_groups]
-    
-    # Get rooms from these groups, filtered by user's company
+    # Get rooms the user can open (materialized from their room groups), filtered by user's company
     rooms = Room.objects.filter(
         company=user.company,
-        group__in=group_ids
-    ).distinct()
+        effective_access__user=user
+    )
     
-    serializer = RoomSerializer(rooms, many=True)
-    return Response(serializer.data)
+    try:
+        fields, expand = requested_fields(request.query_params)
+        serializer = RoomSerializer(many=True, fields=fields, expand=expand)
+    except InvalidFields as exc:
+        return Response({
+            'error': str(exc)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.to_representation(serializer.child.optimize(rooms)))
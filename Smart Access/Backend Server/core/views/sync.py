@@ -0,0 +1,69 @@
+# core/views/sync.py
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from ..models import Room
+from ..serializers import RoomGroupSerializer, RoomSerializer, UserRoomGroupSerializer, UserSerializer
+from ..db_router import use_replica
+from ..revisions import UNSYNCED_FIELDS, changes_since
+
+
+def synced_rooms(rooms):
+    # A room's lock state is not stamped when it changes, so it is left out rather than sent stale
+    fields = [name for name in RoomSerializer().fields if name not in UNSYNCED_FIELDS[Room]]
+    return RoomSerializer(rooms, many=True, fields=fields).data
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def sync_changes(request):
+    """
+    Delta sync: everything that changed since the client's last revision (?since=<revision>, 0 or absent for a
+    full sync). Admins get their company's users, rooms, room groups and permissions plus the ids deleted since;
+    other users get the rooms they can open. Rooms come without their lock state, which the room status endpoint
+    reports live. Store the returned revision and send it as since next time. When reset is true, replace the local
+    copy with the returned rows instead of merging them
+    """
+    try:
+        since = int(request.query_params.get('since', 0))
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return Response({
+            'error': 'since must be a revision number'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user
+    if not user.company_id:
+        return Response({
+            'error': 'No company associated with this user'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    revision, reset, changes, deleted = changes_since(user.company, since)
+    if user.is_admin:
+        return Response({
+            'revision': revision,
+            'reset': reset,
+            'users': UserSerializer(changes['users'], many=True).data,
+            'rooms': synced_rooms(changes['rooms']),
+            'room_groups': RoomGroupSerializer(changes['room_groups'], many=True).data,
+            'permissions': UserRoomGroupSerializer(changes['permissions'], many=True).data,
+            'deleted': deleted,
+        })
+
+    # A room can also appear or disappear for this user through their own permissions, which the changed rooms do
+    # not show, so the ids of all their rooms are sent along; the client drops rooms missing from room_ids
+    rooms = Room.objects.filter(company=user.company, effective_access__user=user)
+    changed = rooms.select_related('group', 'company')
+    if since and not reset:
+        granted = Q(group__userroomgroup__user=user, group__userroomgroup__revision__gt=since)
+        changed = changed.filter(Q(revision__gt=since) | Q(group__revision__gt=since) | granted).distinct()
+    return Response({
+        'revision': revision,
+        'reset': reset,
+        'rooms': synced_rooms(changed),
+        'room_ids': list(rooms.values_list('id', flat=True)),
+    })
@@ -591,8 +591,8 @@ class AuthService extends ChangeNotifier {
     }
   }
   
-  // Registration
-  Future<User> register({
+  // Registration; the new account signs in afterwards like any other
+  Future<void> register({
     required String username,
     required String password,
     required String email,
@@ -653,11 +653,12 @@ class AuthService extends ChangeNotifier {
         ),
       );
       
-      if (response.statusCode == 201) {
-        final userData = response.data['user'];
-        final user = User.fromJson(userData);
-        
-        return user;
+      if (response.statusCode == 202) {
+        // Biometric samples are processed in the background; wait for the result
+        await _waitForRegistration(response.data['job_id']);
+        return;
+      } else if (response.statusCode == 201) {
+        return;
       } else {
         throw DioException(
           requestOptions: response.requestOptions,
@@ -680,6 +681,28 @@ class AuthService extends ChangeNotifier {
     }
   }
   
+  // Poll a queued registration until it completes or fails, giving up after about five minutes
+  static const int _registrationPollAttempts = 150;
+
+  Future<Map<String, dynamic>> _waitForRegistration(String jobId) async {
+    for (var attempt = 0; attempt < _registrationPollAttempts; attempt++) {
+      await Future.delayed(const Duration(seconds: 2));
+      final response = await _dio.get('auth/register/status/$jobId/');
+      final data = Map<String, dynamic>.from(response.data);
+      print(">>> Registration $jobId: ${data['status']} ${data['stage']} ${data['progress']}%");
+      if (data['status'] == 'completed') return data;
+      if (data['status'] == 'failed') {
+        // Shaped like a rejected registration so the field errors are reported the same way
+        throw DioException(
+          requestOptions: response.requestOptions,
+          response: response,
+          error: data['error'] ?? 'Registration failed'
+        );
+      }
+    }
+    throw Exception('Registration is taking longer than expected. Try logging in later.');
+  }
+
   // Token verification
   Future<Map<String, dynamic>> verifyToken(String token) async {
     await initializationComplete;